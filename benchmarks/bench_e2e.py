@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+端到端基准：在本地替身服务器上跑完整的 init → 处理服务 → 续期 → 账单跳转 → 支付流程。
+
+关闭所有等待与限速，报告吞吐量（服务/秒）、各路由请求次数以及各阶段的 p50 / p99 耗时。
+
+用法: python -m benchmarks.bench_e2e [--accounts 3] [--services 20] [--account-workers 3]
+                                    [--service-workers 1] [--latency-ms 0] [--page-size 0] [--invoice-sweep] [--seed 0]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from contextlib import ExitStack
+from unittest.mock import patch
+
+import requests
+
+from benchmarks.common import main, print_table
+from benchmarks.standin_server import StandInServer
+
+
+def percentile(samples, q):
+    """最近秩法分位数。"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(q * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+class SampleRecorder:
+    """替换 main.REQUEST_STATS，保留每次请求的原始耗时以计算精确分位数。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+
+    def add(self, phase, seconds):
+        with self._lock:
+            self.samples.setdefault(phase, []).append(seconds)
+
+    def record(self, method, url, status, size, queued, ttfb, total, cookies_changed):
+        self.add(f"{method.upper()} {main.route_template(url)}", total)
+
+
+def standin_bot_class(base_url, recorder, service_workers):
+    class StandInBot(main.HidenCloudBot):
+        def __init__(self, env_cookie, index):
+            super().__init__(env_cookie, index)
+            self.base_url = base_url
+            self.env_cookie = env_cookie
+            self.rebuild_session(env_cookie)
+
+        def create_session(self):
+            return requests.Session()
+
+        def load_cookie_str(self, cookie_str, session=None):
+            # 替身服务器走明文 HTTP，使用不限域名、非 secure 的 Cookie
+            if cookie_str and '=' in cookie_str:
+                name, value = cookie_str.split('=', 1)
+                (self.session if session is None else session).cookies.set(name.strip(), value.strip())
+
+        def init(self):
+            started = time.perf_counter()
+            try:
+                return super().init()
+            finally:
+                recorder.add('init (account)', time.perf_counter() - started)
+
+        def process_services(self, max_workers=None):
+            return super().process_services(max_workers=service_workers)
+
+        def process_service(self, service, allow_rebuild_retry=True, rebuild_retry=False):
+            started = time.perf_counter()
+            try:
+                return super().process_service(service, allow_rebuild_retry, rebuild_retry)
+            finally:
+                if not rebuild_retry:
+                    recorder.add('service (end-to-end)', time.perf_counter() - started)
+
+    return StandInBot
+
+
+def run(args):
+    recorder = SampleRecorder()
+    with StandInServer(args.accounts, args.services, seed=args.seed, latency=args.latency_ms / 1000,
+                       page_size=args.page_size) as server, \
+            tempfile.TemporaryDirectory() as tmpdir, ExitStack() as stack:
+        env = {name: value for name, value in os.environ.items() if not name.startswith('WEBDAV_')}
+        stack.enter_context(patch.dict(os.environ, env, clear=True))
+        stack.enter_context(patch.object(main, 'LOCAL_CACHE_PATH', os.path.join(tmpdir, main.CACHE_FILE_NAME)))
+        stack.enter_context(patch.object(main, 'LOG_HUB', main.LogHub()))
+        stack.enter_context(patch.object(main, 'REQUEST_STATS', recorder))
+        stack.enter_context(patch.object(main, 'REQUEST_GOVERNOR', main.RateGovernor(0, 1, args.in_flight)))
+        stack.enter_context(patch.object(main, 'INVOICE_POLL_POLICY', main.InvoicePollPolicy(first_delay=0, deadline=0)))
+        stack.enter_context(patch.object(main, 'CACHE_REPLICATOR', main.CacheReplicator(uploader=lambda snapshot: True)))
+        stack.enter_context(patch.object(main, 'HidenCloudBot', standin_bot_class(server.base_url, recorder, args.service_workers)))
+        stack.enter_context(patch.object(main, 'LOCAL_SCHEDULE_PATH', os.path.join(tmpdir, main.SCHEDULE_FILE_NAME)))
+        stack.enter_context(patch.object(main, 'INVOICE_SWEEP_PATH', '/invoices?where=unpaid' if args.invoice_sweep else ''))
+        main.CacheManager.reload()
+        main.RenewalSchedule.reload()
+        stack.callback(main.CacheManager.reload)
+        stack.callback(main.RenewalSchedule.reload)
+
+        started = time.perf_counter()
+        retry_needed = main.run_accounts(server.cookies(), max_workers=args.account_workers)
+        wall = time.perf_counter() - started
+        counters = server.state.snapshot()
+
+    total_services = args.accounts * args.services
+    total_requests = sum(len(samples) for phase, samples in recorder.samples.items() if ' /' in phase)
+    print(f"accounts={args.accounts} services/account={args.services} "
+          f"account-workers={args.account_workers} service-workers={args.service_workers} "
+          f"latency={args.latency_ms:g}ms")
+    print(f"wall {wall:.3f}s | {total_services / wall:.1f} services/s | "
+          f"{total_requests} requests ({total_requests / wall:.1f} req/s) | retry_needed={retry_needed}")
+    print(f"server: renewed={counters['renewed']} paid={counters['paid']} "
+          f"rejected={counters['rejected']} expired_tokens={counters['expired_tokens']}")
+    print()
+
+    rows = []
+    for phase, samples in sorted(recorder.samples.items(), key=lambda item: -sum(item[1])):
+        rows.append((
+            phase,
+            len(samples),
+            f"{percentile(samples, 0.5) * 1000:.2f} ms",
+            f"{percentile(samples, 0.99) * 1000:.2f} ms",
+            f"{sum(samples):.3f} s",
+        ))
+    print_table(('phase', 'count', 'p50', 'p99', 'total'), rows)
+    return wall
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--accounts', type=int, default=3)
+    parser.add_argument('--services', type=int, default=20)
+    parser.add_argument('--account-workers', type=int, default=main.ACCOUNT_CONCURRENCY)
+    parser.add_argument('--service-workers', type=int, default=1)
+    parser.add_argument('--in-flight', type=int, default=16, help='对替身服务器的在途请求上限')
+    parser.add_argument('--latency-ms', type=float, default=0, help='替身服务器对每个请求附加的延迟')
+    parser.add_argument('--page-size', type=int, default=0, help='控制台每页服务数，0 表示不分页')
+    parser.add_argument('--invoice-sweep', action='store_true', help='开启账号级未付账单扫描（替身服务器提供 /invoices）')
+    parser.add_argument('--seed', type=int, default=0)
+    run(parser.parse_args(argv))
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+比较待支付账单链接提取的逐容器扫描实现与单次遍历实现。
+
+用法: python -m benchmarks.bench_invoice_links [--rows 10 1000 10000] [--repeat 3]
+"""
+import argparse
+
+from benchmarks import pages
+from benchmarks.common import main, measure, offline_bot, print_table
+from benchmarks.reference import extract_contextual_invoice_links
+
+LAYOUTS = {
+    'table': pages.invoice_list_page,
+    'nested': pages.nested_invoice_list_page,
+}
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    bot = offline_bot()
+    rows = []
+    for layout, generator in LAYOUTS.items():
+        for row_count in args.rows:
+            soup = main.make_soup(generator(row_count))
+            expected = extract_contextual_invoice_links(bot, soup)
+            actual = bot.extract_invoice_links(soup, require_payment_context=True)
+            if actual != expected:
+                raise SystemExit(f"结果不一致: {layout} x {row_count}")
+
+            repeat = 1 if row_count >= 10000 else args.repeat
+            legacy = measure(lambda: extract_contextual_invoice_links(bot, soup), repeat=repeat)
+            single_pass = measure(lambda: bot.extract_invoice_links(soup, require_payment_context=True), repeat=repeat)
+            rows.append((
+                layout,
+                row_count,
+                len(actual),
+                f"{legacy * 1000:.1f} ms",
+                f"{single_pass * 1000:.1f} ms",
+                f"{legacy / single_pass:.1f}x",
+            ))
+
+    print_table(('layout', 'rows', 'unpaid', 'per-container', 'single-pass', 'speedup'), rows)
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+比较逐关键词正则匹配与预编译 KeywordMatcher 的账单上下文判定耗时。
+
+用法: python -m benchmarks.bench_keyword_matcher [--number 20000]
+"""
+import argparse
+
+from benchmarks import pages, reference
+from benchmarks.common import main, measure, offline_bot, print_table
+
+SAMPLES = {
+    'row-unpaid': '#inv000123 €12.00 Unpaid View PDF',
+    'row-paid': 'Invoice #123 Total €0.00 Status: Paid View',
+    'row-chinese': '账单 #123 金额 ￥12.00 状态 待付款 立即支付',
+    'card-no-keyword': 'Game Server #100001 Active CPU 2 vCore RAM 4 GB Disk 40 GB Manage Panel ' * 3,
+}
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=20000)
+    args = parser.parse_args(argv)
+
+    bot = offline_bot()
+    samples = dict(SAMPLES)
+    samples['full-invoice-page'] = main.make_soup(pages.invoice_list_page(1000)).get_text(" ", strip=True)
+
+    rows = []
+    for name, text in samples.items():
+        if reference.has_invoice_payment_context(text) != bot.has_invoice_payment_context(text):
+            raise SystemExit(f"结果不一致: {name}")
+        number = max(1, args.number * 100 // max(len(text), 100))
+        legacy = measure(lambda: reference.has_invoice_payment_context(text), number=number)
+        compiled = measure(lambda: bot.has_invoice_payment_context(text), number=number)
+        rows.append((
+            name,
+            len(text),
+            f"{legacy * 1e6:.1f} us",
+            f"{compiled * 1e6:.1f} us",
+            f"{legacy / compiled:.1f}x",
+        ))
+
+    print_table(('sample', 'chars', 'per-keyword', 'compiled', 'speedup'), rows)
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+比较各 HTML 解析后端在真实尺寸控制台页面上的耗时。
+
+用法: python -m benchmarks.bench_parser [--services 300] [--invoices 500] [--repeat 5]
+"""
+import argparse
+from unittest.mock import patch
+
+from bs4.builder import builder_registry
+
+from benchmarks import pages
+from benchmarks.common import main, measure, offline_bot, print_table
+
+BACKENDS = ('html.parser', 'lxml', 'html5lib')
+
+
+def run_workload(bot, dashboard_html, invoices_html, manage_html, invoice_html):
+    soup = main.make_soup(dashboard_html)
+    bot._refresh_csrf(soup)
+    [a['href'] for a in soup.find_all('a', href=True) if '/service/' in a['href']]
+
+    soup = main.make_soup(invoices_html)
+    bot.extract_invoice_links(soup, require_payment_context=True)
+
+    soup = main.make_soup(manage_html)
+    bot.find_renew_form(soup, '100000')
+    bot.extract_server_error_message(soup)
+
+    soup = main.make_soup(invoice_html)
+    [form.get('action') for form in soup.find_all('form')]
+
+
+def parse_only(dashboard_html, invoices_html, manage_html, invoice_html):
+    for html in (dashboard_html, invoices_html, manage_html, invoice_html):
+        main.make_soup(html)
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--services', type=int, default=300)
+    parser.add_argument('--invoices', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    dashboard_html = pages.dashboard_page(args.services)
+    invoices_html = pages.invoice_list_page(args.invoices)
+    manage_html = pages.manage_page('100000')
+    invoice_html = pages.invoice_page()
+    print(f"页面尺寸: dashboard {len(dashboard_html) / 1024:.0f} KB, invoices {len(invoices_html) / 1024:.0f} KB")
+
+    bot = offline_bot()
+    page_set = (dashboard_html, invoices_html, manage_html, invoice_html)
+    rows = []
+    baseline = None
+    for backend in BACKENDS:
+        if builder_registry.lookup(backend) is None:
+            rows.append((backend, '未安装', '-', '-', '-'))
+            continue
+        with patch.object(main, 'HTML_PARSER', backend):
+            parse_time = measure(lambda: parse_only(*page_set), repeat=args.repeat)
+            workload_time = measure(lambda: run_workload(bot, *page_set), repeat=args.repeat)
+        if baseline is None:
+            baseline = (parse_time, workload_time)
+        rows.append((
+            backend,
+            f"{parse_time * 1000:.1f} ms",
+            f"{baseline[0] / parse_time:.2f}x",
+            f"{workload_time * 1000:.1f} ms",
+            f"{baseline[1] / workload_time:.2f}x",
+        ))
+
+    print_table(('backend', 'parse', 'parse speedup', 'parse + helpers', 'speedup'), rows)
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+解析热点函数的微基准与回归检查：服务发现、账单链接提取、错误提示识别、续期表单定位、表单字段提取与 CSRF 刷新。
+
+页面事先解析好，只计函数本身的耗时。结果除以校准循环的耗时做归一化，
+与 benchmarks/baseline_parsing.json 比较，任一用例慢于基线超过阈值时以退出码 1 结束。
+
+用法: python -m benchmarks.bench_parsing [--threshold 0.3] [--update-baseline] [--only discover]
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+from benchmarks import pages
+from benchmarks.common import main, measure, offline_bot, print_table
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline_parsing.json')
+DASHBOARD_SIZES = (10, 100, 1000, 5000)
+INVOICE_SIZES = (10, 100, 1000, 5000)
+FORM_SIZES = (10, 100, 1000)
+MIN_BATCH_SECONDS = 0.02
+
+
+def calibration_workload():
+    """固定的纯 Python 负载（字符串拼接、字典与列表操作），用来抵消机器快慢的差异。"""
+    counts = {}
+    parts = []
+    for i in range(10000):
+        key = f"/service/{i % 997}/manage"
+        counts[key] = counts.get(key, 0) + 1
+        if i % 7 == 0:
+            parts.append(key.split('/')[2])
+    return len(counts) + len(''.join(parts))
+
+
+def without_meta_token(html):
+    """去掉 meta csrf-token，迫使 CSRF 刷新降级扫描到页尾的 _token 字段。"""
+    return html.replace('<meta name="csrf-token" content="bench-token">', '')
+
+
+def build_cases(bot):
+    """返回 [(用例名, 可调用对象)]；同一尺寸的页面只解析一次。"""
+    cases = []
+    for size in DASHBOARD_SIZES:
+        dashboard = main.make_soup(pages.dashboard_page(size))
+        if len(bot.discover_services(dashboard)) != size:
+            raise SystemExit(f"服务发现结果不一致: dashboard={size}")
+        no_meta = main.make_soup(without_meta_token(pages.dashboard_page(size)))
+        cases.append((f"discover_services[dashboard={size}]", lambda soup=dashboard: bot.discover_services(soup)))
+        cases.append((f"_refresh_csrf[dashboard={size},no-meta]", lambda soup=no_meta: bot._refresh_csrf(soup)))
+
+    for size in INVOICE_SIZES:
+        invoices = main.make_soup(pages.invoice_list_page(size))
+        cases.append((
+            f"extract_invoice_links[invoices={size},context]",
+            lambda soup=invoices: bot.extract_invoice_links(soup, require_payment_context=True),
+        ))
+        cases.append((
+            f"extract_invoice_links[invoices={size},plain]",
+            lambda soup=invoices: bot.extract_invoice_links(soup),
+        ))
+        cases.append((
+            f"extract_server_error_message[invoices={size}]",
+            lambda soup=invoices: bot.extract_server_error_message(soup),
+        ))
+
+    for size in FORM_SIZES:
+        manage = main.make_soup(pages.manage_page('100001', extra_forms=size))
+        form, _ = bot.find_renew_form(manage, '100001')
+        if form is None:
+            raise SystemExit(f"未找到续期表单: forms={size}")
+        settings_form = main.make_soup(pages.settings_form_page(size)).find('form', action='/account/settings')
+        cases.append((f"find_renew_form[forms={size}]", lambda soup=manage: bot.find_renew_form(soup, '100001')))
+        cases.append((f"extract_form_payload[fields={size}]", lambda form=settings_form: bot.extract_form_payload(form)))
+    return cases
+
+
+def batch_size(fn):
+    """自动选择每批次调用次数，使单批耗时不少于 MIN_BATCH_SECONDS。"""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - start >= MIN_BATCH_SECONDS or number >= 1 << 16:
+            return number
+        number *= 2
+
+
+def normalized_time(fn, calibration, repeat):
+    """
+    每轮先跑一次校准负载、紧接着跑一批用例，取各轮“用例 / 校准”比值的中位数。
+
+    相邻测量处在同一个 CPU 频率与争用状态下，比值能抵消共享机器上秒级的快慢波动。
+    返回 (归一化耗时, 单次最快耗时)。
+    """
+    number = batch_size(fn)
+    ratios = []
+    best = float('inf')
+    for _ in range(repeat):
+        reference = measure(calibration, repeat=1)
+        elapsed = measure(fn, repeat=1, number=number)
+        ratios.append(elapsed / reference)
+        best = min(best, elapsed)
+    return statistics.median(ratios), best
+
+
+def load_baseline(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_baseline(path, calibration, results):
+    document = {
+        'version': 1,
+        'python': platform.python_version(),
+        'html_parser': main.resolve_html_parser(),
+        'calibration_seconds': calibration,
+        'results': {name: round(value, 4) for name, value in results.items()},
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(document, f, ensure_ascii=False, indent=2, sort_keys=False)
+        f.write('\n')
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='基线文件路径')
+    parser.add_argument('--threshold', type=float, default=0.3, help='允许比基线慢的比例，默认 0.3 即 30%%')
+    parser.add_argument('--update-baseline', action='store_true', help='用本次结果覆盖基线')
+    parser.add_argument('--only', default='', help='只运行名称中包含该子串的用例')
+    parser.add_argument('--repeat', type=int, default=7)
+    args = parser.parse_args(argv)
+
+    bot = offline_bot()
+    cases = [(name, fn) for name, fn in build_cases(bot) if args.only in name]
+    # 与 timeit 一样计时期间关闭循环垃圾回收：内存中的大解析树会让 GC 扫描的耗时随机混进结果
+    gc.collect()
+    gc.disable()
+    try:
+        calibration = measure(calibration_workload, repeat=args.repeat)
+        measured = {name: normalized_time(fn, calibration_workload, args.repeat) for name, fn in cases}
+    finally:
+        gc.enable()
+    results = {name: normalized for name, (normalized, _) in measured.items()}
+
+    if args.update_baseline:
+        existing = load_baseline(args.baseline)
+        merged = dict(existing['results']) if existing and args.only else {}
+        merged.update(results)
+        write_baseline(args.baseline, calibration, merged)
+
+    baseline = load_baseline(args.baseline) or {'results': {}}
+    regressions = []
+    rows = []
+    for name, normalized in results.items():
+        expected = baseline['results'].get(name)
+        if expected is None:
+            status, delta = 'new', ''
+        else:
+            change = normalized / expected - 1
+            delta = f"{change:+.0%}"
+            status = 'ok'
+            if change > args.threshold:
+                status = 'REGRESSION'
+                regressions.append(name)
+        rows.append((
+            name,
+            f"{measured[name][1] * 1000:.3f} ms",
+            f"{normalized:.3f}",
+            '' if expected is None else f"{expected:.3f}",
+            delta,
+            status,
+        ))
+
+    print(f"calibration {calibration * 1000:.2f} ms | parser {main.resolve_html_parser()} | threshold {args.threshold:.0%}")
+    print_table(('case', 'time', 'normalized', 'baseline', 'delta', 'status'), rows)
+    if args.update_baseline:
+        print(f"\n基线已更新: {args.baseline}")
+    elif regressions:
+        print(f"\n{len(regressions)} 个用例慢于基线超过 {args.threshold:.0%}: " + ', '.join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
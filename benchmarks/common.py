@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""基准测试公共工具：离线机器人实例与计时函数。"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+
+def offline_bot(index=1, base_url="https://dash.hidencloud.com"):
+    """构造不加载缓存、不发起网络请求的机器人实例，只用于调用解析类方法。"""
+    bot = object.__new__(main.HidenCloudBot)
+    bot.index = index
+    bot.base_url = base_url
+    bot.csrf_token = ""
+    bot.session = None
+    bot.session_generation = 0
+    bot.services = []
+    bot.processed_invoices = set()
+    bot.non_payable_invoices = set()
+    bot.retry_needed = False
+    bot.invoice_index = None
+    bot._state_lock = threading.RLock()
+    bot._session_lock = threading.RLock()
+    bot._invoice_locks = {}
+    bot.log = lambda message: None
+    return bot
+
+
+def measure(fn, repeat=5, number=1):
+    """返回多次运行中最快一次的单次耗时（秒），减少调度抖动的影响。"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def print_table(headers, rows):
+    widths = [max(len(str(cell)) for cell in column) for column in zip(headers, *rows)]
+    line = '  '.join(str(header).ljust(width) for header, width in zip(headers, widths))
+    print(line)
+    print('-' * len(line))
+    for row in rows:
+        print('  '.join(str(cell).ljust(width) for cell, width in zip(row, widths)))
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+基准测试用的合成页面，结构仿照 HidenCloud 控制台（Tailwind 风格的嵌套 div、SVG 图标与内联脚本）。
+"""
+import random
+
+_ICON = (
+    '<svg class="h-5 w-5 text-gray-400" fill="none" viewBox="0 0 24 24" stroke="currentColor">'
+    '<path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M4 6h16M4 12h16M4 18h16"/></svg>'
+)
+
+
+def _layout(title, body, csrf_token="bench-token"):
+    nav_items = ''.join(
+        f'<li class="nav-item"><a class="flex items-center px-3 py-2 rounded-md" href="/{name}">{_ICON}'
+        f'<span class="ml-3">{name.title()}</span></a></li>'
+        for name in ('dashboard', 'store', 'invoices', 'tickets', 'affiliate', 'account', 'balance', 'docs')
+    )
+    return (
+        '<!DOCTYPE html><html lang="en"><head>'
+        f'<meta charset="utf-8"><meta name="csrf-token" content="{csrf_token}"><title>{title}</title>'
+        '<link rel="stylesheet" href="/build/app.css"><script>window.App = {"locale": "en"};</script>'
+        '</head><body class="bg-gray-100 dark:bg-gray-900">'
+        f'<div class="min-h-screen flex"><aside class="w-64 bg-white"><nav><ul>{nav_items}</ul></nav></aside>'
+        f'<main class="flex-1 p-6"><div class="max-w-7xl mx-auto">{body}</div></main></div>'
+        '<form method="POST" action="/logout"><input type="hidden" name="_token" '
+        f'value="{csrf_token}"><button type="submit">Sign out</button></form>'
+        '</body></html>'
+    )
+
+
+def simple_page(title, body):
+    """带完整站点外壳的任意页面。"""
+    return _layout(title, body)
+
+
+def dashboard_page(service_count, seed=0, first_id=100000, page=1, last_page=1):
+    rng = random.Random(seed)
+    cards = []
+    for offset in range(service_count):
+        service_id = first_id + offset
+        status = rng.choice(['Active', 'Active', 'Suspended', 'Pending'])
+        cards.append(
+            '<div class="rounded-lg shadow bg-white p-4"><div class="flex justify-between">'
+            f'<div class="flex items-center">{_ICON}<h3 class="ml-2 font-semibold">Game Server #{service_id}</h3></div>'
+            f'<span class="inline-flex rounded-full px-2 text-xs font-semibold">{status}</span></div>'
+            '<div class="mt-3 grid grid-cols-3 gap-2 text-sm text-gray-500">'
+            f'<div><span>CPU</span><span>{rng.randint(1, 8)} vCore</span></div>'
+            f'<div><span>RAM</span><span>{rng.randint(1, 16)} GB</span></div>'
+            f'<div><span>Disk</span><span>{rng.randint(10, 100)} GB</span></div></div>'
+            f'<div class="mt-4 flex gap-2"><a class="btn btn-primary" href="/service/{service_id}/manage">Manage</a>'
+            f'<a class="btn" href="https://panel.example.com/server/{service_id:x}">Panel</a></div></div>'
+        )
+    body = f'<h1 class="text-2xl">Dashboard</h1><div class="grid grid-cols-3 gap-4">{"".join(cards)}</div>'
+    if last_page > 1:
+        body += pagination_nav(page, last_page)
+    return _layout('Dashboard - HidenCloud', body)
+
+
+def pagination_nav(page, last_page, window=2, path='/dashboard'):
+    """Laravel 风格的分页条：首尾页、当前页附近的页码与上一页 / 下一页，中间以省略号代替。"""
+    shown = sorted({1, last_page} | set(range(max(1, page - window), min(last_page, page + window) + 1)))
+    items = []
+    if page > 1:
+        items.append(f'<a rel="prev" href="?page={page - 1}">&laquo; Previous</a>')
+    previous = 0
+    for number in shown:
+        if number - previous > 1:
+            items.append('<span>...</span>')
+        if number == page:
+            items.append(f'<span aria-current="page">{number}</span>')
+        else:
+            items.append(f'<a href="{path}?page={number}">{number}</a>')
+        previous = number
+    if page < last_page:
+        items.append(f'<a rel="next" href="?page={page + 1}">Next &raquo;</a>')
+    return f'<nav role="navigation" aria-label="Pagination Navigation" class="mt-6 flex">{"".join(items)}</nav>'
+
+
+def invoice_list_page(row_count, unpaid_ratio=0.1, seed=0):
+    rng = random.Random(seed)
+    rows = []
+    for offset in range(row_count):
+        invoice_id = f"inv{offset:06d}"
+        unpaid = rng.random() < unpaid_ratio
+        status = 'Unpaid' if unpaid else rng.choice(['Paid', 'Cancelled', 'Refunded'])
+        rows.append(
+            '<tr class="border-b"><td class="px-4 py-2"><div class="flex items-center">'
+            f'{_ICON}<span class="ml-2">#{invoice_id}</span></div></td>'
+            f'<td class="px-4 py-2">€{rng.randint(0, 20)}.00</td>'
+            f'<td class="px-4 py-2"><span class="badge">{status}</span></td>'
+            f'<td class="px-4 py-2"><a href="/payment/invoice/{invoice_id}">View</a> '
+            f'<a href="/payment/invoice/{invoice_id}/download">PDF</a></td></tr>'
+        )
+    body = (
+        '<div class="bg-white shadow rounded-lg"><table class="min-w-full"><thead><tr>'
+        '<th>Invoice</th><th>Total</th><th>Status</th><th></th></tr></thead>'
+        f'<tbody>{"".join(rows)}</tbody></table></div>'
+    )
+    return _layout('Invoices - HidenCloud', body)
+
+
+def nested_invoice_list_page(row_count, depth=6, unpaid_ratio=0.1, seed=0):
+    """每一行都包在多层 div 中，模拟组件化模板产生的深层嵌套。"""
+    rng = random.Random(seed)
+    rows = []
+    for offset in range(row_count):
+        invoice_id = f"inv{offset:06d}"
+        status = 'Unpaid' if rng.random() < unpaid_ratio else 'Paid'
+        inner = (
+            f'<span class="badge">{status}</span> <span>#{invoice_id}</span> '
+            f'<a href="/payment/invoice/{invoice_id}">View</a>'
+        )
+        for level in range(depth):
+            inner = f'<div class="wrapper-{level}">{inner}</div>'
+        rows.append(f'<li class="invoice-row">{inner}</li>')
+    body = f'<section class="invoices"><ul>{"".join(rows)}</ul></section>'
+    return _layout('Invoices - HidenCloud', body)
+
+
+def service_invoices_page(entries):
+    """单个服务的账单列表，entries 为 (invoice_id, status) 序列。"""
+    rows = ''.join(
+        '<tr class="border-b">'
+        f'<td class="px-4 py-2">#{invoice_id}</td>'
+        f'<td class="px-4 py-2"><span class="badge">{status}</span></td>'
+        f'<td class="px-4 py-2"><a href="/payment/invoice/{invoice_id}">View</a></td></tr>'
+        for invoice_id, status in entries
+    )
+    body = (
+        '<div class="bg-white shadow rounded-lg"><table class="min-w-full"><thead><tr>'
+        '<th>Invoice</th><th>Status</th><th></th></tr></thead>'
+        f'<tbody>{rows}</tbody></table></div>'
+    )
+    return _layout('Invoices - HidenCloud', body)
+
+
+def account_invoices_page(entries, page=1, last_page=1):
+    """账号级账单列表，entries 为 (invoice_id, service_id, status) 序列，每行带所属服务的链接。"""
+    rows = ''.join(
+        '<tr class="border-b">'
+        f'<td class="px-4 py-2">#{invoice_id}</td>'
+        f'<td class="px-4 py-2"><a href="/service/{service_id}/manage">Game Server #{service_id}</a></td>'
+        f'<td class="px-4 py-2"><span class="badge">{status}</span></td>'
+        f'<td class="px-4 py-2"><a href="/payment/invoice/{invoice_id}">View</a></td></tr>'
+        for invoice_id, service_id, status in entries
+    )
+    body = (
+        '<div class="bg-white shadow rounded-lg"><table class="min-w-full"><thead><tr>'
+        '<th>Invoice</th><th>Service</th><th>Status</th><th></th></tr></thead>'
+        f'<tbody>{rows}</tbody></table></div>'
+    )
+    if last_page > 1:
+        body += pagination_nav(page, last_page, path='/invoices')
+    return _layout('Invoices - HidenCloud', body)
+
+
+def invoice_page(invoice_id="inv000001", line_items=5, payable=True):
+    items = ''.join(
+        f'<tr><td>Renewal line {index}</td><td>€0.00</td></tr>' for index in range(line_items)
+    )
+    pay_form = (
+        f'<form method="POST" action="/payment/invoice/{invoice_id}/pay">'
+        '<input type="hidden" name="_token" value="bench-token">'
+        '<input type="hidden" name="gateway" value="balance">'
+        '<button type="submit" class="btn btn-primary">Pay now</button></form>'
+    ) if payable else '<span class="badge">Paid</span>'
+    body = (
+        f'<div class="bg-white p-6"><h1>Invoice #{invoice_id}</h1>'
+        f'<p>Status: {"Unpaid" if payable else "Paid"}</p><table>{items}</table>'
+        '<form method="POST" action="/balance/add"><input name="amount"><button>Add balance</button></form>'
+        f'{pay_form}</div>'
+    )
+    return _layout(f'Invoice {invoice_id} - HidenCloud', body)
+
+
+def manage_page(service_id, days_until=0, threshold=1, is_free=True, extra_forms=3):
+    forms = ''.join(
+        f'<form method="POST" action="/service/{service_id}/settings/{index}">'
+        f'<input type="hidden" name="_token" value="bench-token"><input name="field{index}" value="v">'
+        f'<button type="submit">Save</button></form>'
+        for index in range(extra_forms)
+    )
+    body = (
+        f'<h1>Service #{service_id}</h1>'
+        f'<button type="button" onclick="showRenewAlert({days_until}, {threshold}, {"true" if is_free else "false"})">'
+        'Renew</button>'
+        f'{forms}'
+        f'<form method="POST" action="/service/{service_id}/renew">'
+        '<input type="hidden" name="_token" value="bench-token">'
+        '<select name="days"><option value="7" selected>7 days</option><option value="30">30 days</option></select>'
+        '<button type="submit">Renew service</button></form>'
+        '<div role="alert" class="border-red-300 text-red-800">Warning: This action is irreversible.</div>'
+    )
+    return _layout(f'Manage {service_id} - HidenCloud', body)
+
+
+def settings_form_page(field_count, seed=0):
+    """单个大表单，混合文本框、复选框、单选、下拉与多行文本，用于表单字段提取。"""
+    rng = random.Random(seed)
+    fields = ['<input type="hidden" name="_token" value="bench-token">']
+    for index in range(field_count):
+        kind = index % 5
+        if kind == 0:
+            fields.append(f'<label>Field {index}<input type="text" name="text{index}" value="v{index}"></label>')
+        elif kind == 1:
+            checked = ' checked' if rng.random() < 0.5 else ''
+            fields.append(f'<label><input type="checkbox" name="flag{index}" value="1"{checked}> Flag {index}</label>')
+        elif kind == 2:
+            options = ''.join(
+                f'<option value="{value}"{" selected" if value == 2 else ""}>Option {value}</option>'
+                for value in range(4)
+            )
+            fields.append(f'<select name="choice{index}">{options}</select>')
+        elif kind == 3:
+            fields.append(f'<textarea name="note{index}">Note {index}</textarea>')
+        else:
+            fields.append(f'<input type="text" name="locked{index}" value="x" disabled>')
+    wrapped = ''.join(f'<div class="field">{field}</div>' for field in fields)
+    body = (
+        '<form method="POST" action="/account/settings"><div class="grid grid-cols-2 gap-4">'
+        f'{wrapped}</div><button type="submit">Save</button></form>'
+    )
+    return _layout('Settings - HidenCloud', body)
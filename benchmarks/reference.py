@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+优化前的实现，保留为基准对照与等价性测试的参照，不在运行时使用。
+"""
+import re
+
+LEGACY_POSITIVE_KEYWORDS = [
+    'unpaid', 'pending', 'pay now', 'payment due', 'pay invoice',
+    'pendiente', 'pagar ahora', 'sin pagar',
+    '未支付', '待支付', '待付款', '立即支付', '去支付', '付款', '支付'
+]
+LEGACY_NEGATIVE_KEYWORDS = [
+    'paid', 'completed', 'cancelled', 'canceled', 'refunded',
+    'pagado', 'completado', 'cancelado', 'reembolsado',
+    '已支付', '已付款', '已完成', '已取消', '已退款', '作废'
+]
+
+
+def contains_context_keyword(normalized_text, keyword):
+    if re.search(r'[a-z0-9]', keyword):
+        pattern = rf'(?<![a-z0-9]){re.escape(keyword)}(?![a-z0-9])'
+        return re.search(pattern, normalized_text) is not None
+    return keyword in normalized_text
+
+
+def has_invoice_payment_context(text, positive_keywords=LEGACY_POSITIVE_KEYWORDS,
+                                negative_keywords=LEGACY_NEGATIVE_KEYWORDS):
+    normalized = re.sub(r'\s+', ' ', text or '').strip().lower()
+    if not normalized:
+        return False
+    has_positive = any(contains_context_keyword(normalized, keyword) for keyword in positive_keywords)
+    has_negative = any(contains_context_keyword(normalized, keyword) for keyword in negative_keywords)
+    return has_positive and not has_negative
+
+
+def extract_contextual_invoice_links(bot, soup, context_check=has_invoice_payment_context):
+    """逐个容器调用 find_all / get_text，嵌套越深重复扫描越多。"""
+    invoice_links = []
+    for container in soup.find_all(['tr', 'li', 'div', 'article', 'section']):
+        links = []
+        for a in container.find_all('a', href=True):
+            href = a['href']
+            if '/invoice/' in href and 'download' not in href:
+                links.append(bot.normalize_url(href))
+        if not links:
+            continue
+        if context_check(container.get_text(" ", strip=True)):
+            invoice_links.extend(links)
+    return sorted(set(invoice_links))
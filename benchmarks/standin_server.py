@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+本地 HidenCloud 替身服务器，模拟控制台、管理页、续期、账单列表（账号级与服务级）与支付接口，供端到端基准使用。
+
+账号通过 Cookie `hc_account=<序号>` 区分；每个账号有 M 个服务，服务的续期行为按比例混合：
+  redirect  续期后 302 跳转到新账单
+  csrf      首次续期返回 419，刷新 Token 后重试成功
+  link      续期后返回包含账单链接的页面
+  not_due   管理页显示尚未到续期时间
+  reject    续期被服务端拒绝
+部分服务预先带有一张未付账单，用于覆盖预检支付路径。指定 page_size 时控制台按 Laravel 风格分页。
+
+单独运行: python -m benchmarks.standin_server [--accounts 2] [--services 5] [--port 8765]
+"""
+import argparse
+import random
+import re
+import threading
+import time
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks import pages
+
+DEFAULT_MIX = (('redirect', 60), ('csrf', 15), ('link', 10), ('not_due', 10), ('reject', 5))
+FIRST_SERVICE_ID = 100000
+PRECHECK_INVOICE_EVERY = 7
+
+_MANAGE = re.compile(r'^/service/(\d+)/manage$')
+_RENEW = re.compile(r'^/service/(\d+)/renew$')
+_INVOICES = re.compile(r'^/service/(\d+)/invoices$')
+_INVOICE = re.compile(r'^/payment/invoice/([\w-]+)$')
+_PAY = re.compile(r'^/payment/invoice/([\w-]+)/pay$')
+
+
+class StandInState:
+    """替身服务器的全部业务状态，所有读写都在同一把锁内完成。"""
+
+    def __init__(self, accounts, services, mix=DEFAULT_MIX, seed=0, page_size=0):
+        rng = random.Random(seed)
+        self.page_size = page_size
+        modes = [mode for mode, weight in mix for _ in range(weight)]
+        self.lock = threading.Lock()
+        self.accounts = {}
+        self.services = {}
+        self.invoices = {}
+        self.counters = {'renewed': 0, 'paid': 0, 'rejected': 0, 'expired_tokens': 0}
+        self._next_invoice = 0
+        for account in range(1, accounts + 1):
+            first_id = FIRST_SERVICE_ID + account * 1000
+            self.accounts[account] = first_id
+            for offset in range(services):
+                service_id = str(first_id + offset)
+                self.services[service_id] = {
+                    'account': account,
+                    'mode': rng.choice(modes),
+                    'renew_attempts': 0,
+                    'invoices': [],
+                }
+                if offset % PRECHECK_INVOICE_EVERY == PRECHECK_INVOICE_EVERY - 1:
+                    self._new_invoice(service_id)
+
+    def _new_invoice(self, service_id):
+        self._next_invoice += 1
+        invoice_id = f"inv{self._next_invoice:06d}"
+        self.invoices[invoice_id] = {'service': service_id, 'paid': False}
+        self.services[service_id]['invoices'].append(invoice_id)
+        return invoice_id
+
+    def owns(self, account, service_id):
+        service = self.services.get(service_id)
+        return service is not None and service['account'] == account
+
+    def service_count(self, account):
+        return sum(1 for service in self.services.values() if service['account'] == account)
+
+    def renew(self, service_id):
+        """返回 (状态码, 跳转地址或 None, 页面)。"""
+        with self.lock:
+            service = self.services[service_id]
+            service['renew_attempts'] += 1
+            mode = service['mode']
+            if mode == 'csrf' and service['renew_attempts'] == 1:
+                self.counters['expired_tokens'] += 1
+                return 419, None, pages.simple_page('Page Expired', '<h1>419 | Page Expired</h1>')
+            if mode == 'reject':
+                self.counters['rejected'] += 1
+                body = '<div role="alert" class="text-red-800">Error: You can only renew your free service once a day.</div>'
+                return 200, None, pages.simple_page('Manage - HidenCloud', body)
+            self.counters['renewed'] += 1
+            invoice_id = self._new_invoice(service_id)
+        if mode == 'link':
+            body = f'<p>Your renewal invoice is ready.</p><a href="/payment/invoice/{invoice_id}">View invoice</a>'
+            return 200, None, pages.simple_page('Renewed - HidenCloud', body)
+        return 302, f"/payment/invoice/{invoice_id}", ''
+
+    def unpaid(self, service_id):
+        with self.lock:
+            return [(invoice_id, 'Unpaid') for invoice_id in self.services[service_id]['invoices']
+                    if not self.invoices[invoice_id]['paid']]
+
+    def account_unpaid(self, account):
+        with self.lock:
+            return [(invoice_id, invoice['service'], 'Unpaid') for invoice_id, invoice in self.invoices.items()
+                    if not invoice['paid'] and self.services[invoice['service']]['account'] == account]
+
+    def pay(self, invoice_id):
+        with self.lock:
+            invoice = self.invoices.get(invoice_id)
+            if invoice is None or invoice['paid']:
+                return False
+            invoice['paid'] = True
+            self.counters['paid'] += 1
+            return True
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.counters)
+
+
+def make_handler(state, latency=0.0):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # 头部与正文分两次写出，关闭 Nagle 避免与延迟 ACK 叠加出 40ms 的假延迟
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def account(self):
+            cookie = SimpleCookie(self.headers.get('Cookie', ''))
+            morsel = cookie.get('hc_account')
+            try:
+                account = int(morsel.value) if morsel else 0
+            except ValueError:
+                return 0
+            return account if account in state.accounts else 0
+
+        def reply(self, status, html='', location=None):
+            payload = html.encode('utf-8')
+            self.send_response(status)
+            if location:
+                self.send_header('Location', location)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def page_window(self, query, total):
+            """按 ?page=N 与 page_size 返回 (页码, 末页, 起始偏移)。"""
+            last_page = max(1, -(-total // state.page_size))
+            page = min(last_page, max(1, int((parse_qs(query).get('page') or ['1'])[-1] or 1)))
+            return page, last_page, (page - 1) * state.page_size
+
+        def handle_route(self, method):
+            if latency:
+                time.sleep(latency)
+            if method == 'POST':
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    self.rfile.read(length)
+
+            parsed = urlparse(self.path)
+            path, query = parsed.path, parsed.query
+            if path == '/login':
+                return self.reply(200, pages.simple_page('Login - HidenCloud', '<form action="/login"></form>'))
+            account = self.account()
+            if not account:
+                return self.reply(302, location='/login')
+
+            if method == 'GET' and path == '/dashboard':
+                total = state.service_count(account)
+                if not state.page_size:
+                    return self.reply(200, pages.dashboard_page(total, seed=account, first_id=state.accounts[account]))
+                page, last_page, offset = self.page_window(query, total)
+                return self.reply(200, pages.dashboard_page(
+                    min(state.page_size, total - offset), seed=account * 1000 + page,
+                    first_id=state.accounts[account] + offset, page=page, last_page=last_page))
+
+            if method == 'GET' and path == '/invoices':
+                entries = state.account_unpaid(account)
+                if not state.page_size:
+                    return self.reply(200, pages.account_invoices_page(entries))
+                page, last_page, offset = self.page_window(query, len(entries))
+                return self.reply(200, pages.account_invoices_page(
+                    entries[offset:offset + state.page_size], page=page, last_page=last_page))
+
+            match = _MANAGE.match(path)
+            if method == 'GET' and match and state.owns(account, match.group(1)):
+                service_id = match.group(1)
+                not_due = state.services[service_id]['mode'] == 'not_due'
+                return self.reply(200, pages.manage_page(service_id, days_until=5 if not_due else 0))
+
+            match = _RENEW.match(path)
+            if method == 'POST' and match and state.owns(account, match.group(1)):
+                status, location, html = state.renew(match.group(1))
+                return self.reply(status, html, location=location)
+
+            match = _INVOICES.match(path)
+            if method == 'GET' and match and state.owns(account, match.group(1)):
+                return self.reply(200, pages.service_invoices_page(state.unpaid(match.group(1))))
+
+            match = _PAY.match(path)
+            if method == 'POST' and match:
+                if state.pay(match.group(1)):
+                    return self.reply(200, pages.simple_page('Paid - HidenCloud', '<p>Invoice paid.</p>'))
+                return self.reply(422, pages.simple_page('Error', '<div role="alert">Error: invoice cannot be paid.</div>'))
+
+            match = _INVOICE.match(path)
+            if method == 'GET' and match and match.group(1) in state.invoices:
+                invoice_id = match.group(1)
+                return self.reply(200, pages.invoice_page(invoice_id, payable=not state.invoices[invoice_id]['paid']))
+
+            return self.reply(404, pages.simple_page('Not Found', '<h1>404</h1>'))
+
+        def do_GET(self):
+            self.handle_route('GET')
+
+        def do_POST(self):
+            self.handle_route('POST')
+
+    return Handler
+
+
+class StandInServer:
+    def __init__(self, accounts, services, mix=DEFAULT_MIX, seed=0, latency=0.0, host='127.0.0.1', port=0,
+                 page_size=0):
+        self.state = StandInState(accounts, services, mix=mix, seed=seed, page_size=page_size)
+        self.httpd = ThreadingHTTPServer((host, port), make_handler(self.state, latency))
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def cookies(self):
+        return [f"hc_account={account}" for account in sorted(self.state.accounts)]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description='本地 HidenCloud 替身服务器')
+    parser.add_argument('--accounts', type=int, default=2)
+    parser.add_argument('--services', type=int, default=5)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--page-size', type=int, default=0, help='控制台每页服务数，0 表示不分页')
+    args = parser.parse_args(argv)
+
+    with StandInServer(args.accounts, args.services, latency=args.latency_ms / 1000, port=args.port,
+                       page_size=args.page_size) as server:
+        print(f"替身服务器已启动: {server.base_url}")
+        print("账号 Cookie: " + ' | '.join(server.cookies()))
+        try:
+            server.thread.join()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main_cli()
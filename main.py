@@ -4,15 +4,28 @@ HidenCloud 自动续期 - Python 全日志推送版
 """
 import os
 import sys
+import atexit
+import tempfile
 import time
 import json
-import random
+import hashlib
 import re
+from bisect import bisect_left
+import threading
+import logging
+import argparse
+import cProfile
+import tracemalloc
+from collections import deque
+from logging.handlers import RotatingFileHandler
 import requests
 import cloudscraper
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin, unquote
-from notify import send_notify
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from urllib.parse import urljoin, unquote, urlparse, parse_qs, urlencode
+from notify import send_notify, set_logger as set_notify_logger
 try:
     from cookie_context import normalize_cookie_records, parse_seed_cookie_string, success_path_label
 except ModuleNotFoundError:
@@ -100,19 +113,241 @@ except ModuleNotFoundError:
         return '进入成功路径'
 
 # ================= 配置常量 =================
+def env_int(name, default, minimum=None):
+    try:
+        value = int(os.environ.get(name, '').strip() or default)
+    except ValueError:
+        value = default
+    if minimum is not None:
+        value = max(minimum, value)
+    return value
+
+def env_float(name, default, minimum=None):
+    try:
+        value = float(os.environ.get(name, '').strip() or default)
+    except ValueError:
+        value = default
+    if minimum is not None:
+        value = max(minimum, value)
+    return value
+
 RENEW_DAYS = 7
 CACHE_FILE_NAME = 'hiden_cookies.json'
 LOCAL_CACHE_PATH = os.path.join(os.path.dirname(__file__), CACHE_FILE_NAME)
+# 云端缓存布局：single 为单个 JSON 文件；sharded 为每个账号一个分片加一份清单，两种布局读取时互为回退
+WEBDAV_LAYOUT = os.environ.get('WEBDAV_LAYOUT', '').strip().lower() or 'single'
+SHARD_DIR_NAME = 'hiden_cookies'
+# 续期计划：记录每个服务距可续期的天数，未到期的服务下次运行时直接跳过
+SCHEDULE_FILE_NAME = 'hiden_schedule.json'
+LOCAL_SCHEDULE_PATH = os.path.join(os.path.dirname(__file__), SCHEDULE_FILE_NAME)
+# 即使计划显示未到期，距上次检查满这么多天也完整检查一次；0 表示关闭跳过，每次都检查
+SCHEDULE_FULL_CHECK_DAYS = env_float('SCHEDULE_FULL_CHECK_DAYS', 3, minimum=0)
+# 通知摘要只保留最近的日志行数；完整日志流式写入本地滚动文件（LOG_FILE 置空则关闭）
+LOG_DIGEST_LINES = env_int('LOG_DIGEST_LINES', 2000, minimum=1)
+LOG_FILE = os.environ.get('LOG_FILE', os.path.join(os.path.dirname(__file__), 'hidencloud.log')).strip()
+LOG_FILE_MAX_BYTES = env_int('LOG_FILE_MAX_BYTES', 1024 * 1024, minimum=1024)
+LOG_FILE_BACKUPS = env_int('LOG_FILE_BACKUPS', 3, minimum=0)
+# 同时运行的账号数量上限，1 表示按顺序逐个运行
+ACCOUNT_CONCURRENCY = env_int('ACCOUNT_CONCURRENCY', 3, minimum=1)
+# 单个账号内同时处理的服务数量上限，默认 1 即逐个处理
+SERVICE_CONCURRENCY = env_int('SERVICE_CONCURRENCY', 1, minimum=1)
+# 控制台服务列表与账单列表分页时最多读取的页数（含第一页），后续页面在全局限速内并发抓取
+DASHBOARD_MAX_PAGES = env_int('DASHBOARD_MAX_PAGES', 20, minimum=1)
+# 账号级未付账单列表（如 /invoices?where=unpaid），每个账号运行前扫描一次代替逐个服务的预检请求。
+# 该路由尚未在真实控制台上确认，默认关闭；留空或设为 off 时逐个服务预检
+INVOICE_SWEEP_PATH = os.environ.get('INVOICE_SWEEP_PATH', '').strip()
+if INVOICE_SWEEP_PATH.lower() in ('off', 'none', '0'):
+    INVOICE_SWEEP_PATH = ''
+# HTML 解析后端：auto 优先使用 lxml，未安装时回退到内置 html.parser；也可指定 lxml / html5lib / html.parser
+HTML_PARSER = os.environ.get('HTML_PARSER', '').strip() or 'auto'
+HTML_PARSER_PREFERENCE = ('lxml', 'html.parser')
+
+# 账单上下文关键词：包含英文/数字的按单词边界匹配，中文按子串匹配。
+# 可通过 INVOICE_POSITIVE_KEYWORDS / INVOICE_NEGATIVE_KEYWORDS 环境变量追加（逗号、分号或换行分隔）
+INVOICE_POSITIVE_KEYWORDS = [
+    'unpaid', 'pending', 'pay now', 'payment due', 'pay invoice',
+    'pendiente', 'pagar ahora', 'sin pagar',
+    '未支付', '待支付', '待付款', '立即支付', '去支付', '付款', '支付'
+]
+INVOICE_NEGATIVE_KEYWORDS = [
+    'paid', 'completed', 'cancelled', 'canceled', 'refunded',
+    'pagado', 'completado', 'cancelado', 'reembolsado',
+    '已支付', '已付款', '已完成', '已取消', '已退款', '作废'
+]
+INVOICE_CONTAINER_TAGS = frozenset(['tr', 'li', 'div', 'article', 'section'])
 
 # ================= 全局日志收集器 =================
-ALL_LOGS = []
+class ConsoleSink:
+    # ordered 输出端在并发时按账号 / 服务顺序整块接收日志，其余输出端实时逐行接收
+    ordered = True
+
+    def write(self, line):
+        print(line)
+
+class RingBufferSink:
+    """保留最近 maxlen 行日志用于通知摘要，更早的行只计数，内存占用有上限。"""
+
+    ordered = True
+
+    def __init__(self, maxlen):
+        self._lines = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def write(self, line):
+        with self._lock:
+            if len(self._lines) == self._lines.maxlen:
+                self.dropped += 1
+            self._lines.append(line)
+
+    def clear(self):
+        with self._lock:
+            self._lines.clear()
+            self.dropped = 0
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._lines)
+
+    def __iter__(self):
+        return iter(self.snapshot())
+
+    def __len__(self):
+        return len(self._lines)
+
+    def __getitem__(self, index):
+        return self.snapshot()[index]
+
+    def digest(self):
+        """通知正文：被挤出缓冲区的行用一行提示代替。"""
+        lines = self.snapshot()
+        if self.dropped:
+            lines.insert(0, f"……已省略前 {self.dropped} 行日志，完整内容见运行日志文件")
+        return lines
+
+class RotatingFileSink:
+    """逐行追加到本地滚动日志文件，进程中途崩溃也不会丢失已输出的日志。"""
+
+    def __init__(self, path, max_bytes=LOG_FILE_MAX_BYTES, backup_count=LOG_FILE_BACKUPS):
+        self._handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        self._handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+
+    def write(self, line):
+        self._handler.handle(logging.makeLogRecord({'msg': line, 'levelno': logging.INFO, 'levelname': 'INFO'}))
+
+    def close(self):
+        self._handler.close()
+
+class LogHub:
+    """
+    把每行日志分发给所有输出端；单个输出端出错不影响其他输出端。
+
+    streamed=True 表示这行已在产生时实时写给了非 ordered 的输出端（文件等），此时只补发给 ordered 输出端。
+    """
+
+    def __init__(self, sinks=()):
+        self._sinks = list(sinks)
+        self._lock = threading.Lock()
+
+    def add(self, sink):
+        with self._lock:
+            self._sinks.append(sink)
+        return sink
+
+    def remove(self, sink):
+        with self._lock:
+            if sink in self._sinks:
+                self._sinks.remove(sink)
+
+    def emit(self, line, streamed=False, ordered=True):
+        with self._lock:
+            for sink in self._sinks:
+                if getattr(sink, 'ordered', False) is True:
+                    if not ordered:
+                        continue
+                elif streamed:
+                    continue
+                try:
+                    sink.write(line)
+                except Exception:
+                    pass
+
+# 通知摘要缓冲区，沿用 ALL_LOGS 这个名字
+ALL_LOGS = RingBufferSink(LOG_DIGEST_LINES)
+LOG_HUB = LogHub([ConsoleSink(), ALL_LOGS])
+_log_capture = threading.local()
+
+def add_log_sink(sink):
+    """注册额外的日志输出端，sink 需提供 write(line) 方法。"""
+    return LOG_HUB.add(sink)
+
+def configure_log_sinks():
+    """启用本地滚动日志文件并接管通知模块日志；只在脚本入口调用，导入 main 不产生副作用。"""
+    if LOG_FILE:
+        try:
+            sink = add_log_sink(RotatingFileSink(LOG_FILE))
+            atexit.register(sink.close)
+        except OSError as e:
+            log_print(f"⚠️ 无法打开日志文件 {LOG_FILE}: {e}")
+    set_notify_logger(log_print)
 
 def log_print(msg):
-    print(msg)
-    ALL_LOGS.append(str(msg))
+    line = str(msg)
+    buffer = getattr(_log_capture, 'buffer', None)
+    if buffer is not None:
+        # 文件等实时输出端立即写入，崩溃时不丢日志；控制台与通知摘要稍后按顺序补发
+        LOG_HUB.emit(line, ordered=False)
+        buffer.append(line)
+        return
+    LOG_HUB.emit(line)
+
+@contextmanager
+def capture_logs():
+    """
+    暂存当前线程发往控制台与通知摘要的日志，由调用方用 replay_logs 按固定顺序输出，避免并发时日志交错。
+    文件等实时输出端不受影响，照常逐行写入。
+    """
+    previous = getattr(_log_capture, 'buffer', None)
+    buffer = []
+    _log_capture.buffer = buffer
+    try:
+        yield buffer
+    finally:
+        _log_capture.buffer = previous
+
+def emit_logs(lines):
+    for line in lines:
+        log_print(line)
+
+def replay_logs(lines):
+    """输出 capture_logs 暂存的日志：只补发给 ordered 输出端；仍处于外层暂存时并入外层缓冲区。"""
+    buffer = getattr(_log_capture, 'buffer', None)
+    if buffer is not None:
+        buffer.extend(lines)
+        return
+    for line in lines:
+        LOG_HUB.emit(line, streamed=True)
 
 # ================= WebDAV 模块 =================
 class WebDavManager:
+    # 所有 WebDAV 请求共用一个带连接池的会话，保持长连接
+    _http = None
+    _http_lock = threading.Lock()
+    # 最近一次确认的云端缓存内容，上传时以它为底合并本机改动
+    _remote_lock = threading.Lock()
+    _remote_base = None
+
+    @classmethod
+    def http(cls):
+        with cls._http_lock:
+            if cls._http is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=2, pool_maxsize=4)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                cls._http = session
+            return cls._http
+
     def __init__(self):
         self.url = os.environ.get("WEBDAV_URL", "")
         self.user = os.environ.get("WEBDAV_USER")
@@ -121,55 +356,976 @@ class WebDavManager:
         if self.url and not self.url.endswith('/'):
             self.url += '/'
         self.full_url = self.url + CACHE_FILE_NAME if self.url else ""
+        self.shard_url = self.url + SHARD_DIR_NAME + '/' if self.url else ""
+        self.manifest_url = self.shard_url + 'manifest.json' if self.url else ""
+        self.schedule_url = self.url + SCHEDULE_FILE_NAME if self.url else ""
+        self.layout = WEBDAV_LAYOUT if WEBDAV_LAYOUT in ('single', 'sharded') else 'single'
 
+    @property
+    def configured(self):
+        return bool(self.url and self.user)
+
+    def call(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', 30)
+        return self.http().request(method, url, auth=(self.user, self.password), **kwargs)
+
+    # ---------- 同步元数据（ETag / Last-Modified / 分片摘要） ----------
+    @staticmethod
+    def meta_path():
+        return LOCAL_CACHE_PATH + '.meta'
+
+    @classmethod
+    def load_meta(cls):
+        """读取上次同步记录的校验信息，按 single / manifest 分节保存。"""
+        try:
+            with open(cls.meta_path(), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return meta if isinstance(meta, dict) else {}
+
+    @classmethod
+    def update_meta(cls, section, value):
+        meta = cls.load_meta()
+        meta[section] = value
+        try:
+            atomic_write_text(cls.meta_path(), json.dumps(meta))
+        except OSError as e:
+            log_print(f"⚠️ 保存 WebDAV 校验信息失败: {e}")
+
+    @staticmethod
+    def validators_of(res):
+        meta = {}
+        if res.headers.get('ETag'):
+            meta['etag'] = res.headers['ETag']
+        if res.headers.get('Last-Modified'):
+            meta['last_modified'] = res.headers['Last-Modified']
+        return meta
+
+    @staticmethod
+    def precondition_headers(meta):
+        """根据已知的云端版本生成条件上传头，用于发现并发写入。"""
+        if meta.get('etag'):
+            return {'If-Match': meta['etag']}
+        if meta.get('last_modified'):
+            return {'If-Unmodified-Since': meta['last_modified']}
+        if meta.get('absent'):
+            return {'If-None-Match': '*'}
+        return {}
+
+    @staticmethod
+    def revalidation_headers(meta):
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def committed_validators(self, res, url):
+        """部分服务端 PUT 不返回 ETag，补一次 HEAD 获取新版本号。"""
+        meta = self.validators_of(res)
+        if not meta:
+            head = self.call('HEAD', url)
+            meta = self.validators_of(head) if head.status_code == 200 else {}
+        return meta
+
+    @staticmethod
+    def parse_remote(text):
+        try:
+            data = json.loads(text)
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+
+    # ---------- 分片布局 ----------
+    @staticmethod
+    def shard_body(key, cookie):
+        return json.dumps({'account': key, 'cookie': cookie}, sort_keys=True)
+
+    @staticmethod
+    def shard_digest(body):
+        return hashlib.sha256(body.encode('utf-8')).hexdigest()
+
+    def shard_url_of(self, key):
+        return f"{self.shard_url}account-{key}.json"
+
+    def fetch_shards(self, accounts, known):
+        """只下载摘要与已知内容不一致的分片，返回 (完整数据, 下载数量)；失败返回 (None, 0)。"""
+        data = {}
+        fetched = 0
+        for key, digest in accounts.items():
+            if key in known and self.shard_digest(self.shard_body(key, known[key])) == digest:
+                data[key] = known[key]
+                continue
+            res = self.call('GET', self.shard_url_of(key))
+            shard = self.parse_remote(res.text) if res.status_code == 200 else None
+            if shard is None or 'cookie' not in shard:
+                log_print(f"❌ 读取云端分片失败: 账号 {key}，状态码 {res.status_code}")
+                return None, 0
+            data[key] = shard['cookie']
+            fetched += 1
+        return data, fetched
+
+    def read_manifest(self, headers=None):
+        """返回 (状态, 清单账号摘要, 响应)；状态为 ok / not_modified / missing / error。"""
+        res = self.call('GET', self.manifest_url, headers=headers or {})
+        if res.status_code == 304:
+            return 'not_modified', None, res
+        if res.status_code == 404:
+            return 'missing', None, res
+        manifest = self.parse_remote(res.text) if res.status_code == 200 else None
+        if manifest is None or not isinstance(manifest.get('accounts'), dict):
+            return 'error', None, res
+        return 'ok', manifest['accounts'], res
+
+    def download_sharded(self):
+        local_exists = os.path.exists(LOCAL_CACHE_PATH)
+        meta = self.load_meta().get('manifest', {}) if local_exists else {}
+        status, accounts, res = self.read_manifest(self.revalidation_headers(meta))
+        if status == 'not_modified':
+            WebDavManager._remote_base = CacheManager.load()
+            log_print("✅ 云端缓存未变化，沿用本地缓存")
+        elif status == 'missing':
+            self.update_meta('manifest', {'absent': True})
+        elif status == 'error':
+            log_print(f"⚠️ 云端分片清单读取失败，状态码: {res.status_code}")
+        else:
+            data, fetched = self.fetch_shards(accounts, CacheManager.load() if local_exists else {})
+            if data is None:
+                return 'error'
+            atomic_write_text(LOCAL_CACHE_PATH, json.dumps(data, indent=2))
+            self.update_meta('manifest', dict(self.validators_of(res), accounts=accounts))
+            CacheManager.reload()
+            WebDavManager._remote_base = data
+            log_print(f"✅ 云端分片缓存下载成功（更新 {fetched}/{len(accounts)} 个账号）")
+        return status
+
+    def refresh_sharded(self):
+        """清单冲突后重新拉取云端清单和有变化的分片，作为合并基准。"""
+        status, accounts, res = self.read_manifest()
+        if status == 'missing':
+            WebDavManager._remote_base = {}
+            self.update_meta('manifest', {'absent': True})
+            return True
+        if status != 'ok':
+            log_print(f"❌ 重新获取云端分片清单失败: {res.status_code}")
+            return False
+        data, _ = self.fetch_shards(accounts, WebDavManager._remote_base or {})
+        if data is None:
+            return False
+        WebDavManager._remote_base = data
+        self.update_meta('manifest', dict(self.validators_of(res), accounts=accounts))
+        return True
+
+    def put_shard(self, key, body):
+        url = self.shard_url_of(key)
+        res = self.call('PUT', url, data=body, headers={'Content-Type': 'application/json'})
+        if res.status_code in (404, 409):
+            # 分片目录尚不存在，创建后重试
+            self.call('MKCOL', self.shard_url)
+            res = self.call('PUT', url, data=body, headers={'Content-Type': 'application/json'})
+        return res.status_code in (200, 201, 204)
+
+    def upload_sharded(self, desired):
+        """只上传内容变化的分片，再条件更新清单；返回 ok / conflict / error。"""
+        meta = self.load_meta().get('manifest', {})
+        known = meta.get('accounts', {})
+        digests = {}
+        for key, cookie in desired.items():
+            body = self.shard_body(key, cookie)
+            digests[key] = self.shard_digest(body)
+            if known.get(key) != digests[key] and not self.put_shard(key, body):
+                log_print(f"❌ WebDAV 分片上传失败: 账号 {key}")
+                return 'error'
+        if digests == known and not meta.get('absent'):
+            return 'ok'
+
+        manifest = json.dumps({'version': 1, 'accounts': digests}, indent=2, sort_keys=True)
+        headers = {'Content-Type': 'application/json'}
+        headers.update(self.precondition_headers(meta))
+        res = self.call('PUT', self.manifest_url, data=manifest, headers=headers)
+        if res.status_code == 412:
+            return 'conflict'
+        if res.status_code not in (200, 201, 204):
+            log_print(f"❌ WebDAV 分片清单上传失败: {res.status_code}")
+            return 'error'
+        self.update_meta('manifest', dict(self.committed_validators(res, self.manifest_url), accounts=digests))
+        # 旧的单文件布局已迁移，删除以免回退读取到过期内容
+        self.remove_single()
+        return 'ok'
+
+    def remove_sharded(self):
+        meta = self.load_meta().get('manifest')
+        if not meta or meta.get('absent'):
+            return
+        self.call('DELETE', self.manifest_url)
+        for key in meta.get('accounts', {}):
+            self.call('DELETE', self.shard_url_of(key))
+        self.update_meta('manifest', {'absent': True})
+
+    # ---------- 单文件布局 ----------
+    def download_single(self):
+        meta = self.load_meta().get('single', {}) if os.path.exists(LOCAL_CACHE_PATH) else {}
+        res = self.call('GET', self.full_url, headers=self.revalidation_headers(meta))
+        if res.status_code == 200:
+            atomic_write_text(LOCAL_CACHE_PATH, res.text)
+            self.update_meta('single', self.validators_of(res))
+            CacheManager.reload()
+            WebDavManager._remote_base = self.parse_remote(res.text)
+            log_print("✅ 云端缓存下载成功")
+            return 'ok'
+        if res.status_code == 304:
+            WebDavManager._remote_base = CacheManager.load()
+            log_print("✅ 云端缓存未变化，沿用本地缓存")
+            return 'not_modified'
+        if res.status_code == 404:
+            self.update_meta('single', {'absent': True})
+            return 'missing'
+        log_print(f"⚠️ 下载失败，状态码: {res.status_code}")
+        return 'error'
+
+    def refresh_single(self):
+        """上传冲突后重新拉取云端最新版本作为合并基准。"""
+        res = self.call('GET', self.full_url)
+        if res.status_code == 200:
+            remote = self.parse_remote(res.text)
+            if remote is None:
+                log_print("❌ 云端缓存内容无法解析，放弃合并")
+                return False
+            WebDavManager._remote_base = remote
+            self.update_meta('single', self.validators_of(res))
+            return True
+        if res.status_code == 404:
+            WebDavManager._remote_base = {}
+            self.update_meta('single', {'absent': True})
+            return True
+        log_print(f"❌ 重新获取云端缓存失败: {res.status_code}")
+        return False
+
+    def upload_single(self, desired):
+        headers = {'Content-Type': 'application/json'}
+        headers.update(self.precondition_headers(self.load_meta().get('single', {})))
+        res = self.call('PUT', self.full_url, data=json.dumps(desired, indent=2), headers=headers)
+        if res.status_code == 412:
+            return 'conflict'
+        if res.status_code not in (200, 201, 204):
+            log_print(f"❌ WebDAV 上传失败: {res.status_code}")
+            return 'error'
+        self.update_meta('single', self.committed_validators(res, self.full_url))
+        # 分片布局已迁移回单文件，删除清单以免回退读取到过期内容
+        self.remove_sharded()
+        return 'ok'
+
+    def remove_single(self):
+        meta = self.load_meta().get('single')
+        if not meta or meta.get('absent'):
+            return
+        self.call('DELETE', self.full_url)
+        self.update_meta('single', {'absent': True})
+
+    # ---------- 对外接口 ----------
     def download(self):
         if not self.url or not self.user:
             log_print("⚠️ 未配置 WebDAV，跳过云端同步")
             return
 
         log_print("☁️ 正在从 Infinicloud 下载缓存...")
+        # 当前布局不存在时读取另一种布局，实现两个方向的自动迁移
+        readers = [self.download_single, self.download_sharded]
+        if self.layout == 'sharded':
+            readers.reverse()
         try:
-            res = requests.get(self.full_url, auth=(self.user, self.password), timeout=30)
-            if res.status_code == 200:
-                with open(LOCAL_CACHE_PATH, 'w', encoding='utf-8') as f:
-                    f.write(res.text)
-                log_print("✅ 云端缓存下载成功")
-            elif res.status_code == 404:
-                log_print("⚪ 云端暂无缓存文件 (首次运行)")
-            else:
-                log_print(f"⚠️ 下载失败，状态码: {res.status_code}")
+            for reader in readers:
+                if reader() != 'missing':
+                    return
+            WebDavManager._remote_base = {}
+            log_print("⚪ 云端暂无缓存文件 (首次运行)")
         except Exception as e:
             log_print(f"❌ WebDAV 下载错误: {e}")
 
-    def upload(self, data):
-        if not self.url or not self.user:
-            return
+    def upload(self, data, changed=None, quiet=False, max_attempts=3):
+        """
+        条件上传缓存，返回是否成功；quiet 时只记录失败信息。
+        changed 为本机改动过的账号，发生并发写入冲突时只用这些账号覆盖云端最新内容。
+        """
+        if not self.configured:
+            return False
 
-        log_print("☁️ 正在上传最新缓存到 Infinicloud...")
+        if not quiet:
+            log_print("☁️ 正在上传最新缓存到 Infinicloud...")
+        changed = set(data) if changed is None else set(changed)
+        if self.layout == 'sharded':
+            writer, refresh = self.upload_sharded, self.refresh_sharded
+        else:
+            writer, refresh = self.upload_single, self.refresh_single
         try:
-            json_str = json.dumps(data, indent=2)
-            res = requests.put(
-                self.full_url,
-                data=json_str,
-                auth=(self.user, self.password),
-                headers={'Content-Type': 'application/json'},
-                timeout=30
-            )
-            if res.status_code in [200, 201, 204]:
-                log_print("✅ 云端缓存上传成功")
-            else:
-                log_print(f"❌ WebDAV 上传失败: {res.status_code}")
+            with WebDavManager._remote_lock:
+                for _ in range(max_attempts):
+                    base = WebDavManager._remote_base
+                    desired = dict(base) if base is not None else dict(data)
+                    desired.update({key: data[key] for key in changed if key in data})
+
+                    result = writer(desired)
+                    if result == 'ok':
+                        WebDavManager._remote_base = desired
+                        if not quiet:
+                            log_print("✅ 云端缓存上传成功")
+                        return True
+                    if result == 'error':
+                        return False
+                    log_print("⚠️ 云端缓存已被其他实例修改，按账号合并后重试")
+                    if not refresh():
+                        return False
+                log_print("❌ WebDAV 上传冲突重试次数已用尽")
         except Exception as e:
             log_print(f"❌ WebDAV 上传错误: {e}")
+        return False
+
+    # ---------- 续期计划 ----------
+    def fetch_schedule(self, meta=None):
+        """读取云端续期计划，返回 (服务记录, 校验信息)；未变化时服务记录为 {}，读取失败返回 (None, None)。"""
+        res = self.call('GET', self.schedule_url, headers=self.revalidation_headers(meta or {}))
+        if res.status_code == 304:
+            return {}, meta
+        if res.status_code == 404:
+            return {}, {'absent': True}
+        if res.status_code != 200:
+            log_print(f"⚠️ 云端续期计划读取失败，状态码: {res.status_code}")
+            return None, None
+        remote = self.parse_remote(res.text) or {}
+        services = remote.get('services')
+        return (services if isinstance(services, dict) else {}), self.validators_of(res)
+
+    def download_schedule(self):
+        if not self.configured:
+            return
+        meta = self.load_meta().get('schedule') if os.path.exists(LOCAL_SCHEDULE_PATH) else None
+        try:
+            services, meta = self.fetch_schedule(meta)
+        except Exception as e:
+            log_print(f"❌ 云端续期计划下载错误: {e}")
+            return
+        if services is None:
+            return
+        RenewalSchedule.merge(services)
+        self.update_meta('schedule', meta)
+
+    def upload_schedule(self, max_attempts=3):
+        """条件上传续期计划；云端已被其他实例修改时重新读取、按服务合并后重试。"""
+        if not self.configured:
+            return False
+        try:
+            meta = self.load_meta().get('schedule')
+            for _ in range(max_attempts):
+                if meta is None:
+                    services, meta = self.fetch_schedule()
+                    if services is None:
+                        return False
+                    RenewalSchedule.merge(services)
+                headers = {'Content-Type': 'application/json'}
+                headers.update(self.precondition_headers(meta))
+                body = json.dumps(RenewalSchedule.document(), indent=2)
+                res = self.call('PUT', self.schedule_url, data=body, headers=headers)
+                if res.status_code in (200, 201, 204):
+                    self.update_meta('schedule', self.committed_validators(res, self.schedule_url))
+                    return True
+                if res.status_code != 412:
+                    log_print(f"❌ 云端续期计划上传失败: {res.status_code}")
+                    return False
+                meta = None
+            log_print("❌ 云端续期计划上传冲突重试次数已用尽")
+        except Exception as e:
+            log_print(f"❌ 云端续期计划上传错误: {e}")
+        return False
+
+class CacheReplicator:
+    """
+    在后台线程把缓存快照同步到 WebDAV。上传进行中到达的多次更新只保留最新一份，
+    续期流程提交快照后立即返回，不等待网络；flush() 等待所有待上传快照完成。
+    未配置 WebDAV 时 submit() 直接忽略快照，不启动后台线程，也不计入同步统计。
+    """
+
+    def __init__(self, uploader=None, enabled=None):
+        self._uploader = uploader or (
+            lambda snapshot: WebDavManager().upload(snapshot, changed=CacheManager.changed_keys(), quiet=True)
+        )
+        if enabled is None:
+            enabled = (lambda: True) if uploader else (lambda: WebDavManager().configured)
+        self._enabled = enabled
+        self._cond = threading.Condition()
+        self._pending = None
+        self._busy = False
+        self._thread = None
+        self.submitted = 0
+        self.uploaded = 0
+        self.failed = 0
+
+    def submit(self, snapshot):
+        if not self._enabled():
+            return
+        with self._cond:
+            self._pending = snapshot
+            self.submitted += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='cache-replicator', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None:
+                    self._cond.wait()
+                snapshot, self._pending = self._pending, None
+                self._busy = True
+            ok = False
+            try:
+                ok = self._uploader(snapshot)
+            except Exception as e:
+                log_print(f"❌ WebDAV 后台同步错误: {e}")
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self.uploaded += 1
+                    if ok is False:
+                        self.failed += 1
+                    self._cond.notify_all()
+
+    def flush(self, timeout=120):
+        """等待最新快照上传完成；超时返回 False。"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending is None and not self._busy, timeout)
+
+    def summary(self):
+        with self._cond:
+            return self.submitted, self.uploaded, self.failed
+
+CACHE_REPLICATOR = CacheReplicator()
+
+# ================= 账单轮询策略 =================
+class InvoicePollPolicy:
+    """
+    续期提交后检查账单的轮询策略：先短暂等待，之后按倍数退避到间隔上限，整体不超过总时限。
+    max_attempts 为 None 时仅受总时限约束。
+    """
+
+    def __init__(self, first_delay=1.0, interval=1.0, backoff=2.0, max_interval=8.0, deadline=40.0, max_attempts=None):
+        self.first_delay = first_delay
+        self.interval = interval
+        self.backoff = backoff
+        self.max_interval = max_interval
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            first_delay=env_float('INVOICE_POLL_FIRST_DELAY', 1.0, minimum=0),
+            interval=env_float('INVOICE_POLL_INTERVAL', 1.0, minimum=0.1),
+            backoff=env_float('INVOICE_POLL_BACKOFF', 2.0, minimum=1.0),
+            max_interval=env_float('INVOICE_POLL_MAX_INTERVAL', 8.0, minimum=0.1),
+            deadline=env_float('INVOICE_POLL_DEADLINE', 40.0, minimum=0),
+        )
+
+    @classmethod
+    def single(cls):
+        return cls(first_delay=0, deadline=None, max_attempts=1)
+
+    def next_wait(self, attempt, elapsed):
+        """第 attempt 次检查未发现账单后，返回下一次检查前的等待秒数；不再重试时返回 None。"""
+        if self.max_attempts is not None and attempt >= self.max_attempts:
+            return None
+        wait = min(self.max_interval, self.interval * self.backoff ** (attempt - 1))
+        if self.deadline is not None:
+            remaining = self.deadline - elapsed
+            if remaining <= 0:
+                return None
+            # 最后一次检查对齐到总时限
+            wait = min(wait, remaining)
+        return wait
+
+INVOICE_POLL_POLICY = InvoicePollPolicy.from_env()
+
+# ================= 请求速率控制 =================
+class RateGovernor:
+    """
+    按目标主机限速的令牌桶，同时限制在途请求数。所有账号、所有服务线程共用一个实例，
+    令牌充足时立即放行，不足时只等待到下一个令牌可用为止。
+    """
+
+    def __init__(self, rate, burst, max_in_flight):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.max_in_flight = max_in_flight
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def _bucket(self, host):
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = {
+                'tokens': self.burst,
+                'updated': time.monotonic(),
+                'in_flight': threading.BoundedSemaphore(self.max_in_flight),
+            }
+            self._buckets[host] = bucket
+        return bucket
+
+    def reserve(self, host):
+        """预占一个令牌，返回需要等待的秒数；令牌可以透支，后来者依次排在更晚的时间点。"""
+        with self._lock:
+            bucket = self._bucket(host)
+            if self.rate <= 0:
+                return 0.0, bucket
+            now = time.monotonic()
+            bucket['tokens'] = min(self.burst, bucket['tokens'] + (now - bucket['updated']) * self.rate)
+            bucket['updated'] = now
+            bucket['tokens'] -= 1
+            wait = 0.0 if bucket['tokens'] >= 0 else -bucket['tokens'] / self.rate
+            return wait, bucket
+
+    @contextmanager
+    def slot(self, host):
+        wait, bucket = self.reserve(host)
+        if wait > 0:
+            sleep_for(wait)
+        with bucket['in_flight']:
+            yield
+
+# 0 表示不限速
+REQUEST_RATE_LIMIT = env_float('REQUEST_RATE_LIMIT', 1.0, minimum=0)
+REQUEST_BURST = env_float('REQUEST_BURST', 3, minimum=1)
+REQUEST_MAX_IN_FLIGHT = env_int('REQUEST_MAX_IN_FLIGHT', 4, minimum=1)
+REQUEST_GOVERNOR = RateGovernor(REQUEST_RATE_LIMIT, REQUEST_BURST, REQUEST_MAX_IN_FLIGHT)
+
+# ================= 请求统计 =================
+_ROUTE_ID_SEGMENT = re.compile(r'\d')
+
+def route_template(url):
+    """把请求地址归一为路由模板：含数字的路径段替换为 {id}，丢弃查询参数。"""
+    path = urlparse(url).path or '/'
+    segments = ['{id}' if _ROUTE_ID_SEGMENT.search(segment) else segment for segment in path.split('/')]
+    return '/'.join(segments)
+
+class LatencyHistogram:
+    """固定分桶的耗时直方图（秒），分位数取所在桶的上界。"""
+    BOUNDS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    def __init__(self):
+        self.buckets = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.buckets[bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for index, hits in enumerate(self.buckets):
+            seen += hits
+            if seen >= target:
+                return min(self.BOUNDS[index], self.max) if index < len(self.BOUNDS) else self.max
+        return self.max
+
+class RequestStats:
+    """按“方法 + 路由模板”聚合每次控制台请求的状态、字节数和各阶段耗时。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def clear(self):
+        with self._lock:
+            self._routes = {}
+
+    def record(self, method, url, status, size, queued, ttfb, total, cookies_changed):
+        key = (method.upper(), route_template(url))
+        with self._lock:
+            entry = self._routes.get(key)
+            if entry is None:
+                entry = self._routes[key] = {
+                    'count': 0, 'statuses': {}, 'bytes': 0, 'cookie_changes': 0,
+                    'queued': LatencyHistogram(), 'ttfb': LatencyHistogram(), 'total': LatencyHistogram(),
+                }
+            entry['count'] += 1
+            entry['statuses'][status] = entry['statuses'].get(status, 0) + 1
+            entry['bytes'] += size
+            entry['cookie_changes'] += 1 if cookies_changed else 0
+            entry['queued'].add(queued)
+            if ttfb is not None:
+                entry['ttfb'].add(ttfb)
+            entry['total'].add(total)
+
+    def routes(self):
+        with self._lock:
+            return dict(self._routes)
+
+    def summary_lines(self):
+        """按总耗时从高到低输出汇总表。"""
+        routes = self.routes()
+        if not routes:
+            return []
+        header = f"{'路由':<36} {'次数':>4} {'状态':<14} {'平均KB':>7} {'排队':>6} {'TTFB p50/p95':>14} {'总耗时 p50/p95/max':>20} {'Cookie':>6}"
+        lines = ["📊 请求统计（耗时单位：秒）", header]
+        ordered = sorted(routes.items(), key=lambda item: item[1]['total'].total, reverse=True)
+        for (method, route), entry in ordered:
+            statuses = ','.join(f"{status}×{hits}" for status, hits in sorted(entry['statuses'].items(), key=lambda kv: str(kv[0])))
+            ttfb, total = entry['ttfb'], entry['total']
+            lines.append(
+                f"{method + ' ' + route:<36} {entry['count']:>4} {statuses:<14} "
+                f"{entry['bytes'] / entry['count'] / 1024:>7.1f} {entry['queued'].total:>6.2f} "
+                f"{ttfb.quantile(0.5):>6.2f}/{ttfb.quantile(0.95):<7.2f} "
+                f"{total.quantile(0.5):>6.2f}/{total.quantile(0.95):.2f}/{total.max:<6.2f} {entry['cookie_changes']:>6}"
+            )
+        return lines
+
+REQUEST_STATS = RequestStats()
+
+# ================= 性能剖析 =================
+class PhaseTimer:
+    """累计各阶段耗时（秒）：sleep 等待、network 网络、parse HTML 解析、cookies Cookie 归一化。"""
+    PHASES = ('sleep', 'network', 'parse', 'cookies')
+    LABELS = {'sleep': '等待', 'network': '网络', 'parse': '解析', 'cookies': 'Cookie'}
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    def add(self, name, seconds):
+        with self._lock:
+            self._totals[name] = self._totals.get(name, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def snapshot(self):
+        with self._lock:
+            return {name: self._totals.get(name, 0.0) for name in self.PHASES}
+
+    def clear(self):
+        with self._lock:
+            self._totals = {}
+
+    def describe(self, totals):
+        return '，'.join(f"{self.LABELS[name]} {totals.get(name, 0.0):.2f}s" for name in self.PHASES)
+
+PHASE_TIMER = PhaseTimer()
+
+def sleep_for(seconds):
+    with PHASE_TIMER.phase('sleep'):
+        time.sleep(seconds)
+
+class Profiler:
+    """
+    可选的剖析模式：每个账号的 init() 与服务处理包在 cProfile 中，输出 account-N.prof；
+    开启 tracemalloc 时额外输出该账号新增内存最多的分配位置 account-N-alloc.txt。
+    """
+
+    def __init__(self, enabled=False, output_dir='profiles', trace_memory=False, top=25):
+        self.enabled = enabled
+        self.output_dir = output_dir
+        self.trace_memory = trace_memory
+        self.top = top
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            enabled=os.environ.get('HIDEN_PROFILE', '').strip().lower() in ('1', 'true', 'yes', 'on'),
+            output_dir=os.environ.get('HIDEN_PROFILE_DIR', '').strip() or 'profiles',
+            trace_memory=os.environ.get('HIDEN_TRACEMALLOC', '').strip().lower() in ('1', 'true', 'yes', 'on'),
+            top=env_int('HIDEN_PROFILE_TOP', 25, minimum=1),
+        )
+
+    @contextmanager
+    def account(self, index):
+        if not self.enabled:
+            yield
+            return
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        prefix = os.path.join(self.output_dir, f"account-{index + 1}")
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        before = tracemalloc.take_snapshot() if self.trace_memory else None
+        phases_before = PHASE_TIMER.snapshot()
+        started = time.perf_counter()
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            wall = time.perf_counter() - started
+            profiler.dump_stats(prefix + '.prof')
+            if before is not None:
+                self._write_allocations(prefix + '-alloc.txt', before, tracemalloc.take_snapshot())
+            if started_tracing:
+                tracemalloc.stop()
+            phases = {name: value - phases_before[name] for name, value in PHASE_TIMER.snapshot().items()}
+            log_print(f"[账号 {index + 1}] 🔬 剖析完成：总耗时 {wall:.2f}s（{PHASE_TIMER.describe(phases)}）→ {prefix}.prof")
+
+    def _write_allocations(self, path, before, after):
+        stats = after.compare_to(before, 'lineno')[:self.top]
+        with open(path, 'w', encoding='utf-8') as f:
+            for stat in stats:
+                f.write(f"{stat}\n")
+
+PROFILER = Profiler.from_env()
+
+def parse_cli_args(argv=None):
+    parser = argparse.ArgumentParser(description='HidenCloud 自动续期')
+    parser.add_argument('--profile', action='store_true', help='为每个账号输出 cProfile 结果（同 HIDEN_PROFILE=1）')
+    parser.add_argument('--profile-dir', help='剖析结果输出目录（同 HIDEN_PROFILE_DIR，默认 profiles）')
+    parser.add_argument('--tracemalloc', action='store_true', help='同时记录每个账号的内存分配热点（同 HIDEN_TRACEMALLOC=1）')
+    return parser.parse_args(argv)
+
+def configure_profiler(args):
+    """命令行参数覆盖环境变量中的剖析设置。"""
+    global PROFILER
+    settings = Profiler.from_env()
+    if args.profile or args.tracemalloc:
+        settings.enabled = True
+    if args.profile_dir:
+        settings.output_dir = args.profile_dir
+    if args.tracemalloc:
+        settings.trace_memory = True
+    PROFILER = settings
+    return settings
 
 # ================= 辅助工具 =================
-def sleep_random(min_ms=3000, max_ms=8000):
-    sec = random.randint(min_ms, max_ms) / 1000.0
-    time.sleep(sec)
+_resolved_parsers = {}
+
+def resolve_html_parser(preferred=None):
+    """把配置的解析后端解析为当前环境可用的 BeautifulSoup 解析器名称。"""
+    preferred = (preferred or HTML_PARSER).strip().lower()
+    if preferred in _resolved_parsers:
+        return _resolved_parsers[preferred]
+
+    from bs4.builder import builder_registry
+
+    candidates = HTML_PARSER_PREFERENCE if preferred == 'auto' else (preferred, 'html.parser')
+    resolved = 'html.parser'
+    for name in candidates:
+        if builder_registry.lookup(name) is not None:
+            resolved = name
+            break
+    if preferred not in ('auto', resolved):
+        log_print(f"⚠️ HTML 解析后端 {preferred} 不可用，回退到 {resolved}")
+    _resolved_parsers[preferred] = resolved
+    return resolved
+
+def make_soup(html):
+    with PHASE_TIMER.phase('parse'):
+        return BeautifulSoup(html or '', resolve_html_parser())
+
+_SERVICE_HREF = re.compile(r'/service/(\d+)')
+
+def is_invoice_href(href):
+    return '/invoice/' in href and 'download' not in href
+
+def normalize_context_text(text):
+    return re.sub(r'\s+', ' ', text or '').strip().lower()
+
+def split_env_list(name):
+    raw = os.environ.get(name, '')
+    return [item.strip() for item in re.split(r'[,;\n]', raw) if item.strip()]
+
+class KeywordMatcher:
+    """
+    把正向/负向关键词编译进同一个正则，一次扫描即可找出全部出现位置。
+
+    含英文或数字的关键词共用一组单词边界断言，其余（中文等）按子串匹配
+    （与 benchmarks/reference.py 中旧实现的规则一致，由等价性测试保证）。每个位置按“负向优先、短词优先”尝试，
+    匹配后从下一个字符继续搜索，因此重叠的出现也不会漏掉。
+    """
+
+    def __init__(self, positive_keywords, negative_keywords):
+        self.positive_keywords = self._normalize(positive_keywords)
+        self.negative_keywords = self._normalize(negative_keywords)
+        negative = self._alternation(self.negative_keywords)
+        positive = self._alternation(self.positive_keywords)
+        self._combined = re.compile(f'(?P<neg>{negative})|(?P<pos>{positive})')
+        self._positive = re.compile(positive)
+
+    @staticmethod
+    def _normalize(keywords):
+        return tuple(dict.fromkeys(keyword.lower() for keyword in keywords if keyword))
+
+    @staticmethod
+    def _alternation(keywords):
+        # 纯中文关键词放在前面：它们不可能以带边界的英文关键词为前缀，保证同一位置先命中最短的关键词
+        substring_words = sorted((k for k in keywords if not re.search(r'[a-z0-9]', k)), key=len)
+        bounded_words = sorted((k for k in keywords if re.search(r'[a-z0-9]', k)), key=len)
+        branches = [re.escape(keyword) for keyword in substring_words]
+        if bounded_words:
+            words = '|'.join(re.escape(keyword) for keyword in bounded_words)
+            branches.append(rf'(?<![a-z0-9])(?:{words})(?![a-z0-9])')
+        return '|'.join(branches) or '(?!)'
+
+    def is_payment_context(self, normalized_text):
+        """存在正向关键词且不存在负向关键词；遇到负向关键词立即返回。"""
+        has_positive = False
+        match = self._combined.search(normalized_text)
+        while match:
+            if match.group('neg') is not None:
+                return False
+            has_positive = True
+            match = self._combined.search(normalized_text, match.start() + 1)
+        return has_positive
+
+    def scan(self, normalized_text):
+        """返回 (正向出现区间列表, 负向出现区间列表)，区间允许重叠。"""
+        positive_spans = []
+        negative_spans = []
+        match = self._combined.search(normalized_text)
+        while match:
+            start = match.start()
+            if match.group('neg') is not None:
+                negative_spans.append((start, match.end('neg')))
+                # 同一位置也可能以正向关键词开头
+                positive = self._positive.match(normalized_text, start)
+                if positive:
+                    positive_spans.append((start, positive.end()))
+            else:
+                positive_spans.append((start, match.end('pos')))
+            match = self._combined.search(normalized_text, start + 1)
+        return positive_spans, negative_spans
+
+_payment_context_matcher = None
+
+def payment_context_matcher():
+    global _payment_context_matcher
+    if _payment_context_matcher is None:
+        _payment_context_matcher = KeywordMatcher(
+            INVOICE_POSITIVE_KEYWORDS + split_env_list('INVOICE_POSITIVE_KEYWORDS'),
+            INVOICE_NEGATIVE_KEYWORDS + split_env_list('INVOICE_NEGATIVE_KEYWORDS'),
+        )
+    return _payment_context_matcher
+
+class SpanIndex:
+    """回答“区间 [start, end) 内是否完整包含某个关键词出现”的查询，每次 O(log n)。"""
+
+    def __init__(self, spans):
+        spans = sorted(spans)
+        self.starts = [start for start, _ in spans]
+        # suffix_min_end[i]: 起点不早于 starts[i] 的出现中最早的结束位置
+        self.suffix_min_end = [0] * len(spans)
+        best = float('inf')
+        for i in range(len(spans) - 1, -1, -1):
+            best = min(best, spans[i][1])
+            self.suffix_min_end[i] = best
+
+    def contains(self, start, end):
+        i = bisect_left(self.starts, start)
+        return i < len(self.starts) and self.suffix_min_end[i] <= end
+
+def extract_csrf_token(soup):
+    """优先读取 meta csrf-token，降级读取表单 _token 字段；页面中没有时返回 None。"""
+    token_tag = soup.find('meta', attrs={'name': 'csrf-token'})
+    if token_tag:
+        return token_tag.get('content', '')
+    token_input = soup.find('input', attrs={'name': '_token'})
+    if token_input:
+        return token_input.get('value', '')
+    return None
+
+_NOT_COMPUTED = object()
+
+class PageResponse:
+    """HTTP 响应的只读封装：解析树、页面文本与 CSRF token 在首次访问时计算并缓存，每个页面最多解析一次。"""
+
+    def __init__(self, text='', url='', status_code=200, raw=None):
+        self.text = text or ''
+        self.url = url
+        self.status_code = status_code
+        self.raw = raw
+        # 由 HidenCloudBot.request 填写：发出该请求的会话代数
+        self.session_generation = None
+        self._soup = None
+        self._page_text = None
+        self._csrf_token = _NOT_COMPUTED
+
+    @classmethod
+    def of(cls, source, url=''):
+        """接受 PageResponse、带 text/url/status_code 的响应对象或 HTML 字符串。"""
+        if isinstance(source, cls):
+            return source
+        if isinstance(source, str):
+            return cls(source, url)
+        return cls(source.text, source.url, source.status_code, raw=source)
+
+    def __getattr__(self, name):
+        # headers、cookies 等其他属性直接取自原始响应
+        raw = self.__dict__.get('raw')
+        if raw is None:
+            raise AttributeError(name)
+        return getattr(raw, name)
+
+    @property
+    def soup(self):
+        if self._soup is None:
+            self._soup = make_soup(self.text)
+        return self._soup
+
+    @property
+    def page_text(self):
+        if self._page_text is None:
+            self._page_text = self.soup.get_text(" ", strip=True)
+        return self._page_text
+
+    @property
+    def csrf_token(self):
+        if self._csrf_token is _NOT_COMPUTED:
+            self._csrf_token = extract_csrf_token(self.soup)
+        return self._csrf_token
+
+def atomic_write_text(path, text):
+    """先写同目录临时文件再原子替换，进程中途崩溃也不会留下半个文件。"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
 
 class CacheManager:
+    """
+    进程内唯一的 Cookie 缓存。首次访问时从磁盘加载一次，之后只在内存中读写；
+    变更先记为待落盘，由 flush() 批量原子写回，进程退出时自动刷新。
+    """
+    # 多个账号并发运行时共用同一份缓存
+    _lock = threading.RLock()
+    _data = None
+    _dirty_keys = set()
+    # 本轮运行中改动过的账号，WebDAV 冲突合并时只覆盖这些账号
+    _changed_keys = set()
+    _atexit_registered = False
+
     @staticmethod
-    def load():
+    def _read_file():
         if os.path.exists(LOCAL_CACHE_PATH):
             try:
                 with open(LOCAL_CACHE_PATH, 'r', encoding='utf-8') as f:
@@ -178,22 +1334,239 @@ class CacheManager:
                 log_print("读取本地缓存失败")
         return {}
 
+    @classmethod
+    def _ensure_loaded(cls):
+        if cls._data is None:
+            cls._data = cls._read_file()
+            if not cls._atexit_registered:
+                atexit.register(cls.flush)
+                cls._atexit_registered = True
+        return cls._data
+
+    @classmethod
+    def load(cls):
+        """返回当前缓存的快照。"""
+        with cls._lock:
+            return dict(cls._ensure_loaded())
+
+    @classmethod
+    def get(cls, index):
+        with cls._lock:
+            return cls._ensure_loaded().get(str(index))
+
+    @classmethod
+    def reload(cls):
+        """磁盘文件被外部替换（如 WebDAV 下载）后调用，下次访问时重新加载。"""
+        with cls._lock:
+            cls._data = None
+            cls._dirty_keys = set()
+            cls._changed_keys = set()
+
+    @classmethod
+    def update(cls, index, cookie_str, upload=True):
+        """只在内容真正变化时才记录/上传，减少无效 WebDAV 请求。"""
+        with cls._lock:
+            data = cls._ensure_loaded()
+            key = str(index)
+
+            if data.get(key) == cookie_str:
+                return  # 无变化，跳过
+
+            data[key] = cookie_str
+            cls._dirty_keys.add(key)
+            cls._changed_keys.add(key)
+            log_print(f"💾 [账号 {index + 1}] 缓存已更新")
+
+            if upload:
+                # 在锁内提交快照，保证后提交的一定是更新的版本
+                CACHE_REPLICATOR.submit(dict(data))
+
+    @classmethod
+    def changed_keys(cls):
+        with cls._lock:
+            return set(cls._changed_keys)
+
+    @classmethod
+    def flush(cls):
+        """把待落盘的变更一次性写回磁盘。"""
+        with cls._lock:
+            if cls._data is None or not cls._dirty_keys:
+                return
+            atomic_write_text(LOCAL_CACHE_PATH, json.dumps(cls._data, indent=2))
+            cls._dirty_keys = set()
+
+# ================= 续期计划 =================
+DAY_SECONDS = 86400
+
+def format_timestamp(ts):
+    return time.strftime('%Y-%m-%d %H:%M UTC', time.gmtime(ts))
+
+class RenewalSchedule:
+    """
+    进程内唯一的续期计划，按服务 ID 记录最近一次检查时间与 showRenewAlert 的剩余天数 / 阈值。
+
+    剩余天数只精确到天，跳过窗口预留一天余量：checked_at + (days_until - threshold - 1) 天之前
+    不可能到期；到期、续期过或状态未知的服务记为“下次运行照常检查”。
+    """
+    _lock = threading.RLock()
+    _entries = None
+    _dirty = False
+    # 本轮是否产生过新的检查记录，决定结束时是否需要上传
+    _recorded = False
+    _seen = {}
+    # 超过这么久没有再出现的服务从计划中清理
+    STALE_DAYS = 60
+
     @staticmethod
-    def update(index, cookie_str, upload=True):
-        """只在内容真正变化时才写盘/上传，减少无效 WebDAV 请求。"""
-        data = CacheManager.load()
-        key = str(index)
+    def _read_file():
+        try:
+            with open(LOCAL_SCHEDULE_PATH, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError):
+            log_print("读取本地续期计划失败")
+            return {}
+        services = data.get('services') if isinstance(data, dict) else None
+        return dict(services) if isinstance(services, dict) else {}
+
+    @classmethod
+    def _ensure_loaded(cls):
+        if cls._entries is None:
+            cls._entries = cls._read_file()
+        return cls._entries
+
+    @classmethod
+    def reload(cls):
+        with cls._lock:
+            cls._entries = None
+            cls._dirty = False
+            cls._recorded = False
+            cls._seen = {}
 
-        if data.get(key) == cookie_str:
-            return  # 无变化，跳过
+    @staticmethod
+    def eligible_at(entry):
+        """预计可以续期的时间（服务端按整天计算，仅供参考）。"""
+        days_until = entry.get('days_until')
+        if days_until is None:
+            return entry['checked_at']
+        return entry['checked_at'] + max(0, days_until - entry.get('threshold', 0)) * DAY_SECONDS
 
-        data[key] = cookie_str
-        with open(LOCAL_CACHE_PATH, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2)
-        log_print(f"💾 [账号 {index + 1}] 本地缓存已更新")
+    @staticmethod
+    def next_check_at(entry, full_check_days=None):
+        """下一次需要真正请求的时间：保守的可续期时间与定期完整检查两者取早。"""
+        full_check_days = SCHEDULE_FULL_CHECK_DAYS if full_check_days is None else full_check_days
+        days_until = entry.get('days_until')
+        if days_until is None or full_check_days <= 0:
+            return entry['checked_at']
+        margin_days = max(0, days_until - entry.get('threshold', 0) - 1)
+        return entry['checked_at'] + min(margin_days, full_check_days) * DAY_SECONDS
+
+    @classmethod
+    def skip_until(cls, service_id, account=None, now=None):
+        """服务本轮可以跳过时返回下次检查时间，否则返回 None。"""
+        now = time.time() if now is None else now
+        with cls._lock:
+            entry = cls._ensure_loaded().get(str(service_id))
+            cls._seen[str(service_id)] = account
+            if not entry:
+                return None
+            next_check = cls.next_check_at(entry)
+            return next_check if now < next_check else None
+
+    @classmethod
+    def record(cls, service_id, days_until=None, threshold=None, account=None, now=None):
+        """记录一次真实检查的结果；days_until 为 None 表示已到期或状态未知。"""
+        entry = {'checked_at': int(time.time() if now is None else now)}
+        if days_until is not None:
+            entry['days_until'] = int(days_until)
+            entry['threshold'] = int(threshold or 0)
+        if account is not None:
+            entry['account'] = account
+        with cls._lock:
+            cls._ensure_loaded()[str(service_id)] = entry
+            cls._seen[str(service_id)] = account
+            cls._dirty = True
+            cls._recorded = True
+
+    @classmethod
+    def has_updates(cls):
+        with cls._lock:
+            return cls._recorded
+
+    @classmethod
+    def snapshot(cls):
+        with cls._lock:
+            return {key: dict(entry) for key, entry in cls._ensure_loaded().items()}
+
+    @classmethod
+    def merge(cls, remote):
+        """合并另一份计划（如云端副本），同一服务保留检查时间较新的记录；返回本地是否有更新的记录。"""
+        newer_locally = False
+        with cls._lock:
+            entries = cls._ensure_loaded()
+            for key, entry in (remote or {}).items():
+                if not isinstance(entry, dict) or not isinstance(entry.get('checked_at'), (int, float)):
+                    continue
+                local = entries.get(key)
+                if local is None or entry['checked_at'] > local['checked_at']:
+                    entries[key] = dict(entry)
+                    cls._dirty = True
+            for key, entry in entries.items():
+                other = (remote or {}).get(key)
+                if not isinstance(other, dict) or other.get('checked_at', 0) < entry['checked_at']:
+                    newer_locally = True
+        return newer_locally
+
+    @classmethod
+    def document(cls, now=None):
+        """序列化为文件内容，附带全体服务最早的下次检查时间，便于据此安排定时任务。"""
+        now = time.time() if now is None else now
+        with cls._lock:
+            entries = cls._ensure_loaded()
+            stale = [key for key, entry in entries.items()
+                     if now - entry['checked_at'] > cls.STALE_DAYS * DAY_SECONDS]
+            for key in stale:
+                del entries[key]
+            services = {key: dict(entry, eligible_at=int(cls.eligible_at(entry)))
+                        for key, entry in sorted(entries.items())}
+        document = {'version': 1, 'services': services}
+        if services:
+            document['next_check_at'] = int(min(cls.next_check_at(entry) for entry in services.values()))
+        return document
+
+    @classmethod
+    def flush(cls):
+        with cls._lock:
+            if not cls._dirty:
+                return False
+            atomic_write_text(LOCAL_SCHEDULE_PATH, json.dumps(cls.document(), indent=2))
+            cls._dirty = False
+            return True
 
-        if upload:
-            WebDavManager().upload(data)
+    @classmethod
+    def report_lines(cls, now=None):
+        """本轮出现过的服务按下次检查时间排序输出。"""
+        now = time.time() if now is None else now
+        with cls._lock:
+            entries = cls._ensure_loaded()
+            rows = [(key, account, entries.get(key)) for key, account in cls._seen.items()]
+        if not rows:
+            return []
+
+        lines = ["📅 续期计划（下次需要检查的时间）:"]
+        for key, account, entry in sorted(rows, key=lambda row: cls.next_check_at(row[2]) if row[2] else now):
+            prefix = f"[账号 {account}] " if account is not None else ""
+            if not entry:
+                lines.append(f"  {prefix}服务 {key}: 下次运行检查")
+                continue
+            next_check = cls.next_check_at(entry)
+            when = "下次运行检查" if next_check <= now else format_timestamp(next_check)
+            detail = ""
+            if entry.get('days_until') is not None:
+                detail = f"（预计 {format_timestamp(cls.eligible_at(entry))} 起可续期）"
+            lines.append(f"  {prefix}服务 {key}: {when}{detail}")
+        return lines
 
 # ================= 核心机器人类 =================
 class HidenCloudBot:
@@ -204,6 +1577,8 @@ class HidenCloudBot:
         self.session = self.create_session()
 
         self.csrf_token = ""
+        # 每次重建会话加一；session / csrf_token / session_generation 只在 _state_lock 内一起读写
+        self.session_generation = 0
         self.services = []
         # 跨服务去重集合，避免对同一张账单反复尝试支付
         self.processed_invoices = set()
@@ -211,9 +1586,14 @@ class HidenCloudBot:
         self.non_payable_invoices = set()
         # 标记本账号本轮是否建议由 GitHub Actions 稍后重跑一次
         self.retry_needed = False
+        # 账号级账单扫描得到的 {服务 ID: [待付账单]}；None 表示没有扫描结果，各服务逐个预检
+        self.invoice_index = None
+        # 并发处理服务时保护共享状态；每张账单一把锁，保证同一账单只会被支付一次
+        self._state_lock = threading.RLock()
+        self._session_lock = threading.RLock()
+        self._invoice_locks = {}
 
-        cached_data = CacheManager.load()
-        cached_cookie = cached_data.get(str(index))
+        cached_cookie = CacheManager.get(index)
 
         if cached_cookie:
             log_print(f"[账号 {self.index}] 发现本地缓存 Cookie，优先使用...")
@@ -239,11 +1619,12 @@ class HidenCloudBot:
             }
         )
 
-    def load_cookie_str(self, cookie_str):
+    def load_cookie_str(self, cookie_str, session=None):
         if not cookie_str:
             return
+        session = self.session if session is None else session
         for cookie in parse_seed_cookie_string(cookie_str):
-            self.session.cookies.set_cookie(
+            session.cookies.set_cookie(
                 requests.cookies.create_cookie(
                     name=cookie['name'],
                     value=cookie['value'],
@@ -253,40 +1634,59 @@ class HidenCloudBot:
                 )
             )
 
+    def session_state(self):
+        """一次性读取 (会话, CSRF token, 会话代数)，保证三者属于同一个会话。"""
+        with self._state_lock:
+            return self.session, self.csrf_token, self.session_generation
+
+    @staticmethod
+    def cookie_jar_lock(jar):
+        # http.cookiejar 内部使用 _cookies_lock 保护写入，迭代时持有同一把锁避免与其他线程的响应写入冲突
+        lock = getattr(jar, '_cookies_lock', None)
+        return lock if lock is not None else nullcontext()
+
+    def cookie_snapshot(self, session=None):
+        jar = (self.session if session is None else session).cookies
+        with self.cookie_jar_lock(jar):
+            return list(jar)
+
     def get_cookie_str(self):
-        return '; '.join([f"{c.name}={c.value}" for c in self.session.cookies])
-
-    def normalize_critical_cookies(self, stage=""):
-        records = []
-        for cookie in self.session.cookies:
-            records.append({
-                'name': cookie.name,
-                'value': cookie.value,
-                'domain': cookie.domain or '',
-                'path': cookie.path or '/',
-                'secure': bool(cookie.secure),
-                'expires': cookie.expires,
-                'rest': getattr(cookie, '_rest', {}) or {},
-            })
-
-        normalized, changes = normalize_cookie_records(records)
-        if not changes:
-            return False
+        return '; '.join([f"{c.name}={c.value}" for c in self.cookie_snapshot()])
+
+    def normalize_critical_cookies(self, stage="", session=None):
+        # jar 与它的锁取自同一次 session 读取，避免重建会话时两者来自不同会话
+        jar = (self.session if session is None else session).cookies
+        with self.cookie_jar_lock(jar):
+            records = []
+            for cookie in jar:
+                records.append({
+                    'name': cookie.name,
+                    'value': cookie.value,
+                    'domain': cookie.domain or '',
+                    'path': cookie.path or '/',
+                    'secure': bool(cookie.secure),
+                    'expires': cookie.expires,
+                    'rest': getattr(cookie, '_rest', {}) or {},
+                })
+
+            normalized, changes = normalize_cookie_records(records)
+            if not changes:
+                return False
 
-        new_jar = requests.cookies.RequestsCookieJar()
-        for record in normalized:
-            new_jar.set_cookie(
-                requests.cookies.create_cookie(
-                    name=record['name'],
-                    value=record['value'],
-                    domain=record.get('domain', ''),
-                    path=record.get('path', '/'),
-                    secure=bool(record.get('secure', False)),
-                    expires=record.get('expires'),
-                    rest=record.get('rest', {}),
+            # 原地重建同一个 cookie jar，其他线程正在进行的请求仍会写回到当前会话
+            jar.clear()
+            for record in normalized:
+                jar.set_cookie(
+                    requests.cookies.create_cookie(
+                        name=record['name'],
+                        value=record['value'],
+                        domain=record.get('domain', ''),
+                        path=record.get('path', '/'),
+                        secure=bool(record.get('secure', False)),
+                        expires=record.get('expires'),
+                        rest=record.get('rest', {}),
+                    )
                 )
-            )
-        self.session.cookies = new_jar
 
         changed_names = []
         for change in changes:
@@ -297,11 +1697,11 @@ class HidenCloudBot:
         self.log(f"[COOKIE_NORMALIZED] {stage_text}检测到并归一化关键 Cookie: {', '.join(changed_names)}")
         return True
 
-    def find_cookie_value(self, *names, preferred_domain=''):
+    def find_cookie_value(self, *names, preferred_domain='', session=None):
         matches = []
         target_names = set(names)
 
-        for cookie in self.session.cookies:
+        for cookie in self.cookie_snapshot(session):
             if cookie.name in target_names and cookie.value:
                 matches.append(cookie)
 
@@ -330,101 +1730,184 @@ class HidenCloudBot:
         self.log("切换回环境变量原始 Cookie 重试...")
 
     def rebuild_session(self, cookie_str=None):
-        self.session = self.create_session()
-        self.csrf_token = ""
+        """先在新会话里装好 Cookie 再整体替换，其他线程不会读到半成品会话。"""
+        session = self.create_session()
         if cookie_str:
-            self.load_cookie_str(cookie_str)
-
-    def rebuild_session_and_reinit(self):
-        current_cookie = self.get_cookie_str()
-        self.log("♻️ 重建会话并重新验证登录状态...")
-        self.rebuild_session(current_cookie)
-
-        if self.init():
-            return True, 'invoice_page'
+            self.load_cookie_str(cookie_str, session=session)
+        with self._state_lock:
+            self.session = session
+            self.csrf_token = ""
+            self.session_generation += 1
+
+    def rebuild_session_and_reinit(self, failed_generation=None):
+        """
+        重建会话并重新初始化。failed_generation 为失败请求所用的会话代数：
+        若会话已被其他线程重建，直接使用新会话，不再重复重建。
+        """
+        # 并发处理服务时同一时间只允许一个线程重建会话
+        with self._session_lock:
+            if failed_generation is not None and failed_generation != self.session_state()[2]:
+                self.log("♻️ 会话已由其他线程重建，直接使用新会话重试")
+                return True
+
+            current_cookie = self.get_cookie_str()
+            self.log("♻️ 重建会话并重新验证登录状态...")
+            self.rebuild_session(current_cookie)
+
+            if self.init():
+                return True, 'invoice_page'
 
-        self.log("⚠️ 当前 Cookie 重建会话后初始化失败，回退环境变量 Cookie 再试一次...")
-        self.rebuild_session()
-        self.load_cookie_str(self.env_cookie)
-        return self.init()
+            self.log("⚠️ 当前 Cookie 重建会话后初始化失败，回退环境变量 Cookie 再试一次...")
+            self.rebuild_session(self.env_cookie)
+            return self.init()
 
-    def request(self, method, url, data=None, headers=None):
+    def request(self, method, url, data=None, headers=None, state=None):
+        """state 为 session_state() 的结果时固定使用该会话，否则使用当前会话；响应记录所用会话的代数。"""
+        session, _, generation = state or self.session_state()
         full_url = urljoin(self.base_url, url)
+        started = time.perf_counter()
+        sent = None
+        finished = None
+        resp = None
+        cookies_changed = False
         try:
-            resp = self.session.request(method, full_url, data=data, headers=headers, timeout=30)
-            self.normalize_critical_cookies(f"{method} {url}")
-            return resp
+            with REQUEST_GOVERNOR.slot(urlparse(full_url).netloc):
+                sent = time.perf_counter()
+                resp = session.request(method, full_url, data=data, headers=headers, timeout=30)
+                finished = time.perf_counter()
+            with PHASE_TIMER.phase('cookies'):
+                cookies_changed = self.normalize_critical_cookies(f"{method} {url}", session=session)
+            page = PageResponse.of(resp)
+            page.session_generation = generation
+            return page
         except Exception as e:
             self.log(f"请求异常: {e}")
             raise
+        finally:
+            self._record_request(method, full_url, resp, started, sent, finished, cookies_changed)
+
+    def _record_request(self, method, full_url, resp, started, sent, finished, cookies_changed):
+        """requests 不提供 DNS / 建连耗时，这里记录排队、TTFB（resp.elapsed）与总耗时。"""
+        now = time.perf_counter()
+        sent = sent if sent is not None else now
+        PHASE_TIMER.add('network', (finished if finished is not None else now) - sent)
+        elapsed = getattr(resp, 'elapsed', None)
+        content = getattr(resp, 'content', b'')
+        REQUEST_STATS.record(
+            method,
+            full_url,
+            getattr(resp, 'status_code', None) if resp is not None else 'EXC',
+            len(content) if isinstance(content, (bytes, str)) else 0,
+            queued=sent - started,
+            ttfb=elapsed.total_seconds() if hasattr(elapsed, 'total_seconds') else None,
+            total=(finished if finished is not None else now) - sent,
+            cookies_changed=bool(cookies_changed),
+        )
 
-    def _refresh_csrf(self, soup):
-        """从页面 HTML 中刷新 CSRF token，防止因 token 过期导致 419 错误。"""
-        token_tag = soup.find('meta', attrs={'name': 'csrf-token'})
-        if token_tag:
-            self.csrf_token = token_tag['content']
+    def _refresh_csrf(self, source):
+        """从页面（PageResponse 或解析树）中刷新 CSRF token，防止因 token 过期导致 419 错误。"""
+        generation = None
+        if isinstance(source, PageResponse):
+            token = source.csrf_token
+            generation = source.session_generation
+        else:
+            token = extract_csrf_token(source)
+        if token is None:
             return
-        # 降级：从表单 _token 字段读取
-        token_input = soup.find('input', attrs={'name': '_token'})
-        if token_input:
-            self.csrf_token = token_input['value']
+        with self._state_lock:
+            # 旧会话上取得的页面不能覆盖重建后新会话的 token
+            if generation is None or generation == self.session_generation:
+                self.csrf_token = token
 
     def normalize_url(self, url):
         return urljoin(self.base_url, url)
 
     def has_invoice_payment_context(self, text):
-        normalized = re.sub(r'\s+', ' ', text or '').strip().lower()
+        normalized = normalize_context_text(text)
         if not normalized:
             return False
 
-        positive_keywords = [
-            'unpaid', 'pending', 'pay now', 'payment due', 'pay invoice',
-            'pendiente', 'pagar ahora', 'sin pagar',
-            '未支付', '待支付', '待付款', '立即支付', '去支付', '付款', '支付'
-        ]
-        negative_keywords = [
-            'paid', 'completed', 'cancelled', 'canceled', 'refunded',
-            'pagado', 'completado', 'cancelado', 'reembolsado',
-            '已支付', '已付款', '已完成', '已取消', '已退款', '作废'
-        ]
-
-        has_positive = any(self.contains_context_keyword(normalized, keyword) for keyword in positive_keywords)
-        has_negative = any(self.contains_context_keyword(normalized, keyword) for keyword in negative_keywords)
-        return has_positive and not has_negative
-
-    def contains_context_keyword(self, normalized_text, keyword):
-        if re.search(r'[a-z0-9]', keyword):
-            pattern = rf'(?<![a-z0-9]){re.escape(keyword)}(?![a-z0-9])'
-            return re.search(pattern, normalized_text) is not None
-        return keyword in normalized_text
+        return payment_context_matcher().is_payment_context(normalized)
 
     def extract_invoice_links(self, soup, require_payment_context=False):
-        invoice_links = []
-
         if require_payment_context:
-            containers = soup.find_all(['tr', 'li', 'div', 'article', 'section'])
-            for container in containers:
-                links = []
-                for a in container.find_all('a', href=True):
-                    href = a['href']
-                    if '/invoice/' in href and 'download' not in href:
-                        links.append(self.normalize_url(href))
-
-                if not links:
-                    continue
-
-                container_text = container.get_text(" ", strip=True)
-                if self.has_invoice_payment_context(container_text):
-                    invoice_links.extend(links)
-
-            return sorted(set(invoice_links))
+            return self._extract_contextual_invoice_links(soup)
 
+        invoice_links = []
         for a in soup.find_all('a', href=True):
             href = a['href']
-            if '/invoice/' in href and 'download' not in href:
+            if is_invoice_href(href):
                 invoice_links.append(self.normalize_url(href))
         return sorted(set(invoice_links))
 
+    def _extract_contextual_invoice_links(self, soup):
+        """
+        单次遍历找出“所在容器带有待支付上下文”的账单链接，结果与逐容器 get_text 判定完全一致。
+
+        每个容器的 get_text(" ", strip=True) 都是全页文本片段序列中连续的一段，
+        因此只需拼接一次全页文本、扫描一次关键词，再用区间查询判断每个容器，
+        避免嵌套容器对同一段文本反复提取和匹配。
+        """
+        from bs4.element import CData, NavigableString, Tag
+
+        string_types = getattr(Tag, 'MAIN_CONTENT_STRING_TYPES', {NavigableString, CData})
+        pieces = []          # 归一化后的文本片段
+        piece_offsets = []   # 每个片段在全页文本中的起始位置
+        text_length = 0
+        links = []           # 文档顺序中的账单链接
+        containers = []      # (首片段, 尾后片段, 首链接, 尾后链接)
+
+        stack = [(soup, None)]
+        while stack:
+            node, entered = stack.pop()
+            if entered is not None:
+                piece_start, link_start = entered
+                if node.name in INVOICE_CONTAINER_TAGS and len(links) > link_start:
+                    containers.append((piece_start, len(pieces), link_start, len(links)))
+                continue
+
+            if isinstance(node, NavigableString):
+                if type(node) not in string_types:
+                    continue
+                piece = normalize_context_text(node)
+                if piece:
+                    piece_offsets.append(text_length + (1 if pieces else 0))
+                    pieces.append(piece)
+                    text_length = piece_offsets[-1] + len(piece)
+                continue
+
+            if node.name == 'a':
+                href = node.get('href')
+                if href is not None and is_invoice_href(href):
+                    links.append(self.normalize_url(href))
+            stack.append((node, (len(pieces), len(links))))
+            stack.extend((child, None) for child in reversed(node.contents))
+
+        if not containers:
+            return []
+
+        positive_spans, negative_spans = payment_context_matcher().scan(' '.join(pieces))
+        positive = SpanIndex(positive_spans)
+        negative = SpanIndex(negative_spans)
+
+        covered = [0] * (len(links) + 1)
+        for piece_start, piece_end, link_start, link_end in containers:
+            if piece_start == piece_end:
+                continue
+            text_start = piece_offsets[piece_start]
+            text_end = piece_offsets[piece_end - 1] + len(pieces[piece_end - 1])
+            if positive.contains(text_start, text_end) and not negative.contains(text_start, text_end):
+                covered[link_start] += 1
+                covered[link_end] -= 1
+
+        invoice_links = set()
+        depth = 0
+        for i, link in enumerate(links):
+            depth += covered[i]
+            if depth > 0:
+                invoice_links.add(link)
+        return sorted(invoice_links)
+
     def extract_server_error_message(self, soup):
         selectors = [
             '[role="alert"]',
@@ -505,11 +1988,20 @@ class HidenCloudBot:
 
     def fetch_manage_page(self, service_id):
         manage_res = self.request('GET', f"/service/{service_id}/manage")
-        soup = BeautifulSoup(manage_res.text, 'html.parser')
-        self._refresh_csrf(soup)
-        return manage_res, soup
-
-    def submit_renew_request(self, service_id, soup, referer_url):
+        self._refresh_csrf(manage_res)
+        return manage_res, manage_res.soup
+
+    def submit_renew_request(self, service_id, manage_res):
+        """在当前会话上提交续期；管理页取自已被替换的旧会话时先在当前会话上重新获取，保证表单 token 与会话一致。"""
+        manage_res = PageResponse.of(manage_res)
+        state = self.session_state()
+        if manage_res.session_generation is not None and manage_res.session_generation != state[2]:
+            self.log("♻️ 会话已重建，重新获取管理页后提交")
+            manage_res, _ = self.fetch_manage_page(service_id)
+            state = self.session_state()
+        session, csrf_token, _ = state
+        soup = manage_res.soup
+        referer_url = manage_res.url
         form, action_url = self.find_renew_form(soup, service_id)
         payload = self.extract_form_payload(form) if form else {}
 
@@ -524,33 +2016,35 @@ class HidenCloudBot:
             'XSRF-TOKEN',
             'XSRF_TOKEN',
             'csrf_token',
-            preferred_domain='dash.hidencloud.com'
+            preferred_domain='dash.hidencloud.com',
+            session=session,
         )
         headers = {
-            'X-CSRF-TOKEN': self.csrf_token,
+            'X-CSRF-TOKEN': csrf_token or payload.get('_token', ''),
             'Referer': referer_url,
             'Origin': self.base_url,
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8'
         }
         if xsrf_cookie:
             headers['X-XSRF-TOKEN'] = unquote(xsrf_cookie)
-        return self.request('POST', target_url, data=payload, headers=headers)
+        return self.request('POST', target_url, data=payload, headers=headers, state=state)
 
     def try_handle_invoice_from_response(self, service_id, response, allow_invoice_poll=True):
+        response = PageResponse.of(response)
         if '/invoice/' in response.url:
             self.log("⚡️ 续期成功，已跳转账单页，自动执行支付...")
-            pay_result = self.perform_pay_from_html(response.text, response.url)
+            pay_result = self.perform_pay_from_html(response, response.url)
             if pay_result in {'paid', 'already_processed'}:
                 return True, 'invoice_page'
             if not allow_invoice_poll:
                 return False, None
             self.log("⚠️ 跳转账单页当前不可支付，改为检查当前服务未付账单...")
-            invoice_polled = self.check_and_pay_invoices(service_id, is_precheck=False, retries=6, retry_delay=8)
+            invoice_polled = self.check_and_pay_invoices(service_id, is_precheck=False)
             if invoice_polled:
                 return True, 'invoice_poll'
             return False, None
 
-        soup_resp = BeautifulSoup(response.text, 'html.parser')
+        soup_resp = response.soup
         server_error = self.extract_server_error_message(soup_resp)
         if server_error:
             self.log(f"⚠️ 续期请求被服务端拒绝，页面提示: {server_error}")
@@ -568,7 +2062,7 @@ class HidenCloudBot:
                 return False, None
 
             self.log("⚠️ 响应中的账单链接均不可支付，改为检查当前服务未付账单...")
-            invoice_polled = self.check_and_pay_invoices(service_id, is_precheck=False, retries=6, retry_delay=8)
+            invoice_polled = self.check_and_pay_invoices(service_id, is_precheck=False)
             if invoice_polled:
                 return True, 'invoice_poll'
             return False, None
@@ -587,7 +2081,7 @@ class HidenCloudBot:
             self.log(f"⚠️ 提交成功但未自动跳转，响应URL: {response.url} | 状态码: {response.status_code}")
             self.log("后置轮询检查账单...")
 
-        invoice_polled = self.check_and_pay_invoices(service_id, is_precheck=False, retries=6, retry_delay=8)
+        invoice_polled = self.check_and_pay_invoices(service_id, is_precheck=False)
         if invoice_polled:
             return True, 'invoice_poll'
         return False, None
@@ -601,34 +2095,136 @@ class HidenCloudBot:
                 self.log("❌ 当前 Cookie 已失效")
                 return False
 
-            soup = BeautifulSoup(res.text, 'html.parser')
+            soup = res.soup
             log_print(f"👀 [调试] 网页标题是: {soup.title.string if soup.title else '无标题'}")
 
-            self._refresh_csrf(soup)
+            self._refresh_csrf(res)
 
-            self.services = []
-            for a in soup.find_all('a', href=True):
-                href = a['href']
-                if '/service/' in href and '/manage' in href:
-                    svc_id = href.split('/service/')[1].split('/')[0]
-                    if not any(s['id'] == svc_id for s in self.services):
-                        self.services.append({'id': svc_id, 'url': href})
+            pages = self.fetch_paginated(res)
+            self.services = self.discover_services(*(page.soup for page in pages))
 
-            self.log(f"✅ 登录成功，发现 {len(self.services)} 个服务。")
+            page_note = f"（共 {len(pages)} 页）" if len(pages) > 1 else ""
+            self.log(f"✅ 登录成功，发现 {len(self.services)} 个服务{page_note}。")
             self.save_cookies(upload=True)
             return True
         except Exception as e:
             self.log(f"❌ 初始化异常: {e}")
             return False
 
-    def process_service(self, service, allow_rebuild_retry=True, skip_initial_delay=False, rebuild_retry=False):
-        if not skip_initial_delay:
-            sleep_random(2000, 4000)
+    def discover_services(self, *soups):
+        """从一个或多个控制台页面中收集服务管理链接，按服务 ID 建索引，保持首次出现的顺序。"""
+        index = {}
+        for soup in soups:
+            for a in soup.find_all('a', href=True):
+                href = a['href']
+                if '/service/' in href and '/manage' in href:
+                    svc_id = href.split('/service/')[1].split('/')[0]
+                    if svc_id not in index:
+                        index[svc_id] = {'id': svc_id, 'url': href}
+        return list(index.values())
+
+    def find_page_links(self, soup, page_url):
+        """收集指向当前页同一路径的分页链接（?page=N），返回 {页码: 绝对地址}。"""
+        path = urlparse(page_url).path
+        pages = {}
+        for a in soup.find_all('a', href=True):
+            url = urljoin(page_url, a['href'])
+            parsed = urlparse(url)
+            if parsed.path != path:
+                continue
+            number = (parse_qs(parsed.query).get('page') or [''])[-1]
+            if number.isdigit() and int(number) > 1:
+                pages[int(number)] = url
+        return pages
+
+    def fetch_paginated(self, first_page, label='控制台'):
+        """
+        跟随列表页（控制台、账单列表）的分页，返回按页码排列的页面列表（第一页为 first_page）。
+
+        分页链接通常只显示首尾和当前页附近的页码，这里按已知的最大页码补全中间页，
+        同一轮的页面并发抓取；只有“下一页”链接的简单分页则每轮前进一页。
+        """
+        fetched = {1: first_page}
+        known = self.find_page_links(first_page.soup, first_page.url)
+        while known:
+            last = min(max(known), DASHBOARD_MAX_PAGES)
+            template = next(iter(known.values()))
+            pending = [number for number in range(2, last + 1) if number not in fetched]
+            if not pending:
+                break
+            urls = [known.get(number) or self._with_page(template, number) for number in pending]
+            for number, (page, logs) in zip(pending, self._fetch_pages(urls, label)):
+                replay_logs(logs)
+                fetched[number] = page
+                if page is not None:
+                    known.update(self.find_page_links(page.soup, page.url))
+            known = {number: url for number, url in known.items() if number not in fetched}
+
+        if known and min(known) > DASHBOARD_MAX_PAGES:
+            self.log(f"⚠️ {label}分页超过 {DASHBOARD_MAX_PAGES} 页，只读取前 {DASHBOARD_MAX_PAGES} 页（可调整 DASHBOARD_MAX_PAGES）")
+        return [fetched[number] for number in sorted(fetched) if fetched[number] is not None]
+
+    @staticmethod
+    def _with_page(url, number):
+        parsed = urlparse(url)
+        query = parse_qs(parsed.query)
+        query['page'] = [str(number)]
+        return parsed._replace(query=urlencode(query, doseq=True)).geturl()
+
+    def _fetch_pages(self, urls, label):
+        """并发 GET 多个页面（仍经过全局限速器），按输入顺序返回 [(页面或 None, 日志)]。"""
+        workers = 1 if PROFILER.enabled else max(1, min(REQUEST_MAX_IN_FLIGHT, len(urls)))
+        if workers == 1:
+            return [self._fetch_page_buffered(url, label) for url in urls]
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'account{self.index}-page') as pool:
+            return list(pool.map(lambda url: self._fetch_page_buffered(url, label), urls))
+
+    def _fetch_page_buffered(self, url, label):
+        with capture_logs() as logs:
+            try:
+                page = self.request('GET', url)
+            except Exception as e:
+                self.log(f"⚠️ {label}分页读取失败: {url} ({e})")
+                page = None
+            else:
+                if '/login' in page.url:
+                    self.log(f"⚠️ {label}分页跳转到登录页: {url}")
+                    page = None
+        return page, logs
+
+    def process_services(self, max_workers=SERVICE_CONCURRENCY):
+        services = list(self.services)
+        workers = max(1, min(max_workers, len(services)))
+        if workers == 1:
+            for service in services:
+                self.process_service(service)
+            return
+
+        self.log(f"🧵 并发处理 {len(services)} 个服务，最多同时 {workers} 个")
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'account{self.index}') as pool:
+            futures = [pool.submit(self._process_service_buffered, service) for service in services]
+            # 按服务顺序合并日志，保证报告可读
+            for future in futures:
+                replay_logs(future.result())
+
+    def _process_service_buffered(self, service):
+        with capture_logs() as logs:
+            self.process_service(service)
+        return logs
+
+    def process_service(self, service, allow_rebuild_retry=True, rebuild_retry=False):
         self.log(f">>> 处理服务 ID: {service['id']}")
 
+        skip_until = None if rebuild_retry else RenewalSchedule.skip_until(service['id'], account=self.index)
+        if skip_until is not None:
+            if not self.indexed_invoices(service['id']):
+                self.log(f"📅 按续期计划跳过，{format_timestamp(skip_until)} 前不会到期")
+                return
+            self.log("📅 续期计划显示未到期，但账单扫描发现未付账单，照常处理")
+
         try:
             # 1. 预检：清理遗留未付账单（已处理过的会被 processed_invoices 过滤）
-            self.check_and_pay_invoices(service['id'], is_precheck=True)
+            self.precheck_invoices(service['id'])
 
             # 2. 获取管理页面，同时刷新 CSRF token
             manage_res, soup = self.fetch_manage_page(service['id'])
@@ -647,8 +2243,12 @@ class HidenCloudBot:
                         threshold_text = "1 day" if threshold == 1 else f"{threshold} days"
                         kind = "免费服务" if is_free else "服务"
                         self.log(f"⏳ 暂未到达续期时间: {kind}剩余时间低于 {threshold_text} 才可续期。当前剩余: {days_until} 天。")
+                        RenewalSchedule.record(service['id'], days_until, threshold, account=self.index)
                         return
 
+            # 已到期或无法判断，下次运行照常检查
+            RenewalSchedule.record(service['id'], account=self.index)
+
             # ================== 4. 执行单次精准续期 ==================
             token_input = soup.find('input', attrs={'name': '_token'})
             if not token_input:
@@ -656,18 +2256,16 @@ class HidenCloudBot:
                 return
 
             self.log(f"提交续期 ({RENEW_DAYS}天)...")
-            sleep_random(1000, 2000)
 
             submit_stage = 'first_submit'
-            res = self.submit_renew_request(service['id'], soup, manage_res.url)
+            res = self.submit_renew_request(service['id'], manage_res)
             handled, outcome = self.try_handle_invoice_from_response(service['id'], res, allow_invoice_poll=False)
 
             if not handled and res.status_code == 419:
                 self.log("♻️ 首次续期请求返回 419，刷新管理页获取新 Token 后重试一次...")
-                sleep_random(1000, 2000)
                 manage_res, soup = self.fetch_manage_page(service['id'])
                 submit_stage = 'same_session_retry'
-                res = self.submit_renew_request(service['id'], soup, manage_res.url)
+                res = self.submit_renew_request(service['id'], manage_res)
                 handled, outcome = False, None
 
             # ================== 5. 结果校验与支付 ==================
@@ -681,8 +2279,8 @@ class HidenCloudBot:
 
             if not handled and allow_rebuild_retry and res.status_code == 419:
                 self.log("♻️ 当前会话内续期仍失败，模拟重跑 Job：重建会话后完整重试当前服务一次...")
-                if self.rebuild_session_and_reinit():
-                    self.process_service(service, allow_rebuild_retry=False, skip_initial_delay=True, rebuild_retry=True)
+                if self.rebuild_session_and_reinit(failed_generation=getattr(res, 'session_generation', None)):
+                    self.process_service(service, allow_rebuild_retry=False, rebuild_retry=True)
                 else:
                     self.log("❌ 重建会话后仍无法重新登录，放弃本服务本轮续期")
                     self.mark_retry_needed(f"服务 {service['id']} 重建会话后仍无法完成续期")
@@ -696,14 +2294,128 @@ class HidenCloudBot:
             # 每处理完一个服务保存一次 Cookie，而非每次请求都上传
             self.save_cookies(upload=True)
 
-    def check_and_pay_invoices(self, service_id, is_precheck=False, retries=1, retry_delay=5):
-        if not is_precheck:
-            sleep_random(2000, 3000)
+    def sweep_unpaid_invoices(self):
+        """
+        账号级未付账单扫描：读取账单列表（含分页），按所在行的服务链接建立 服务 → 待付账单 索引，
+        供各服务预检直接使用。找不到对应服务的账单（充值、其他账号页面上不存在的服务等）只记录不支付；
+        列表不可用、或有未付账单却一张都对应不上服务（行内没有服务链接）时 invoice_index 保持 None，
+        各服务回退为逐个请求预检。
+        """
+        self.invoice_index = None
+        if not INVOICE_SWEEP_PATH:
+            return False
+        try:
+            first_page = self.request('GET', INVOICE_SWEEP_PATH)
+        except Exception as e:
+            self.log(f"⚠️ 账单列表读取失败，回退为逐个服务预检: {e}")
+            return False
+        if first_page.status_code != 200 or not self.is_invoice_list_page(first_page):
+            self.log(f"⚠️ 账单列表不可用 (HTTP {first_page.status_code}, {first_page.url})，回退为逐个服务预检")
+            return False
+
+        service_ids = {service['id'] for service in self.services}
+        index = {}
+        orphans = {}
+        try:
+            for page in self.fetch_paginated(first_page, label='账单列表'):
+                if not self.is_invoice_list_page(page):
+                    self.log(f"⚠️ 账单列表分页不是账单列表 ({page.url})，回退为逐个服务预检")
+                    return False
+                links = self.extract_invoice_links(page.soup, require_payment_context=True)
+                for url, service_id in self.map_invoices_to_services(page.soup, links).items():
+                    if service_id in service_ids:
+                        index.setdefault(service_id, {})[url] = None
+                    else:
+                        orphans[url] = None
+        except Exception as e:
+            self.log(f"⚠️ 账单列表解析失败，回退为逐个服务预检: {e}")
+            return False
+
+        mapped = sum(len(urls) for urls in index.values())
+        self.log(f"🧾 账单扫描：{mapped + len(orphans)} 张未付账单，{mapped} 张对应到 {len(index)} 个服务")
+        for url in orphans:
+            self.log(f"🔍 账单未对应到当前服务，跳过: {url}")
+        if orphans and not index:
+            self.log("⚠️ 账单列表无法对应到任何服务，回退为逐个服务预检")
+            return False
+        with self._state_lock:
+            self.invoice_index = {service_id: list(urls) for service_id, urls in index.items()}
+        return True
+
+    @staticmethod
+    def is_invoice_list_page(page):
+        """
+        只有最终地址仍是扫描路径、且标题或表头表明是账单列表时才信任扫描结果。
+        被重定向到控制台或登录页的 200 响应会被误读为“没有未付账单”，从而跳过所有预检。
+        """
+        if urlparse(page.url).path.rstrip('/') != urlparse(INVOICE_SWEEP_PATH).path.rstrip('/'):
+            return False
+        for tag in page.soup.find_all(['title', 'h1', 'h2', 'h3', 'th']):
+            text = tag.get_text(' ', strip=True).lower()
+            if 'invoice' in text or '账单' in text:
+                return True
+        return False
+
+    def map_invoices_to_services(self, soup, invoice_urls):
+        """在每张账单链接所在的单行容器内查找服务链接，返回 {账单地址: 服务 ID 或 None}。"""
+        mapping = {url: None for url in invoice_urls}
+        for a in soup.find_all('a', href=True):
+            if not is_invoice_href(a['href']):
+                continue
+            url = self.normalize_url(a['href'])
+            if mapping.get(url, '') is not None:
+                continue
+            for container in a.parents:
+                if container.name not in INVOICE_CONTAINER_TAGS:
+                    continue
+                # 容器里出现其他账单时已超出这一行，停止向上查找
+                if any(self.normalize_url(link['href']) != url
+                       for link in container.find_all('a', href=True) if is_invoice_href(link['href'])):
+                    break
+                service_link = container.find('a', href=_SERVICE_HREF)
+                if service_link:
+                    mapping[url] = _SERVICE_HREF.search(service_link['href']).group(1)
+                    break
+        return mapping
+
+    def indexed_invoices(self, service_id):
+        with self._state_lock:
+            return list((self.invoice_index or {}).get(str(service_id), []))
+
+    def precheck_invoices(self, service_id):
+        """有账号级扫描结果时直接支付索引中的账单，不再请求该服务的账单页；否则逐个预检。"""
+        with self._state_lock:
+            index = self.invoice_index
+            pending = None if index is None else index.pop(str(service_id), [])
+        if pending is None:
+            return self.check_and_pay_invoices(service_id, is_precheck=True)
+        pending = [url for url in pending
+                   if url not in self.processed_invoices and url not in self.non_payable_invoices]
+        if not pending:
+            return False
 
-        for attempt in range(retries):
+        self.log(f"🔍 账单扫描发现 {len(pending)} 个未付账单，准备清理...")
+        paid_any = False
+        for url in pending:
+            if self.pay_single_invoice(url) in {'paid', 'already_processed'}:
+                paid_any = True
+        return paid_any
+
+    def check_and_pay_invoices(self, service_id, is_precheck=False, poll_policy=None):
+        """预检只查一次；续期后按轮询策略查询，发现新账单或页面报错时立即结束。"""
+        if poll_policy is None:
+            poll_policy = InvoicePollPolicy.single() if is_precheck else INVOICE_POLL_POLICY
+
+        started_at = time.monotonic()
+        if poll_policy.first_delay > 0:
+            sleep_for(poll_policy.first_delay)
+
+        attempt = 0
+        while True:
+            attempt += 1
             try:
-                res = self.request('GET', f"/service/{service_id}/invoices?where=unpaid")
-                soup = BeautifulSoup(res.text, 'html.parser')
+                res = PageResponse.of(self.request('GET', f"/service/{service_id}/invoices?where=unpaid"))
+                soup = res.soup
                 invoice_links = self.extract_invoice_links(soup, require_payment_context=True)
 
                 # 过滤掉本次运行中已处理过的账单，避免重复操作
@@ -712,9 +2424,14 @@ class HidenCloudBot:
                                    and url not in self.non_payable_invoices]
 
                 if not unique_invoices:
-                    if retries > 1 and attempt < retries - 1:
-                        self.log(f"⚪ 第{attempt+1}次检查无新账单，{retry_delay}秒后重试...")
-                        time.sleep(retry_delay)
+                    wait = poll_policy.next_wait(attempt, time.monotonic() - started_at)
+                    if wait is not None:
+                        server_error = self.extract_server_error_message(soup)
+                        if server_error:
+                            self.log(f"⚠️ 账单页面提示错误，停止轮询: {server_error}")
+                            return False
+                        self.log(f"⚪ 第{attempt}次检查无新账单，{wait:g}秒后重试...")
+                        sleep_for(wait)
                         continue
                     if not is_precheck:
                         self.log("⚪ 无未支付账单")
@@ -726,7 +2443,6 @@ class HidenCloudBot:
                     pay_result = self.pay_single_invoice(url)
                     if pay_result in {'paid', 'already_processed'}:
                         paid_any = True
-                    sleep_random(3000, 5000)
                 return paid_any
 
             except Exception as e:
@@ -734,8 +2450,16 @@ class HidenCloudBot:
                 self.mark_retry_needed(f"服务 {service_id} 查询账单异常")
                 return False
 
+    def invoice_lock(self, normalized_url):
+        with self._state_lock:
+            return self._invoice_locks.setdefault(normalized_url, threading.RLock())
+
     def pay_single_invoice(self, url):
         normalized_url = self.normalize_url(url)
+        with self.invoice_lock(normalized_url):
+            return self._pay_single_invoice(normalized_url)
+
+    def _pay_single_invoice(self, normalized_url):
         if normalized_url in self.processed_invoices:
             self.log(f"⏭️ 账单已处理，跳过重复支付: {normalized_url}")
             return 'already_processed'
@@ -746,14 +2470,19 @@ class HidenCloudBot:
         try:
             self.log(f"📄 打开账单: {normalized_url}")
             res = self.request('GET', normalized_url)
-            return self.perform_pay_from_html(res.text, normalized_url)
+            return self.perform_pay_from_html(res, normalized_url)
         except Exception as e:
             self.log(f"访问账单失败: {e}")
             self.mark_retry_needed("账单页面访问失败")
             return 'invoice_fetch_failed'
 
-    def perform_pay_from_html(self, html_content, current_url):
+    def perform_pay_from_html(self, page, current_url):
+        """page 可以是 PageResponse、响应对象或 HTML 字符串；已解析过的页面不会重复解析。"""
         normalized_current_url = self.normalize_url(current_url)
+        with self.invoice_lock(normalized_current_url):
+            return self._perform_pay_from_html(PageResponse.of(page, current_url), current_url, normalized_current_url)
+
+    def _perform_pay_from_html(self, page, current_url, normalized_current_url):
         if normalized_current_url in self.processed_invoices:
             self.log(f"⏭️ 账单已处理，跳过重复支付: {normalized_current_url}")
             return 'already_processed'
@@ -761,8 +2490,8 @@ class HidenCloudBot:
             self.log(f"⏭️ 账单当前不可支付，跳过重复检查: {normalized_current_url}")
             return 'non_payable'
 
-        soup = BeautifulSoup(html_content, 'html.parser')
-        self._refresh_csrf(soup)
+        soup = page.soup
+        self._refresh_csrf(page)
 
         target_form = None
         target_action = ""
@@ -791,8 +2520,7 @@ class HidenCloudBot:
 
         if not target_form:
             page_title = soup.title.string.strip() if soup.title and soup.title.string else "无标题"
-            page_text = soup.get_text(" ", strip=True)
-            if not self.has_invoice_payment_context(page_text):
+            if not self.has_invoice_payment_context(page.page_text):
                 self.non_payable_invoices.add(normalized_current_url)
                 self.log(f"⚪ 账单页面未显示未支付/支付入口，视为本轮不可支付并跳过: {normalized_current_url}")
                 return 'non_payable'
@@ -811,8 +2539,9 @@ class HidenCloudBot:
         self.log("👉 提交支付...")
         try:
             action_url = self.normalize_url(target_action)
-            headers = {'X-CSRF-TOKEN': self.csrf_token, 'Referer': current_url}
-            res = self.request('POST', action_url, data=payload, headers=headers)
+            state = self.session_state()
+            headers = {'X-CSRF-TOKEN': state[1], 'Referer': current_url}
+            res = self.request('POST', action_url, data=payload, headers=headers, state=state)
 
             if res.status_code == 200:
                 self.log("✅ 支付成功！")
@@ -827,47 +2556,105 @@ class HidenCloudBot:
             self.mark_retry_needed(f"账单 {normalized_current_url} 支付异常")
             return 'payment_failed'
 
+# ================= 多账号调度 =================
+def run_account(index, cookie):
+    """执行单个账号的完整续期流程，返回该账号是否需要重试。"""
+    try:
+        with PROFILER.account(index):
+            bot = HidenCloudBot(cookie, index)
+            success = bot.init()
+
+            if not success:
+                bot.reset_to_env(cookie)
+                success = bot.init()
+
+            if success:
+                bot.sweep_unpaid_invoices()
+                if PROFILER.enabled:
+                    # cProfile 只记录当前线程，剖析时逐个处理服务
+                    bot.process_services(max_workers=1)
+                else:
+                    bot.process_services()
+            else:
+                log_print(f"账号 {index + 1}: 登录失败，请检查 Cookie")
+                bot.mark_retry_needed("账号初始化失败")
+        return bot.retry_needed
+    except Exception as e:
+        log_print(f"[账号 {index + 1}] ❌ 运行异常: {e}")
+        return True
+    finally:
+        CacheManager.flush()
+        log_print("\n----------------------------------------\n")
+
+def _run_account_buffered(index, cookie):
+    with capture_logs() as logs:
+        retry_needed = run_account(index, cookie)
+    return logs, retry_needed
+
+def run_accounts(cookies_list, max_workers=ACCOUNT_CONCURRENCY):
+    """按账号并发运行，日志按账号顺序合并输出，返回是否有账号需要重试。"""
+    any_retry_needed = False
+    workers = max(1, min(max_workers, len(cookies_list)))
+
+    if workers == 1:
+        for i, cookie in enumerate(cookies_list):
+            if run_account(i, cookie):
+                any_retry_needed = True
+        return any_retry_needed
+
+    log_print(f"🧵 并发运行 {len(cookies_list)} 个账号，最多同时 {workers} 个")
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='account') as pool:
+        futures = [pool.submit(_run_account_buffered, i, cookie) for i, cookie in enumerate(cookies_list)]
+        # 按提交顺序取结果，保证报告与顺序运行时一致
+        for future in futures:
+            logs, retry_needed = future.result()
+            replay_logs(logs)
+            if retry_needed:
+                any_retry_needed = True
+    return any_retry_needed
+
 # ================= 主程序 =================
 if __name__ == '__main__':
+    configure_profiler(parse_cli_args())
     env_cookies = os.environ.get("HIDEN_COOKIE", "")
     cookies_list = re.split(r'[&\n]', env_cookies)
     cookies_list = [c for c in cookies_list if c.strip()]
-    any_retry_needed = False
 
     if not cookies_list:
         log_print("❌ 未配置环境变量 HIDEN_COOKIE")
         sys.exit(1)
 
+    configure_log_sinks()
+
     WebDavManager().download()
+    WebDavManager().download_schedule()
 
     log_print(f"\n=== HidenCloud 续期脚本启动 (Python版) ===")
 
-    for i, cookie in enumerate(cookies_list):
-        bot = HidenCloudBot(cookie, i)
-        success = bot.init()
-
-        if not success:
-            bot.reset_to_env(cookie)
-            success = bot.init()
+    # 剖析模式下逐个运行账号，避免多个 cProfile 同时启用
+    any_retry_needed = run_accounts(cookies_list, max_workers=1 if PROFILER.enabled else ACCOUNT_CONCURRENCY)
 
-        if success:
-            for service in bot.services:
-                bot.process_service(service)
-        else:
-            log_print(f"账号 {i + 1}: 登录失败，请检查 Cookie")
-            bot.mark_retry_needed("账号初始化失败")
+    CacheManager.flush()
+    if not CACHE_REPLICATOR.flush():
+        log_print("⚠️ 云端缓存同步超时，最新 Cookie 可能未上传")
+    submitted, uploaded, failed = CACHE_REPLICATOR.summary()
+    if submitted:
+        log_print(f"☁️ 云端缓存同步完成：{submitted} 次更新合并为 {uploaded} 次上传，失败 {failed} 次")
 
-        if bot.retry_needed:
-            any_retry_needed = True
+    if RenewalSchedule.has_updates():
+        WebDavManager().upload_schedule()
+    RenewalSchedule.flush()
+    emit_logs(RenewalSchedule.report_lines())
 
-        log_print("\n----------------------------------------\n")
-        if i < len(cookies_list) - 1:
-            sleep_random(5000, 10000)
-
-    final_content = "\n".join(ALL_LOGS)
+    final_content = "\n".join(ALL_LOGS.digest())
     if final_content:
         send_notify("HidenCloud 续期报告", final_content)
 
+    # 请求统计只输出到控制台和日志文件，不进入通知正文
+    emit_logs(REQUEST_STATS.summary_lines())
+    if PROFILER.enabled:
+        log_print(f"🔬 阶段耗时合计：{PHASE_TIMER.describe(PHASE_TIMER.snapshot())}")
+
     if any_retry_needed:
         log_print("🔁 本轮存在可重试失败，脚本将返回退出码 1，供 GitHub Actions 延时再跑一次")
         sys.exit(1)
@@ -1,9 +1,10 @@
 # -*- coding: utf-8 -*-
 """
-QingLong 风格的单选通知分发模块。
+QingLong 风格的通知分发模块。
 
 特点：
-- 默认渠道为 wxPusherBot
+- 默认渠道为 wxPusherBot，NOTIFY_CHANNEL 可填写多个渠道（逗号、分号或换行分隔）
+- 多个渠道并发推送，整体受 NOTIFY_DEADLINE 时限约束：每个请求的超时不超过剩余时间，超时后不再发起新请求
 - 支持 QingLong 官方通知类型
 - 保留当前项目旧版 WxPusher 环境变量兼容
 - 统一按 UTF-8 处理中文内容
@@ -18,8 +19,12 @@ import json
 import os
 import re
 import smtplib
+import tempfile
+import threading
 import time
 import urllib.parse
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
 from email.header import Header
 from email.mime.text import MIMEText
 from email.utils import formataddr
@@ -27,6 +32,7 @@ from html import escape
 from typing import Callable
 
 import requests
+from requests.adapters import HTTPAdapter
 
 
 OFFICIAL_CHANNELS = {
@@ -77,8 +83,206 @@ CHANNEL_ALIASES = {
 }
 
 
+class NotifyDeadlineExceeded(Exception):
+    """本次推送已超过 NOTIFY_DEADLINE，不再发起新的请求。"""
+
+
+_deadline = threading.local()
+_recipient_filter = threading.local()
+
+
+@contextmanager
+def _deadline_scope(at: float | None):
+    """为当前线程设置推送截止时刻（time.monotonic()），退出时恢复。"""
+    previous = getattr(_deadline, "at", None)
+    _deadline.at = at
+    try:
+        yield
+    finally:
+        _deadline.at = previous
+
+
+@contextmanager
+def _only_recipients(names: set[str] | None):
+    """限制当前线程内多接收方渠道只投递给 names 中的接收方；None 表示全部。"""
+    previous = getattr(_recipient_filter, "names", None)
+    _recipient_filter.names = names
+    try:
+        yield
+    finally:
+        _recipient_filter.names = previous
+
+
+def _deadline_passed() -> bool:
+    at = getattr(_deadline, "at", None)
+    return at is not None and time.monotonic() >= at
+
+
+def _request_timeout(timeout):
+    """把请求超时收紧到截止前的剩余时间；已超过截止时刻时抛出 NotifyDeadlineExceeded。"""
+    at = getattr(_deadline, "at", None)
+    if at is None:
+        return timeout
+    remaining = at - time.monotonic()
+    if remaining <= 0:
+        raise NotifyDeadlineExceeded("已超过 NOTIFY_DEADLINE")
+    if timeout is None:
+        return remaining
+    if isinstance(timeout, tuple):
+        return tuple(remaining if part is None else min(part, remaining) for part in timeout)
+    return min(timeout, remaining)
+
+
+class DeadlineSession(requests.Session):
+    """每个请求的超时不超过当前线程剩余的推送时限。"""
+
+    def request(self, method, url, **kwargs):
+        kwargs["timeout"] = _request_timeout(kwargs.get("timeout"))
+        return super().request(method, url, **kwargs)
+
+
+def _build_session() -> requests.Session:
+    """所有渠道共用一个带连接池的会话，复用 TCP/TLS 连接；代理等按请求单独传入。"""
+    session = DeadlineSession()
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+SESSION = _build_session()
+
+
+class TokenCache:
+    """
+    OAuth 风格访问令牌缓存：按凭据摘要索引，在 expires_in 到期前 safety_margin 秒视为失效。
+    设置 NOTIFY_TOKEN_CACHE 后持久化到该文件，多次定时运行可复用仍有效的令牌。
+    """
+
+    def __init__(self, path: str | None = None, safety_margin: float = 300):
+        self._lock = threading.Lock()
+        self._tokens: dict[str, dict[str, object]] = {}
+        self._path = path
+        self._loaded_path: str | None = None
+        self.safety_margin = safety_margin
+
+    @staticmethod
+    def key(*parts: str) -> str:
+        """凭据只以摘要形式出现在缓存文件中。"""
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+    @property
+    def path(self) -> str:
+        return self._path if self._path is not None else _env_first("NOTIFY_TOKEN_CACHE")
+
+    def _load(self) -> None:
+        path = self.path
+        if not path or self._loaded_path == path:
+            return
+        self._loaded_path = path
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return
+        if isinstance(stored, dict):
+            for key, entry in stored.items():
+                if isinstance(entry, dict) and key not in self._tokens:
+                    self._tokens[key] = entry
+
+    def _save(self) -> None:
+        path = self.path
+        if not path:
+            return
+        directory = os.path.dirname(os.path.abspath(path))
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".token-", suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self._tokens, f)
+            os.replace(tmp_path, path)
+            tmp_path = None
+        except (OSError, TypeError, ValueError) as exc:
+            _log(f"保存通知令牌缓存失败：{exc}")
+        finally:
+            # 写入或替换失败时清理临时文件，不在缓存目录里留下 .token-*.tmp
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            self._load()
+            entry = self._tokens.get(key)
+            if not entry or float(entry.get("expires_at", 0)) - self.safety_margin <= time.time():
+                return None
+            return str(entry.get("token"))
+
+    def put(self, key: str, token: str, expires_in: float) -> None:
+        with self._lock:
+            self._load()
+            self._tokens[key] = {"token": token, "expires_at": time.time() + float(expires_in)}
+            self._save()
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._load()
+            if self._tokens.pop(key, None) is not None:
+                self._save()
+
+    def clear(self) -> None:
+        """只清空内存，下次访问时重新读取持久化文件。"""
+        with self._lock:
+            self._tokens.clear()
+            self._loaded_path = None
+
+    def fetch(self, key: str, fetcher: Callable[[], tuple[str | None, float]], force: bool = False) -> str | None:
+        """返回缓存的令牌；缺失、过期或 force 时调用 fetcher 获取 (令牌, 有效秒数) 并缓存。"""
+        if not force:
+            token = self.get(key)
+            if token:
+                return token
+        token, expires_in = fetcher()
+        if token:
+            self.put(key, token, expires_in)
+        return token
+
+
+TOKEN_CACHE = TokenCache()
+
+
+# 各渠道单条消息正文的大小上限（UTF-8 字节，已为标题等留出余量）；未列出的渠道不拆分。
+# 可用 NOTIFY_SIZE_LIMITS 覆盖，例如 "telegram=3000;dingtalk=10000"，0 表示不限制。
+CHANNEL_SIZE_LIMITS: dict[str, int] = {
+    "telegramBot": 4000,
+    "dingtalkBot": 18000,
+    "weWorkBot": 2000,
+    "weWorkApp": 2000,
+    "feishu": 18000,
+    "bark": 3000,
+    "ntfy": 4000,
+    "goCqHttpBot": 4000,
+    "chronocat": 4000,
+    "pushDeer": 4000,
+    "serverChan": 32000,
+    "pushPlus": 20000,
+    "wxPusherBot": 40000,
+}
+
+
+_logger: Callable[[str], None] | None = None
+
+
+def set_logger(logger: Callable[[str], None] | None) -> None:
+    """替换通知模块的日志输出，便于调用方统一收集；传入 None 恢复为 print。"""
+    global _logger
+    _logger = logger
+
+
 def _log(message: str) -> None:
-    print(message)
+    (_logger or print)(message)
 
 
 def json_dumps(payload: object) -> str:
@@ -107,6 +311,40 @@ def _bool_env(name: str, default: bool = False) -> bool:
     return value.strip().lower() in {"1", "true", "yes", "on"}
 
 
+def _float_env(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, "").strip() or default)
+    except ValueError:
+        return default
+
+
+def _fan_out(targets: dict[str, Callable[[], bool]]) -> dict[str, bool]:
+    """
+    并发投递多个接收方，返回每个接收方是否成功；并发数受 NOTIFY_RECIPIENT_WORKERS 限制。
+    单个接收方的异常只记为该接收方失败；分段重试时只投递给 _only_recipients 指定的接收方。
+    """
+    allowed = getattr(_recipient_filter, "names", None)
+    if allowed is not None:
+        targets = {name: send_one for name, send_one in targets.items() if name in allowed}
+    if not targets:
+        return {}
+
+    # 接收方在其他线程中发送，沿用调用方的截止时刻
+    deadline_at = getattr(_deadline, "at", None)
+
+    def run(send_one: Callable[[], bool]) -> bool:
+        try:
+            with _deadline_scope(deadline_at):
+                return bool(send_one())
+        except Exception:
+            return False
+
+    workers = max(1, min(len(targets), int(_float_env("NOTIFY_RECIPIENT_WORKERS", 4))))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="notify-recipient") as executor:
+        futures = {name: executor.submit(run, send_one) for name, send_one in targets.items()}
+    return {name: future.result() for name, future in futures.items()}
+
+
 def normalize_channel(channel: str | None) -> str:
     if channel is None:
         return "wxPusherBot"
@@ -118,6 +356,16 @@ def normalize_channel(channel: str | None) -> str:
     return CHANNEL_ALIASES.get(key.lower(), key)
 
 
+def parse_channels(raw: str | None) -> list[str]:
+    """解析 NOTIFY_CHANNEL，返回去重后的渠道列表；未填写时使用默认渠道。"""
+    channels: list[str] = []
+    for item in _split_values(raw or "") or [""]:
+        channel = normalize_channel(item)
+        if channel not in channels:
+            channels.append(channel)
+    return channels
+
+
 def _rfc2047(text: str) -> str:
     encoded_bytes = base64.b64encode(text.encode("utf-8"))
     return f"=?utf-8?B?{encoded_bytes.decode('utf-8')}?="
@@ -250,7 +498,7 @@ def send_bark(title: str, content: str) -> bool:
         value = _env_first(env_name)
         if value:
             data[payload_name] = value
-    response = requests.post(
+    response = SESSION.post(
         url,
         data=json_dumps(data),
         headers={"Content-Type": "application/json; charset=utf-8"},
@@ -266,7 +514,7 @@ def send_gotify(title: str, content: str) -> bool:
         "message": content,
         "priority": _env_first("GOTIFY_PRIORITY") or 0,
     }
-    response = requests.post(url, data=data, timeout=15)
+    response = SESSION.post(url, data=data, timeout=15)
     return bool(_response_json(response).get("id"))
 
 
@@ -282,7 +530,7 @@ def send_go_cqhttp(title: str, content: str) -> bool:
     if "=" in target:
         key, value = target.split("=", 1)
         params[key] = value
-    response = requests.get(url, params=params, timeout=15)
+    response = SESSION.get(url, params=params, timeout=15)
     return _response_json(response).get("status") == "ok"
 
 
@@ -293,7 +541,7 @@ def send_server_chan(title: str, content: str) -> bool:
         url = f"https://{match.group(1)}.push.ft07.com/send/{send_key}.send"
     else:
         url = f"https://sctapi.ftqq.com/{send_key}.send"
-    response = requests.post(
+    response = SESSION.post(
         url,
         data={"text": title, "desp": content.replace("\n", "\n\n")},
         timeout=15,
@@ -304,7 +552,7 @@ def send_server_chan(title: str, content: str) -> bool:
 
 def send_pushdeer(title: str, content: str) -> bool:
     url = _env_first("DEER_URL") or "https://api2.pushdeer.com/message/push"
-    response = requests.post(
+    response = SESSION.post(
         url,
         data={
             "text": title,
@@ -320,7 +568,7 @@ def send_pushdeer(title: str, content: str) -> bool:
 
 def send_chat(title: str, content: str) -> bool:
     url = _env_first("CHAT_URL") + _env_first("CHAT_TOKEN")
-    response = requests.post(
+    response = SESSION.post(
         url,
         data="payload=" + json_dumps({"text": f"{title}\n{content}"}),
         timeout=15,
@@ -341,7 +589,7 @@ def send_telegram(title: str, content: str) -> bool:
             proxy_host = f"{proxy_auth}@{proxy_host}"
         proxy_str = f"http://{proxy_host}:{proxy_port}"
         proxies = {"http": proxy_str, "https": proxy_str}
-    response = requests.post(
+    response = SESSION.post(
         url,
         headers={"Content-Type": "application/x-www-form-urlencoded; charset=utf-8"},
         params={
@@ -365,7 +613,7 @@ def send_dingtalk(title: str, content: str) -> bool:
         hmac_code = hmac.new(secret.encode("utf-8"), string_to_sign.encode("utf-8"), digestmod=hashlib.sha256).digest()
         sign = urllib.parse.quote_plus(base64.b64encode(hmac_code))
         url = f"{url}&timestamp={timestamp}&sign={sign}"
-    response = requests.post(
+    response = SESSION.post(
         url,
         data=json_dumps({"msgtype": "text", "text": {"content": f"{title}\n\n{content}"}}),
         headers={"Content-Type": "application/json; charset=utf-8"},
@@ -377,7 +625,7 @@ def send_dingtalk(title: str, content: str) -> bool:
 def send_wework_bot(title: str, content: str) -> bool:
     origin = _env_first("QYWX_ORIGIN") or "https://qyapi.weixin.qq.com"
     url = f"{origin}/cgi-bin/webhook/send?key={_env_first('QYWX_KEY')}"
-    response = requests.post(
+    response = SESSION.post(
         url=url,
         data=json_dumps({"msgtype": "text", "text": {"content": f"{title}\n\n{content}"}}),
         headers={"Content-Type": "application/json; charset=utf-8"},
@@ -386,20 +634,25 @@ def send_wework_bot(title: str, content: str) -> bool:
     return _response_json(response).get("errcode") == 0
 
 
+# 企业微信令牌无效 / 过期的错误码
+WEWORK_TOKEN_EXPIRED_CODES = {40001, 40014, 42001}
+
+
 def send_wework_app(title: str, content: str) -> bool:
     corpid, corpsecret, touser, agentid, *rest = [item.strip() for item in _env_first("QYWX_AM").split(",") if item.strip()]
     media_id = rest[0] if rest else ""
     origin = _env_first("QYWX_ORIGIN") or "https://qyapi.weixin.qq.com"
-    token_response = requests.post(
-        url=f"{origin}/cgi-bin/gettoken",
-        params={"corpid": corpid, "corpsecret": corpsecret},
-        timeout=15,
-    )
-    access_token = _response_json(token_response).get("access_token")
-    if not access_token:
-        return False
+    cache_key = TokenCache.key("weWorkApp", origin, corpid, corpsecret)
+
+    def fetch_token() -> tuple[str | None, float]:
+        token_response = SESSION.post(
+            url=f"{origin}/cgi-bin/gettoken",
+            params={"corpid": corpid, "corpsecret": corpsecret},
+            timeout=15,
+        )
+        data = _response_json(token_response)
+        return data.get("access_token"), data.get("expires_in") or 7200
 
-    send_url = f"{origin}/cgi-bin/message/send?access_token={access_token}"
     if media_id:
         payload = {
             "touser": touser,
@@ -426,8 +679,19 @@ def send_wework_app(title: str, content: str) -> bool:
             "text": {"content": f"{title}\n\n{content}"},
             "safe": "0",
         }
-    response = requests.post(send_url, data=json_dumps(payload).encode("utf-8"), timeout=15)
-    return _response_json(response).get("errmsg") == "ok"
+    for attempt in range(2):
+        access_token = TOKEN_CACHE.fetch(cache_key, fetch_token, force=attempt > 0)
+        if not access_token:
+            return False
+        send_url = f"{origin}/cgi-bin/message/send?access_token={access_token}"
+        response = SESSION.post(send_url, data=json_dumps(payload).encode("utf-8"), timeout=15)
+        result = _response_json(response)
+        if result.get("errcode") in WEWORK_TOKEN_EXPIRED_CODES and attempt == 0:
+            # 令牌被提前作废，重新获取后再发一次
+            TOKEN_CACHE.invalidate(cache_key)
+            continue
+        return result.get("errmsg") == "ok"
+    return False
 
 
 def send_aibotk(title: str, content: str) -> bool:
@@ -446,7 +710,7 @@ def send_aibotk(title: str, content: str) -> bool:
             "name": _env_first("AIBOTK_NAME"),
             "message": {"type": 1, "content": f"【青龙快讯】\n\n{title}\n{content}"},
         }
-    response = requests.post(
+    response = SESSION.post(
         url=url,
         data=json_dumps(payload).encode("utf-8"),
         headers={"Content-Type": "application/json; charset=utf-8"},
@@ -456,7 +720,7 @@ def send_aibotk(title: str, content: str) -> bool:
 
 
 def send_igot(title: str, content: str) -> bool:
-    response = requests.post(
+    response = SESSION.post(
         f"https://push.hellyw.com/{_env_first('IGOT_PUSH_KEY')}",
         data={"title": title, "content": content},
         headers={"Content-Type": "application/x-www-form-urlencoded; charset=utf-8"},
@@ -479,11 +743,11 @@ def send_pushplus(title: str, content: str) -> bool:
     }
     body = json_dumps(payload).encode("utf-8")
     headers = {"Content-Type": "application/json; charset=utf-8"}
-    response = requests.post(url="https://www.pushplus.plus/send", data=body, headers=headers, timeout=15)
+    response = SESSION.post(url="https://www.pushplus.plus/send", data=body, headers=headers, timeout=15)
     result = _response_json(response)
     if result.get("code") == 200:
         return True
-    fallback = requests.post(url="http://pushplus.hxtrip.com/send", data=body, headers=headers, timeout=15)
+    fallback = SESSION.post(url="http://pushplus.hxtrip.com/send", data=body, headers=headers, timeout=15)
     return _response_json(fallback).get("code") == 200
 
 
@@ -497,7 +761,7 @@ def send_weplus_bot(title: str, content: str) -> bool:
         "receiver": _env_first("WE_PLUS_BOT_RECEIVER"),
         "version": _env_first("WE_PLUS_BOT_VERSION") or "pro",
     }
-    response = requests.post(
+    response = SESSION.post(
         url="https://www.weplusbot.com/send",
         data=json_dumps(payload).encode("utf-8"),
         headers={"Content-Type": "application/json; charset=utf-8"},
@@ -516,7 +780,7 @@ def send_email(title: str, content: str) -> bool:
     message["Subject"] = Header(title, "utf-8")
     smtp_ssl = _bool_env("SMTP_SSL", default=False)
     smtp_class = smtplib.SMTP_SSL if smtp_ssl else smtplib.SMTP
-    smtp_server = smtp_class(_env_first("SMTP_SERVER"))
+    smtp_server = smtp_class(_env_first("SMTP_SERVER"), timeout=_request_timeout(15))
     try:
         smtp_server.login(sender, _env_first("SMTP_PASSWORD"))
         smtp_server.sendmail(sender, receiver, message.as_bytes())
@@ -527,7 +791,7 @@ def send_email(title: str, content: str) -> bool:
 
 def send_pushme(title: str, content: str) -> bool:
     url = _env_first("PUSHME_URL") or "https://push.i-i.me/"
-    response = requests.post(
+    response = SESSION.post(
         url,
         data={
             "push_key": _env_first("PUSHME_KEY"),
@@ -553,7 +817,7 @@ def send_feishu(title: str, content: str) -> bool:
         sign = base64.b64encode(hmac.new(string_to_sign.encode("utf-8"), digestmod=hashlib.sha256).digest()).decode("utf-8")
         payload["timestamp"] = timestamp
         payload["sign"] = sign
-    response = requests.post(
+    response = SESSION.post(
         webhook,
         data=json_dumps(payload),
         headers={"Content-Type": "application/json; charset=utf-8"},
@@ -576,7 +840,7 @@ def send_webhook(title: str, content: str) -> bool:
     if content_type and "Content-Type" not in headers and "content-type" not in {key.lower() for key in headers}:
         headers["Content-Type"] = f"{content_type}; charset=utf-8" if "charset" not in content_type.lower() else content_type
     formatted_url = webhook_url.replace("$title", urllib.parse.quote_plus(title)).replace("$content", urllib.parse.quote_plus(content))
-    response = requests.request(
+    response = SESSION.request(
         method=webhook_method,
         url=formatted_url,
         headers=headers,
@@ -586,7 +850,7 @@ def send_webhook(title: str, content: str) -> bool:
     return 200 <= response.status_code < 300
 
 
-def send_chronocat(title: str, content: str) -> bool:
+def send_chronocat(title: str, content: str) -> dict[str, bool]:
     qq_config = _env_first("CHRONOCAT_QQ")
     user_ids = re.findall(r"user_id=(\d+)", qq_config)
     group_ids = re.findall(r"group_id=(\d+)", qq_config)
@@ -595,28 +859,31 @@ def send_chronocat(title: str, content: str) -> bool:
         "Content-Type": "application/json; charset=utf-8",
         "Authorization": f"Bearer {_env_first('CHRONOCAT_TOKEN')}",
     }
-    all_success = True
-    for chat_type, ids in ((1, user_ids), (2, group_ids)):
+
+    def send_one(chat_type: int, chat_id: str) -> bool:
+        response = SESSION.post(
+            url,
+            headers=headers,
+            data=json_dumps(
+                {
+                    "peer": {"chatType": chat_type, "peerUin": chat_id},
+                    "elements": [
+                        {
+                            "elementType": 1,
+                            "textElement": {"content": f"{title}\n\n{content}"},
+                        }
+                    ],
+                }
+            ),
+            timeout=15,
+        )
+        return response.status_code == 200
+
+    targets: dict[str, Callable[[], bool]] = {}
+    for chat_type, prefix, ids in ((1, "user", user_ids), (2, "group", group_ids)):
         for chat_id in ids:
-            response = requests.post(
-                url,
-                headers=headers,
-                data=json_dumps(
-                    {
-                        "peer": {"chatType": chat_type, "peerUin": chat_id},
-                        "elements": [
-                            {
-                                "elementType": 1,
-                                "textElement": {"content": f"{title}\n\n{content}"},
-                            }
-                        ],
-                    }
-                ),
-                timeout=15,
-            )
-            if response.status_code != 200:
-                all_success = False
-    return all_success
+            targets[f"{prefix}:{chat_id}"] = lambda chat_type=chat_type, chat_id=chat_id: send_one(chat_type, chat_id)
+    return _fan_out(targets)
 
 
 def send_ntfy(title: str, content: str) -> bool:
@@ -636,7 +903,7 @@ def send_ntfy(title: str, content: str) -> bool:
         headers["Authorization"] = "Basic " + base64.b64encode(auth_string.encode("utf-8")).decode("utf-8")
     if actions:
         headers["Actions"] = _rfc2047(actions)
-    response = requests.post(
+    response = SESSION.post(
         f"{_env_first('NTFY_URL').rstrip('/')}/{_env_first('NTFY_TOPIC')}",
         data=content.encode("utf-8"),
         headers=headers,
@@ -662,7 +929,7 @@ def send_wxpusher(title: str, content: str) -> bool:
         "uids": uids,
         "verifyPayType": 0,
     }
-    response = requests.post(
+    response = SESSION.post(
         "https://wxpusher.zjiecode.com/api/send/message",
         json=payload,
         headers={"Content-Type": "application/json; charset=utf-8"},
@@ -671,7 +938,8 @@ def send_wxpusher(title: str, content: str) -> bool:
     return _response_json(response).get("code") == 1000
 
 
-SENDERS: dict[str, Callable[[str, str], bool]] = {
+# 多接收方渠道返回 {接收方: 是否成功}，全部成功才算该渠道成功
+SENDERS: dict[str, Callable[[str, str], bool | dict[str, bool]]] = {
     "gotify": send_gotify,
     "goCqHttpBot": send_go_cqhttp,
     "serverChan": send_server_chan,
@@ -696,24 +964,183 @@ SENDERS: dict[str, Callable[[str, str], bool]] = {
 }
 
 
-def send_notify(title: str, content: str) -> bool:
-    channel = normalize_channel(os.environ.get("NOTIFY_CHANNEL"))
-    if channel not in OFFICIAL_CHANNELS:
-        _log(f"不支持的通知渠道: {channel}")
-        return False
-    is_valid, reason = validate_channel_config(channel)
-    if not is_valid:
-        _log(f"通知渠道 {channel} 缺少必要配置，跳过推送：{reason}")
-        return False
-
+def channel_size_limit(channel: str) -> int:
+    limits = dict(CHANNEL_SIZE_LIMITS)
+    for item in _split_values(os.environ.get("NOTIFY_SIZE_LIMITS", "")):
+        name, _, value = item.partition("=")
+        try:
+            limits[normalize_channel(name)] = int(value)
+        except ValueError:
+            continue
+    return max(0, limits.get(channel, 0))
+
+
+def _hard_split(line: str, limit: int) -> list[str]:
+    """把超长的单行按字符边界切成不超过 limit 字节的片段，每段至少一个字符。"""
+    if len(line.encode("utf-8")) <= limit:
+        return [line]
+    pieces: list[str] = []
+    start = 0
+    size = 0
+    for index, char in enumerate(line):
+        char_size = len(char.encode("utf-8"))
+        if size + char_size > limit and index > start:
+            pieces.append(line[start:index])
+            start, size = index, 0
+        size += char_size
+    pieces.append(line[start:])
+    return pieces
+
+
+def split_content(content: str, limit: int) -> list[str]:
+    """按行边界把正文拆成不超过 limit 字节的有序分段；limit 为 0 时不拆分。"""
+    if not limit or len(content.encode("utf-8")) <= limit:
+        return [content]
+    chunks: list[str] = []
+    current: list[str] = []
+    size = 0
+    for line in content.split("\n"):
+        for piece in _hard_split(line, limit):
+            piece_size = len(piece.encode("utf-8"))
+            extra = piece_size + (1 if current else 0)
+            if current and size + extra > limit:
+                chunks.append("\n".join(current))
+                current, size, extra = [], 0, piece_size
+            current.append(piece)
+            size += extra
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def _send_once(channel: str, title: str, content: str) -> tuple[bool, str, dict[str, bool] | None]:
+    """发送一次，返回 (是否成功, 日志, 多接收方渠道的 {接收方: 是否成功})。"""
     try:
-        ok = SENDERS[channel](title, content)
+        result = SENDERS[channel](title, content)
     except Exception as exc:
-        _log(f"通知渠道 {channel} 推送失败：{exc}")
-        return False
+        return False, f"通知渠道 {channel} 推送失败：{exc}", None
+    recipients = result if isinstance(result, dict) else None
+    if recipients:
+        failed = [name for name, ok in recipients.items() if not ok]
+        if failed:
+            return False, f"通知渠道 {channel} 推送失败：{len(recipients) - len(failed)}/{len(recipients)} 个接收方成功，失败 {', '.join(failed)}", recipients
+    if result:
+        return True, f"通知渠道 {channel} 推送成功", recipients
+    return False, f"通知渠道 {channel} 推送失败", recipients
+
+
+def _send_channel(channel: str, title: str, content: str, deadline_at: float | None = None) -> tuple[bool, str]:
+    """
+    超过渠道大小上限的正文拆成多段，按顺序逐段发送，标题附加 (i/n)；不需要拆分的正文按一段处理。
+    每段失败重试一次，仍失败则停止发送后续分段以保证顺序；超过截止时刻后不再发送新的分段或重试。
+    多接收方渠道只向失败的接收方重试，已收到的接收方不会重复收到同一段；
+    重试后仍失败的接收方不再接收后续分段，其余接收方照常收完。
+    """
+    with _deadline_scope(deadline_at):
+        limit = channel_size_limit(channel)
+        if limit:
+            # 标题会和正文拼在同一条消息里，预留标题和分段序号的空间
+            limit = max(1, limit - len(f"{title} (99/99)\n\n".encode("utf-8")))
+        chunks = split_content(content, limit)
+        total = len(chunks)
+        active: set[str] | None = None
+        dropped: list[str] = []
+        for number, chunk in enumerate(chunks, 1):
+            if _deadline_passed():
+                return False, f"通知渠道 {channel} 推送超时（第 {number}/{total} 段起未发送）"
+            chunk_title = f"{title} ({number}/{total})" if total > 1 else title
+            with _only_recipients(active):
+                ok, message, recipients = _send_once(channel, chunk_title, chunk)
+            if not ok and not _deadline_passed():
+                failed = {name for name, sent in (recipients or {}).items() if not sent}
+                with _only_recipients(failed or active):
+                    ok, message, retried = _send_once(channel, chunk_title, chunk)
+                if recipients:
+                    recipients = {**recipients, **(retried or {name: False for name in failed})}
+                    ok = all(recipients.values())
+            if ok:
+                continue
+            delivered = {name for name, sent in (recipients or {}).items() if sent}
+            if not delivered:
+                if total == 1:
+                    return False, message
+                return False, f"{message}（第 {number}/{total} 段，已停止发送后续分段）"
+            # 部分接收方失败：它们停止接收后续分段以保证顺序，其余接收方继续
+            dropped.extend(sorted(set(recipients) - delivered))
+            active = delivered
+        if dropped:
+            if total == 1:
+                return False, message
+            return False, f"通知渠道 {channel} 推送失败：接收方 {', '.join(dropped)} 未收全（共 {total} 段）"
+        if total == 1:
+            return True, f"通知渠道 {channel} 推送成功"
+        return True, f"通知渠道 {channel} 推送成功（共 {total} 段）"
+
+
+def _submit_daemon(name: str, fn: Callable, *args) -> Future:
+    """在守护线程中运行 fn：超过时限仍未结束的渠道不会拖住解释器退出。"""
+    future: Future = Future()
+
+    def target() -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args))
+        except BaseException as exc:
+            future.set_exception(exc)
+
+    threading.Thread(target=target, name=name, daemon=True).start()
+    return future
+
+
+def send_notify_all(title: str, content: str) -> dict[str, bool]:
+    """
+    向 NOTIFY_CHANNEL 中的所有渠道并发推送，返回每个渠道是否成功。
+    配置不完整的渠道在发送前剔除。
+
+    NOTIFY_DEADLINE 秒是整次推送的硬时限：各渠道的 HTTP / SMTP 请求超时收紧到剩余时间，
+    超时后不再发起新的请求或分段，仍未完成的渠道记为失败。渠道运行在守护线程中，
+    函数在时限内返回，进程退出也不会等待它们；时限前已发出的最后一个请求仍可能送达。
+    """
+    results: dict[str, bool] = {}
+    ready: list[str] = []
+    for channel in parse_channels(os.environ.get("NOTIFY_CHANNEL")):
+        if channel not in OFFICIAL_CHANNELS:
+            _log(f"不支持的通知渠道: {channel}")
+            results[channel] = False
+            continue
+        is_valid, reason = validate_channel_config(channel)
+        if not is_valid:
+            _log(f"通知渠道 {channel} 缺少必要配置，跳过推送：{reason}")
+            results[channel] = False
+            continue
+        ready.append(channel)
 
-    if ok:
-        _log(f"通知渠道 {channel} 推送成功")
-    else:
-        _log(f"通知渠道 {channel} 推送失败")
-    return ok
+    if not ready:
+        return results
+
+    deadline = _float_env("NOTIFY_DEADLINE", 30)
+    deadline_at = time.monotonic() + deadline
+    futures = {
+        channel: _submit_daemon(f"notify-{channel}", _send_channel, channel, title, content, deadline_at)
+        for channel in ready
+    }
+    wait(futures.values(), timeout=deadline)
+
+    # 按配置顺序输出日志，保证推送报告稳定
+    for channel in ready:
+        future = futures[channel]
+        if not future.done():
+            _log(f"通知渠道 {channel} 推送超时（{deadline:g} 秒）")
+            results[channel] = False
+            continue
+        ok, message = future.result()
+        _log(message)
+        results[channel] = ok
+    return results
+
+
+def send_notify(title: str, content: str) -> bool:
+    """推送到所有已配置渠道，全部成功时返回 True。"""
+    results = send_notify_all(title, content)
+    return bool(results) and all(results.values())
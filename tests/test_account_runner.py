@@ -0,0 +1,503 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from datetime import timedelta
+from unittest.mock import Mock, patch
+
+sys.modules.setdefault("cloudscraper", Mock(create_scraper=Mock(return_value=Mock())))
+
+import main
+
+
+class AccountRunnerTests(unittest.TestCase):
+    def setUp(self):
+        main.ALL_LOGS.clear()
+
+    def tearDown(self):
+        main.ALL_LOGS.clear()
+
+    def fake_run_account(self, index, cookie):
+        # 让靠前的账号更晚结束，验证合并顺序不受完成顺序影响
+        time.sleep(0.02 * (3 - index))
+        main.log_print(f"[账号 {index + 1}] 开始")
+        main.log_print(f"[账号 {index + 1}] 结束 {cookie}")
+        return cookie == "bad"
+
+    def test_concurrent_logs_are_merged_in_account_order(self):
+        with patch("main.run_account", side_effect=self.fake_run_account), patch("builtins.print"):
+            retry_needed = main.run_accounts(["a", "b", "c"], max_workers=3)
+
+        self.assertFalse(retry_needed)
+        self.assertEqual(main.ALL_LOGS[1:], [
+            "[账号 1] 开始", "[账号 1] 结束 a",
+            "[账号 2] 开始", "[账号 2] 结束 b",
+            "[账号 3] 开始", "[账号 3] 结束 c",
+        ])
+
+    def test_retry_flag_is_merged_from_any_account(self):
+        with patch("main.run_account", side_effect=self.fake_run_account), patch("builtins.print"):
+            retry_needed = main.run_accounts(["a", "bad", "c"], max_workers=2)
+
+        self.assertTrue(retry_needed)
+
+    def test_single_worker_runs_accounts_in_order(self):
+        with patch("main.run_account", side_effect=self.fake_run_account) as run_account, patch("builtins.print"):
+            main.run_accounts(["a", "b"], max_workers=1)
+
+        self.assertEqual([call.args for call in run_account.call_args_list], [(0, "a"), (1, "b")])
+
+    def test_captured_logs_do_not_leak_to_global_report(self):
+        with patch("builtins.print"):
+            with main.capture_logs() as logs:
+                main.log_print("buffered")
+
+        self.assertEqual(logs, ["buffered"])
+        self.assertEqual(list(main.ALL_LOGS), [])
+
+
+class ServiceConcurrencyTests(unittest.TestCase):
+    def setUp(self):
+        main.ALL_LOGS.clear()
+
+    def tearDown(self):
+        main.ALL_LOGS.clear()
+
+    def make_bot(self):
+        bot = object.__new__(main.HidenCloudBot)
+        bot.index = 1
+        bot.base_url = "https://dash.hidencloud.com"
+        bot.csrf_token = ""
+        bot.session = Mock()
+        bot.session_generation = 0
+        bot.services = []
+        bot.processed_invoices = set()
+        bot.non_payable_invoices = set()
+        bot.retry_needed = False
+        bot._state_lock = threading.RLock()
+        bot._session_lock = threading.RLock()
+        bot._invoice_locks = {}
+        return bot
+
+    def test_same_invoice_is_paid_once_across_service_threads(self):
+        bot = self.make_bot()
+        bot.log = Mock()
+
+        def fake_request(method, url, data=None, headers=None):
+            time.sleep(0.05)
+            return Mock(text="", url=url, status_code=200)
+
+        def fake_pay(html_content, current_url, normalized_current_url):
+            bot.processed_invoices.add(normalized_current_url)
+            return "paid"
+
+        bot.request = Mock(side_effect=fake_request)
+        bot._perform_pay_from_html = Mock(side_effect=fake_pay)
+        invoice_url = "https://dash.hidencloud.com/payment/invoice/shared"
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(bot.pay_single_invoice(invoice_url)))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        bot.request.assert_called_once()
+        self.assertEqual(sorted(results), ["already_processed"] * 3 + ["paid"])
+
+    def test_parallel_services_merge_logs_in_service_order(self):
+        bot = self.make_bot()
+        bot.services = [{"id": "1"}, {"id": "2"}, {"id": "3"}]
+
+        def fake_process(service):
+            time.sleep(0.02 * (4 - int(service["id"])))
+            main.log_print(f"service {service['id']}")
+
+        bot.process_service = Mock(side_effect=fake_process)
+        with patch("builtins.print"):
+            bot.process_services(max_workers=3)
+
+        self.assertEqual(main.ALL_LOGS[-3:], ["service 1", "service 2", "service 3"])
+
+
+class SessionRebuildTests(unittest.TestCase):
+    def make_bot(self):
+        bot = ServiceConcurrencyTests.make_bot(self)
+        bot.log = Mock()
+        bot.env_cookie = "env=1"
+        bot.get_cookie_str = Mock(return_value="current=1")
+        bot.create_session = Mock(side_effect=main.requests.Session)
+        bot.load_cookie_str = Mock()
+        return bot
+
+    def test_stale_failure_reuses_session_rebuilt_by_another_worker(self):
+        bot = self.make_bot()
+        bot.init = Mock(return_value=True)
+        failed_generation = bot.session_generation
+
+        barrier = threading.Barrier(2, timeout=5)
+
+        def worker(results):
+            barrier.wait()
+            results.append(bool(bot.rebuild_session_and_reinit(failed_generation=failed_generation)))
+
+        results = []
+        threads = [threading.Thread(target=worker, args=(results,)) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [True, True])
+        bot.init.assert_called_once()
+        bot.create_session.assert_called_once()
+        self.assertEqual(bot.session_generation, failed_generation + 1)
+
+    def test_new_session_is_loaded_before_it_is_published(self):
+        bot = self.make_bot()
+        old_session = bot.session
+        seen = []
+        bot.load_cookie_str = Mock(side_effect=lambda cookie, session=None: seen.append((session, bot.session)))
+
+        bot.rebuild_session("a=1")
+
+        new_session, loaded_while_current = seen[0]
+        self.assertIs(loaded_while_current, old_session)
+        self.assertEqual(bot.session_state(), (new_session, "", 1))
+
+    def test_page_from_replaced_session_does_not_overwrite_token(self):
+        bot = self.make_bot()
+        stale = main.PageResponse('<meta name="csrf-token" content="stale">')
+        stale.session_generation = 0
+        bot.rebuild_session()
+        fresh = main.PageResponse('<meta name="csrf-token" content="fresh">')
+        fresh.session_generation = 1
+
+        bot._refresh_csrf(fresh)
+        bot._refresh_csrf(stale)
+
+        self.assertEqual(bot.csrf_token, "fresh")
+
+    def test_request_uses_one_session_for_sending_and_cookie_normalization(self):
+        bot = self.make_bot()
+        pinned = Mock(name="pinned")
+        pinned.request.return_value = Mock(text="", url="https://dash.hidencloud.com/x", status_code=200,
+                                           content=b"", elapsed=timedelta(seconds=0.1))
+        bot.normalize_critical_cookies = Mock(return_value=False)
+        bot.rebuild_session()
+        bot.session = Mock(name="current")
+
+        with patch("main.REQUEST_GOVERNOR", main.RateGovernor(rate=0, burst=1, max_in_flight=4)), \
+                patch("main.REQUEST_STATS", main.RequestStats()):
+            page = bot.request("POST", "/x", state=(pinned, "token", 0))
+
+        pinned.request.assert_called_once()
+        bot.session.request.assert_not_called()
+        self.assertIs(bot.normalize_critical_cookies.call_args.kwargs["session"], pinned)
+        self.assertEqual(page.session_generation, 0)
+
+    def test_submit_refetches_manage_page_from_replaced_session(self):
+        bot = self.make_bot()
+        stale = main.PageResponse('<form action="/service/1/renew"><input name="_token" value="old"></form>',
+                                  url="https://dash.hidencloud.com/service/1/manage")
+        stale.session_generation = 0
+        bot.rebuild_session()
+        bot.csrf_token = "new"
+        fresh = main.PageResponse('<form action="/service/1/renew"><input name="_token" value="new"></form>',
+                                  url="https://dash.hidencloud.com/service/1/manage")
+        fresh.session_generation = 1
+        bot.fetch_manage_page = Mock(return_value=(fresh, fresh.soup))
+        bot.request = Mock(return_value=main.PageResponse(""))
+
+        bot.submit_renew_request("1", stale)
+
+        bot.fetch_manage_page.assert_called_once_with("1")
+        kwargs = bot.request.call_args.kwargs
+        self.assertEqual(kwargs["data"]["_token"], "new")
+        self.assertEqual(kwargs["headers"]["X-CSRF-TOKEN"], "new")
+        self.assertEqual(kwargs["state"], bot.session_state())
+
+
+class DashboardPaginationTests(unittest.TestCase):
+    BASE = "https://dash.hidencloud.com"
+
+    def setUp(self):
+        main.ALL_LOGS.clear()
+        self.addCleanup(main.ALL_LOGS.clear)
+        print_patch = patch("builtins.print")
+        print_patch.start()
+        self.addCleanup(print_patch.stop)
+
+    def page(self, number, service_ids, links=(), next_page=None):
+        anchors = "".join(f'<a href="/service/{sid}/manage">Manage</a>' for sid in service_ids)
+        nav = "".join(f'<a href="{self.BASE}/dashboard?page={n}">{n}</a>' for n in links)
+        if next_page:
+            nav += f'<a rel="next" href="?page={next_page}">Next</a>'
+        url = f"{self.BASE}/dashboard" + (f"?page={number}" if number > 1 else "")
+        return main.PageResponse(f"<html><body>{anchors}<nav>{nav}</nav></body></html>", url=url)
+
+    def make_bot(self, pages):
+        bot = ServiceConcurrencyTests.make_bot(self)
+        bot.log = lambda message: main.log_print(f"[账号 {bot.index}] {message}")
+        bot.save_cookies = Mock()
+        requested = []
+
+        def fake_request(method, url, data=None, headers=None):
+            requested.append(url)
+            number = int(url.split("page=")[1]) if "page=" in url else 1
+            result = pages[number]
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        bot.request = Mock(side_effect=fake_request)
+        return bot, requested
+
+    def test_service_index_keeps_first_occurrence_order(self):
+        bot = ServiceConcurrencyTests.make_bot(self)
+        first = main.make_soup('<a href="/service/3/manage">a</a><a href="/service/1/manage">b</a>')
+        second = main.make_soup('<a href="/service/1/manage?tab=files">c</a><a href="/service/2/manage">d</a>')
+
+        self.assertEqual([s["id"] for s in bot.discover_services(first, second)], ["3", "1", "2"])
+
+    def test_windowed_pagination_is_filled_in_and_merged_in_page_order(self):
+        # 分页条只显示 1 2 3 … 6，中间页码按最大页码补全
+        pages = {1: self.page(1, ["1", "2"], links=(2, 3, 6))}
+        for number in range(2, 7):
+            pages[number] = self.page(number, [str(number * 10), "2"], links=(1, number + 1) if number < 6 else (1,))
+        bot, requested = self.make_bot(pages)
+
+        self.assertTrue(bot.init())
+
+        self.assertEqual([s["id"] for s in bot.services], ["1", "2", "20", "30", "40", "50", "60"])
+        self.assertEqual(sorted(requested[1:]), sorted(f"{self.BASE}/dashboard?page={n}" for n in range(2, 7)))
+        self.assertIn("[账号 1] ✅ 登录成功，发现 7 个服务（共 6 页）。", list(main.ALL_LOGS))
+
+    def test_next_only_pagination_is_followed_page_by_page(self):
+        pages = {
+            1: self.page(1, ["1"], next_page=2),
+            2: self.page(2, ["2"], next_page=3),
+            3: self.page(3, ["3"]),
+        }
+        bot, requested = self.make_bot(pages)
+
+        self.assertTrue(bot.init())
+
+        self.assertEqual([s["id"] for s in bot.services], ["1", "2", "3"])
+        self.assertEqual(len(requested), 3)
+
+    def test_page_limit_and_failed_pages_are_reported(self):
+        pages = {
+            1: self.page(1, ["1"], links=(2, 3, 9)),
+            2: RuntimeError("timeout"),
+            3: self.page(3, ["3"]),
+        }
+        bot, requested = self.make_bot(pages)
+
+        with patch("main.DASHBOARD_MAX_PAGES", 3):
+            self.assertTrue(bot.init())
+
+        self.assertEqual([s["id"] for s in bot.services], ["1", "3"])
+        self.assertEqual(len(requested), 3)
+        logs = "\n".join(main.ALL_LOGS)
+        self.assertIn("控制台分页读取失败", logs)
+        self.assertIn("只读取前 3 页", logs)
+
+
+class RateGovernorTests(unittest.TestCase):
+    def test_burst_is_free_then_requests_are_spaced_by_rate(self):
+        governor = main.RateGovernor(rate=2, burst=2, max_in_flight=4)
+        with patch("main.time.monotonic", return_value=100.0):
+            waits = [governor.reserve("dash.hidencloud.com")[0] for _ in range(4)]
+
+        self.assertEqual(waits, [0.0, 0.0, 0.5, 1.0])
+
+    def test_tokens_refill_over_time_and_hosts_are_independent(self):
+        governor = main.RateGovernor(rate=1, burst=1, max_in_flight=4)
+        with patch("main.time.monotonic", return_value=0.0):
+            self.assertEqual(governor.reserve("a")[0], 0.0)
+            self.assertEqual(governor.reserve("b")[0], 0.0)
+        with patch("main.time.monotonic", return_value=1.0):
+            self.assertEqual(governor.reserve("a")[0], 0.0)
+
+    def test_slot_sleeps_only_when_budget_is_exhausted(self):
+        governor = main.RateGovernor(rate=1, burst=1, max_in_flight=1)
+        with patch("main.time.monotonic", return_value=0.0), patch("main.time.sleep") as sleep:
+            with governor.slot("a"):
+                pass
+            with governor.slot("a"):
+                pass
+
+        sleep.assert_called_once_with(1.0)
+
+    def test_in_flight_requests_are_capped(self):
+        governor = main.RateGovernor(rate=0, burst=1, max_in_flight=2)
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        def worker():
+            with governor.slot("a"):
+                with lock:
+                    active.append(1)
+                    peak.append(len(active))
+                time.sleep(0.02)
+                with lock:
+                    active.pop()
+
+        threads = [threading.Thread(target=worker) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(max(peak), 2)
+
+
+class RequestStatsTests(unittest.TestCase):
+    def setUp(self):
+        main.REQUEST_STATS.clear()
+        self.addCleanup(main.REQUEST_STATS.clear)
+        governor_patch = patch("main.REQUEST_GOVERNOR", main.RateGovernor(rate=0, burst=1, max_in_flight=4))
+        governor_patch.start()
+        self.addCleanup(governor_patch.stop)
+
+    def make_bot(self, response=None, error=None):
+        bot = ServiceConcurrencyTests.make_bot(self)
+        bot.log = Mock()
+        bot.session = Mock()
+        bot.session.request = Mock(return_value=response, side_effect=error)
+        bot.normalize_critical_cookies = Mock(return_value=True)
+        return bot
+
+    def test_route_template_replaces_ids_and_drops_query(self):
+        self.assertEqual(main.route_template("https://dash.hidencloud.com/service/147008/manage?tab=1"), "/service/{id}/manage")
+        self.assertEqual(main.route_template("/payment/invoice/inv_9f3a"), "/payment/invoice/{id}")
+        self.assertEqual(main.route_template("https://dash.hidencloud.com/dashboard"), "/dashboard")
+
+    def test_histogram_quantiles_use_bucket_upper_bounds(self):
+        histogram = main.LatencyHistogram()
+        for seconds in (0.01, 0.02, 0.3, 0.4, 3.0):
+            histogram.add(seconds)
+
+        self.assertEqual(histogram.quantile(0.4), 0.05)
+        self.assertEqual(histogram.quantile(0.8), 0.5)
+        self.assertEqual(histogram.quantile(1.0), 3.0)
+
+    def test_request_records_status_bytes_timings_and_cookie_change(self):
+        response = Mock(status_code=200, content=b"x" * 2048, elapsed=timedelta(seconds=0.2), text="", url="")
+        bot = self.make_bot(response)
+
+        bot.request("GET", "/service/42/manage")
+        bot.request("GET", "/service/43/manage")
+
+        entry = main.REQUEST_STATS.routes()[("GET", "/service/{id}/manage")]
+        self.assertEqual(entry["count"], 2)
+        self.assertEqual(entry["statuses"], {200: 2})
+        self.assertEqual(entry["bytes"], 4096)
+        self.assertEqual(entry["cookie_changes"], 2)
+        self.assertEqual(entry["ttfb"].quantile(0.5), 0.2)
+
+    def test_failed_request_is_recorded(self):
+        bot = self.make_bot(error=RuntimeError("boom"))
+
+        with self.assertRaises(RuntimeError):
+            bot.request("POST", "/service/42/renew")
+
+        entry = main.REQUEST_STATS.routes()[("POST", "/service/{id}/renew")]
+        self.assertEqual(entry["statuses"], {"EXC": 1})
+        self.assertEqual(entry["ttfb"].count, 0)
+
+    def test_summary_table_lists_each_route(self):
+        main.REQUEST_STATS.record("GET", "/dashboard", 200, 1024, queued=0, ttfb=0.1, total=0.3, cookies_changed=False)
+        main.REQUEST_STATS.record("POST", "/service/1/renew", 302, 0, queued=0.5, ttfb=0.2, total=1.2, cookies_changed=True)
+
+        lines = main.REQUEST_STATS.summary_lines()
+
+        self.assertIn("请求统计", lines[0])
+        self.assertTrue(lines[2].startswith("POST /service/{id}/renew"))
+        self.assertTrue(lines[3].startswith("GET /dashboard"))
+        self.assertEqual(main.RequestStats().summary_lines(), [])
+
+
+class ProfilingTests(unittest.TestCase):
+    def setUp(self):
+        main.ALL_LOGS.clear()
+        self.addCleanup(main.ALL_LOGS.clear)
+        main.PHASE_TIMER.clear()
+        self.addCleanup(main.PHASE_TIMER.clear)
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def fake_bot_class(self, calls):
+        class FakeBot:
+            retry_needed = False
+
+            def __init__(self, cookie, index):
+                pass
+
+            def init(self):
+                main.make_soup("<p>hi</p>")
+                return True
+
+            def sweep_unpaid_invoices(self):
+                return False
+
+            def process_services(self, **kwargs):
+                calls.append(kwargs)
+
+        return FakeBot
+
+    def test_account_profile_and_allocations_are_written(self):
+        calls = []
+        profiler = main.Profiler(enabled=True, output_dir=self.tmpdir.name, trace_memory=True, top=5)
+        with patch("main.PROFILER", profiler), patch("main.HidenCloudBot", self.fake_bot_class(calls)), \
+                patch("main.CacheManager.flush"), patch("builtins.print"):
+            retry_needed = main.run_account(0, "cookie")
+
+        self.assertFalse(retry_needed)
+        self.assertEqual(calls, [{"max_workers": 1}])
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir.name, "account-1.prof")))
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir.name, "account-1-alloc.txt")))
+        self.assertTrue(any("剖析完成" in line and "解析" in line for line in main.ALL_LOGS))
+
+    def test_disabled_profiler_leaves_services_concurrency_alone(self):
+        calls = []
+        with patch("main.PROFILER", main.Profiler(enabled=False, output_dir=self.tmpdir.name)), \
+                patch("main.HidenCloudBot", self.fake_bot_class(calls)), \
+                patch("main.CacheManager.flush"), patch("builtins.print"):
+            main.run_account(0, "cookie")
+
+        self.assertEqual(calls, [{}])
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
+
+    def test_cli_flags_override_environment(self):
+        with patch.dict(os.environ, {"HIDEN_PROFILE": "0", "HIDEN_PROFILE_DIR": "env-dir"}), \
+                patch("main.PROFILER", main.Profiler()):
+            settings = main.configure_profiler(main.parse_cli_args(["--tracemalloc", "--profile-dir", "cli-dir"]))
+            self.assertIs(main.PROFILER, settings)
+
+        self.assertTrue(settings.enabled)
+        self.assertTrue(settings.trace_memory)
+        self.assertEqual(settings.output_dir, "cli-dir")
+
+    def test_phase_timer_splits_sleep_and_parse(self):
+        with patch("main.time.sleep") as sleep:
+            main.sleep_for(1.5)
+        main.make_soup("<div>x</div>")
+
+        totals = main.PHASE_TIMER.snapshot()
+        sleep.assert_called_once_with(1.5)
+        self.assertGreater(totals["sleep"], 0)
+        self.assertGreater(totals["parse"], 0)
+        self.assertEqual(totals["network"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
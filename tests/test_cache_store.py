@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+sys.modules.setdefault("cloudscraper", Mock(create_scraper=Mock(return_value=Mock())))
+
+import main
+
+
+class CacheManagerTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.cache_path = os.path.join(self.tmpdir.name, main.CACHE_FILE_NAME)
+        path_patch = patch("main.LOCAL_CACHE_PATH", self.cache_path)
+        path_patch.start()
+        self.addCleanup(path_patch.stop)
+        print_patch = patch("builtins.print")
+        print_patch.start()
+        self.addCleanup(print_patch.stop)
+        main.CacheManager.reload()
+        self.addCleanup(main.CacheManager.reload)
+
+    def write_cache(self, data):
+        with open(self.cache_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+    def read_cache(self):
+        with open(self.cache_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def test_file_is_read_once_per_process(self):
+        self.write_cache({"0": "a=1", "1": "b=2"})
+
+        with patch("builtins.open", wraps=open) as opened:
+            self.assertEqual(main.CacheManager.get(0), "a=1")
+            self.assertEqual(main.CacheManager.get(1), "b=2")
+            main.CacheManager.update(0, "a=3", upload=False)
+            self.assertEqual(main.CacheManager.get(0), "a=3")
+
+        self.assertEqual(opened.call_count, 1)
+
+    def test_updates_are_batched_until_flush(self):
+        self.write_cache({"0": "a=1"})
+
+        main.CacheManager.update(0, "a=2", upload=False)
+        main.CacheManager.update(1, "b=1", upload=False)
+        self.assertEqual(self.read_cache(), {"0": "a=1"})
+
+        with patch("main.os.replace", wraps=os.replace) as replace:
+            main.CacheManager.flush()
+            main.CacheManager.flush()
+
+        replace.assert_called_once()
+        self.assertEqual(self.read_cache(), {"0": "a=2", "1": "b=1"})
+        self.assertEqual(os.listdir(self.tmpdir.name), [main.CACHE_FILE_NAME])
+
+    def test_failed_write_keeps_previous_file_intact(self):
+        self.write_cache({"0": "a=1"})
+        main.CacheManager.update(0, "a=2", upload=False)
+
+        with patch("main.os.replace", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                main.CacheManager.flush()
+
+        self.assertEqual(self.read_cache(), {"0": "a=1"})
+        self.assertEqual(os.listdir(self.tmpdir.name), [main.CACHE_FILE_NAME])
+
+    def test_unchanged_cookie_is_not_uploaded(self):
+        self.write_cache({"0": "a=1"})
+
+        with patch("main.CACHE_REPLICATOR") as replicator:
+            main.CacheManager.update(0, "a=1", upload=True)
+            main.CacheManager.update(0, "a=2", upload=True)
+
+        replicator.submit.assert_called_once_with({"0": "a=2"})
+
+
+class CacheReplicatorTests(unittest.TestCase):
+    def test_updates_during_upload_are_coalesced_to_latest_snapshot(self):
+        started = threading.Event()
+        release = threading.Event()
+        uploaded = []
+
+        def slow_upload(snapshot):
+            uploaded.append(snapshot)
+            started.set()
+            release.wait(5)
+            return True
+
+        replicator = main.CacheReplicator(uploader=slow_upload)
+        replicator.submit({"0": "v1"})
+        self.assertTrue(started.wait(5))
+        for version in range(2, 6):
+            replicator.submit({"0": f"v{version}"})
+        release.set()
+
+        self.assertTrue(replicator.flush(timeout=5))
+        self.assertEqual(uploaded, [{"0": "v1"}, {"0": "v5"}])
+        self.assertEqual(replicator.summary(), (5, 2, 0))
+
+    def test_submit_does_not_wait_for_upload(self):
+        release = threading.Event()
+        replicator = main.CacheReplicator(uploader=lambda snapshot: release.wait(5))
+
+        started_at = time.monotonic()
+        replicator.submit({"0": "v1"})
+        self.assertLess(time.monotonic() - started_at, 0.5)
+        self.assertFalse(replicator.flush(timeout=0.05))
+
+        release.set()
+        self.assertTrue(replicator.flush(timeout=5))
+
+    def test_failed_upload_is_counted(self):
+        with patch("builtins.print"):
+            replicator = main.CacheReplicator(uploader=Mock(side_effect=RuntimeError("boom")))
+            replicator.submit({"0": "v1"})
+            self.assertTrue(replicator.flush(timeout=5))
+
+        self.assertEqual(replicator.summary(), (1, 1, 1))
+
+    def test_snapshots_are_ignored_without_webdav(self):
+        with patch.dict(os.environ, {}, clear=True), \
+                patch.object(main.WebDavManager, "upload", side_effect=AssertionError("should not upload")):
+            replicator = main.CacheReplicator()
+            replicator.submit({"0": "v1"})
+            replicator.submit({"0": "v2"})
+            self.assertTrue(replicator.flush(timeout=1))
+
+        self.assertEqual(replicator.summary(), (0, 0, 0))
+        self.assertIsNone(replicator._thread)
+
+
+
+class RenewalScheduleTests(unittest.TestCase):
+    NOW = 1_700_000_000
+    DAY = main.DAY_SECONDS
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.schedule_path = os.path.join(self.tmpdir.name, main.SCHEDULE_FILE_NAME)
+        for target in (
+            patch("main.LOCAL_SCHEDULE_PATH", self.schedule_path),
+            patch("main.SCHEDULE_FULL_CHECK_DAYS", 7),
+            patch("builtins.print"),
+        ):
+            target.start()
+            self.addCleanup(target.stop)
+        main.RenewalSchedule.reload()
+        self.addCleanup(main.RenewalSchedule.reload)
+
+    def skip_until(self, service_id, days_later):
+        return main.RenewalSchedule.skip_until(service_id, now=self.NOW + days_later * self.DAY)
+
+    def test_not_due_service_is_skipped_until_one_day_before_eligible(self):
+        main.RenewalSchedule.record("1", days_until=5, threshold=1, now=self.NOW)
+
+        self.assertEqual(self.skip_until("1", 2.9), self.NOW + 3 * self.DAY)
+        self.assertIsNone(self.skip_until("1", 3))
+        self.assertIsNone(self.skip_until("2", 0))
+
+    def test_full_check_is_forced_periodically(self):
+        main.RenewalSchedule.record("1", days_until=30, threshold=1, now=self.NOW)
+
+        self.assertIsNotNone(self.skip_until("1", 6))
+        self.assertIsNone(self.skip_until("1", 7))
+        with patch("main.SCHEDULE_FULL_CHECK_DAYS", 0):
+            self.assertIsNone(self.skip_until("1", 0))
+
+    def test_due_service_is_checked_every_run(self):
+        main.RenewalSchedule.record("1", days_until=5, threshold=1, now=self.NOW)
+        main.RenewalSchedule.record("1", now=self.NOW + self.DAY)
+
+        self.assertIsNone(self.skip_until("1", 1))
+
+    def test_flush_persists_entries_with_next_check_time(self):
+        main.RenewalSchedule.record("1", days_until=5, threshold=1, account=1, now=self.NOW)
+        main.RenewalSchedule.record("2", days_until=10, threshold=1, account=2, now=self.NOW)
+        with patch("main.time.time", return_value=self.NOW):
+            self.assertTrue(main.RenewalSchedule.flush())
+        self.assertFalse(main.RenewalSchedule.flush())
+
+        with open(self.schedule_path, "r", encoding="utf-8") as f:
+            document = json.load(f)
+        self.assertEqual(document["next_check_at"], self.NOW + 3 * self.DAY)
+        self.assertEqual(document["services"]["1"]["eligible_at"], self.NOW + 4 * self.DAY)
+
+        main.RenewalSchedule.reload()
+        self.assertIsNotNone(self.skip_until("2", 1))
+
+    def test_merge_keeps_most_recent_check_per_service(self):
+        main.RenewalSchedule.record("1", days_until=5, threshold=1, now=self.NOW)
+        main.RenewalSchedule.record("2", days_until=5, threshold=1, now=self.NOW)
+
+        newer_locally = main.RenewalSchedule.merge({
+            "1": {"checked_at": self.NOW + self.DAY},
+            "2": {"checked_at": self.NOW - self.DAY, "days_until": 9, "threshold": 1},
+            "3": {"checked_at": self.NOW, "days_until": 9, "threshold": 1},
+        })
+
+        entries = main.RenewalSchedule.snapshot()
+        self.assertTrue(newer_locally)
+        self.assertNotIn("days_until", entries["1"])
+        self.assertEqual(entries["2"]["days_until"], 5)
+        self.assertEqual(entries["3"]["days_until"], 9)
+
+    def make_bot(self):
+        bot = object.__new__(main.HidenCloudBot)
+        bot.index = 1
+        bot.retry_needed = False
+        bot.invoice_index = None
+        bot._state_lock = threading.RLock()
+        bot.log = Mock()
+        bot.save_cookies = Mock()
+        bot.check_and_pay_invoices = Mock(return_value=False)
+        manage = main.PageResponse('<button onclick="showRenewAlert(6, 1, true)">Renew</button>')
+        bot.fetch_manage_page = Mock(return_value=(manage, manage.soup))
+        return bot
+
+    def test_process_service_records_and_then_skips_not_due_service(self):
+        bot = self.make_bot()
+
+        bot.process_service({"id": "42"})
+        bot.fetch_manage_page.assert_called_once_with("42")
+        self.assertEqual(main.RenewalSchedule.snapshot()["42"]["days_until"], 6)
+
+        bot.check_and_pay_invoices.reset_mock()
+        bot.fetch_manage_page.reset_mock()
+        bot.process_service({"id": "42"})
+
+        bot.check_and_pay_invoices.assert_not_called()
+        bot.fetch_manage_page.assert_not_called()
+        self.assertIn("服务 42", "\n".join(main.RenewalSchedule.report_lines()))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+sys.modules.setdefault("cloudscraper", Mock(create_scraper=Mock(return_value=Mock())))
+
+import main
+import notify
+
+
+class LogSinkTests(unittest.TestCase):
+    def test_ring_buffer_keeps_latest_lines_and_reports_dropped(self):
+        ring = main.RingBufferSink(3)
+        for i in range(5):
+            ring.write(f"line {i}")
+
+        self.assertEqual(list(ring), ["line 2", "line 3", "line 4"])
+        self.assertEqual(ring.dropped, 2)
+        self.assertIn("已省略前 2 行", ring.digest()[0])
+        self.assertEqual(ring.digest()[1:], ["line 2", "line 3", "line 4"])
+
+    def test_rotating_file_sink_streams_and_rotates(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "run.log")
+            sink = main.RotatingFileSink(path, max_bytes=200, backup_count=1)
+            try:
+                sink.write("第一行")
+                with open(path, "r", encoding="utf-8") as f:
+                    self.assertIn("第一行", f.read())
+                for i in range(20):
+                    sink.write(f"line {i:02d} " + "x" * 20)
+            finally:
+                sink.close()
+
+            self.assertTrue(os.path.exists(path + ".1"))
+            self.assertFalse(os.path.exists(path + ".2"))
+
+    def test_hub_fans_out_and_isolates_failing_sinks(self):
+        received = []
+        broken = Mock(write=Mock(side_effect=RuntimeError("disk full")))
+        hub = main.LogHub([broken, Mock(write=received.append)])
+
+        hub.emit("hello")
+
+        self.assertEqual(received, ["hello"])
+
+    def test_extra_sink_receives_bot_logs(self):
+        received = []
+        sink = main.add_log_sink(Mock(write=received.append))
+        self.addCleanup(main.LOG_HUB.remove, sink)
+        bot = object.__new__(main.HidenCloudBot)
+        bot.index = 2
+
+        with patch("builtins.print"):
+            bot.log("续期成功")
+
+        self.assertEqual(received, ["[账号 2] 续期成功"])
+
+    def test_file_sink_streams_lines_captured_for_ordered_output(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "run.log")
+            file_sink = main.RotatingFileSink(path)
+            ring = main.RingBufferSink(10)
+            hub = main.LogHub([ring, file_sink])
+            try:
+                with patch("main.LOG_HUB", hub):
+                    with main.capture_logs() as logs:
+                        main.log_print("[账号 1] 续期中")
+                        with open(path, "r", encoding="utf-8") as f:
+                            self.assertIn("[账号 1] 续期中", f.read())
+                        self.assertEqual(list(ring), [])
+                    main.replay_logs(logs)
+            finally:
+                file_sink.close()
+
+            self.assertEqual(list(ring), ["[账号 1] 续期中"])
+            with open(path, "r", encoding="utf-8") as f:
+                self.assertEqual(f.read().count("续期中"), 1)
+
+    def test_nested_capture_streams_once_and_replays_into_outer_buffer(self):
+        received = []
+        hub = main.LogHub([Mock(write=received.append)])
+
+        with patch("main.LOG_HUB", hub):
+            with main.capture_logs() as outer:
+                with main.capture_logs() as inner:
+                    main.log_print("service line")
+                    self.assertEqual(received, ["service line"])
+                main.replay_logs(inner)
+            main.replay_logs(outer)
+
+        self.assertEqual(outer, ["service line"])
+        self.assertEqual(received, ["service line"])
+
+    def test_notify_logs_are_routed_through_hub(self):
+        received = []
+        sink = main.add_log_sink(Mock(write=received.append))
+        self.addCleanup(main.LOG_HUB.remove, sink)
+        self.addCleanup(notify.set_logger, None)
+
+        with patch("main.LOG_FILE", ""), patch("builtins.print"):
+            main.configure_log_sinks()
+            with patch.dict(os.environ, {"NOTIFY_CHANNEL": "unknown"}, clear=True):
+                notify.send_notify("标题", "内容")
+
+        self.assertEqual(received, ["不支持的通知渠道: unknown"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,13 @@
 # -*- coding: utf-8 -*-
+import os
+import random
 import sys
+import threading
 import unittest
 from unittest.mock import Mock, patch
 
 from bs4 import BeautifulSoup
+from bs4.builder import builder_registry
 
 sys.modules.setdefault("cloudscraper", Mock(create_scraper=Mock(return_value=Mock())))
 
@@ -18,17 +22,28 @@ class FakeResponse:
 
 
 class RenewInvoiceHandlingTests(unittest.TestCase):
+    html_parser = "html.parser"
+
     def setUp(self):
         main.BeautifulSoup = BeautifulSoup
+        parser_patch = patch("main.HTML_PARSER", self.html_parser)
+        parser_patch.start()
+        self.addCleanup(parser_patch.stop)
+        self.assertEqual(main.resolve_html_parser(), self.html_parser)
 
     def make_bot(self):
         bot = object.__new__(main.HidenCloudBot)
         bot.index = 1
         bot.base_url = "https://dash.hidencloud.com"
         bot.csrf_token = ""
+        bot.session = Mock()
+        bot.session_generation = 0
         bot.processed_invoices = set()
         bot.non_payable_invoices = set()
         bot.retry_needed = False
+        bot._state_lock = threading.RLock()
+        bot._session_lock = threading.RLock()
+        bot._invoice_locks = {}
         bot.messages = []
         bot.log = lambda message: bot.messages.append(message)
         return bot
@@ -48,9 +63,7 @@ class RenewInvoiceHandlingTests(unittest.TestCase):
         bot.pay_single_invoice.assert_called_once_with(
             "https://dash.hidencloud.com/payment/invoice/old-invoice"
         )
-        bot.check_and_pay_invoices.assert_called_once_with(
-            "147008", is_precheck=False, retries=6, retry_delay=8
-        )
+        bot.check_and_pay_invoices.assert_called_once_with("147008", is_precheck=False)
 
     def test_first_pass_does_not_treat_non_payable_response_invoice_as_reject(self):
         bot = self.make_bot()
@@ -104,6 +117,20 @@ class RenewInvoiceHandlingTests(unittest.TestCase):
 
         self.assertEqual(bot.extract_server_error_message(soup), "")
 
+    def test_discover_services_dedupes_in_page_order(self):
+        bot = self.make_bot()
+        soup = main.make_soup(
+            '<a href="/service/2/manage">Manage</a><a href="/service/1/manage">Manage</a>'
+            '<a href="/service/2/manage?tab=files">Files</a><a href="/service/3/renew">Renew</a>'
+        )
+
+        services = bot.discover_services(soup)
+
+        self.assertEqual(services, [
+            {"id": "2", "url": "/service/2/manage"},
+            {"id": "1", "url": "/service/1/manage"},
+        ])
+
     def test_perform_pay_from_html_returns_non_payable_and_records_invoice(self):
         bot = self.make_bot()
         invoice_url = "https://dash.hidencloud.com/payment/invoice/old-invoice"
@@ -126,7 +153,7 @@ class RenewInvoiceHandlingTests(unittest.TestCase):
         ))
         bot.pay_single_invoice = Mock(return_value="non_payable")
 
-        with patch("main.sleep_random"), patch("main.time.sleep"):
+        with patch("main.time.sleep"):
             paid = bot.check_and_pay_invoices("147008", is_precheck=True)
 
         self.assertFalse(paid)
@@ -138,7 +165,7 @@ class RenewInvoiceHandlingTests(unittest.TestCase):
         ))
         bot.pay_single_invoice = Mock(return_value="paid")
 
-        with patch("main.sleep_random"), patch("main.time.sleep"):
+        with patch("main.time.sleep"):
             paid = bot.check_and_pay_invoices("147008", is_precheck=True)
 
         self.assertTrue(paid)
@@ -158,5 +185,309 @@ class RenewInvoiceHandlingTests(unittest.TestCase):
         bot.request.assert_not_called()
 
 
+class InvoicePollingTests(unittest.TestCase):
+    def setUp(self):
+        main.BeautifulSoup = BeautifulSoup
+
+    def test_policy_backs_off_to_cap_and_respects_deadline(self):
+        policy = main.InvoicePollPolicy(interval=1, backoff=2, max_interval=8, deadline=20)
+
+        self.assertEqual([policy.next_wait(attempt, 0) for attempt in range(1, 7)], [1, 2, 4, 8, 8, 8])
+        self.assertEqual(policy.next_wait(3, 18.5), 1.5)
+        self.assertIsNone(policy.next_wait(3, 20))
+        self.assertIsNone(main.InvoicePollPolicy.single().next_wait(1, 0))
+
+    def test_poll_stops_as_soon_as_invoice_appears(self):
+        bot = RenewInvoiceHandlingTests.make_bot(self)
+        empty = FakeResponse("<table><tr><td>No invoices</td></tr></table>")
+        unpaid = FakeResponse('<table><tr><td>Unpaid</td><td><a href="/payment/invoice/new">View</a></td></tr></table>')
+        bot.request = Mock(side_effect=[empty, empty, unpaid])
+        bot.pay_single_invoice = Mock(return_value="paid")
+        policy = main.InvoicePollPolicy(first_delay=0.5, interval=1, backoff=2, max_interval=8, deadline=40)
+
+        with patch("main.time.sleep") as sleep:
+            paid = bot.check_and_pay_invoices("147008", poll_policy=policy)
+
+        self.assertTrue(paid)
+        self.assertEqual(bot.request.call_count, 3)
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [0.5, 1, 2])
+
+    def test_poll_exits_early_on_server_error_message(self):
+        bot = RenewInvoiceHandlingTests.make_bot(self)
+        bot.request = Mock(return_value=FakeResponse(
+            '<div role="alert" class="text-red-800">Error: renewal failed, please contact support.</div>'
+        ))
+
+        with patch("main.time.sleep") as sleep:
+            paid = bot.check_and_pay_invoices("147008", poll_policy=main.InvoicePollPolicy(first_delay=0))
+
+        self.assertFalse(paid)
+        bot.request.assert_called_once()
+        sleep.assert_not_called()
+        self.assertIn("renewal failed", bot.messages[-1])
+
+
+class InvoiceSweepTests(unittest.TestCase):
+    BASE = "https://dash.hidencloud.com"
+
+    def setUp(self):
+        main.ALL_LOGS.clear()
+        self.addCleanup(main.ALL_LOGS.clear)
+        for patcher in (patch("builtins.print"), patch("main.INVOICE_SWEEP_PATH", "/invoices?where=unpaid")):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def invoice_list(self, rows, next_page=None, url="/invoices?where=unpaid"):
+        cells = []
+        for invoice, service in rows:
+            owner = f'<a href="/service/{service}/manage">Server</a>' if service else "Credit"
+            cells.append(
+                f'<tr><td>#{invoice}</td><td>{owner}</td><td>Unpaid</td>'
+                f'<td><a href="/payment/invoice/{invoice}">Pay now</a></td></tr>'
+            )
+        body = "".join(cells)
+        nav = f'<a rel="next" href="/invoices?where=unpaid&page={next_page}">Next</a>' if next_page else ""
+        return main.PageResponse(
+            f"<table><tr><th>Invoice</th><th>Service</th></tr>{body}</table><nav>{nav}</nav>", url=self.BASE + url)
+
+    def make_bot(self, responses):
+        bot = RenewInvoiceHandlingTests.make_bot(self)
+        bot.services = [{"id": "1"}, {"id": "2"}, {"id": "3"}]
+        bot.invoice_index = None
+        bot.request = Mock(side_effect=lambda method, url, data=None, headers=None: responses[url])
+        bot.pay_single_invoice = Mock(return_value="paid")
+        bot.check_and_pay_invoices = Mock(return_value=False)
+        return bot
+
+    def test_sweep_indexes_invoices_by_service_and_skips_unmapped_ones(self):
+        bot = self.make_bot({
+            "/invoices?where=unpaid": self.invoice_list([("a1", "1"), ("c1", None)], next_page=2),
+            f"{self.BASE}/invoices?where=unpaid&page=2": self.invoice_list(
+                [("a2", "1"), ("b1", "2"), ("z1", "99")], url="/invoices?where=unpaid&page=2"),
+        })
+
+        self.assertTrue(bot.sweep_unpaid_invoices())
+
+        self.assertEqual(bot.invoice_index, {
+            "1": [f"{self.BASE}/payment/invoice/a1", f"{self.BASE}/payment/invoice/a2"],
+            "2": [f"{self.BASE}/payment/invoice/b1"],
+        })
+        # 充值账单（无服务链接）与不在本账号控制台上的服务 99 的账单都不支付
+        bot.pay_single_invoice.assert_not_called()
+
+        bot.request.reset_mock()
+        self.assertTrue(bot.precheck_invoices("1"))
+        self.assertFalse(bot.precheck_invoices("3"))
+        bot.request.assert_not_called()
+        bot.check_and_pay_invoices.assert_not_called()
+        self.assertEqual(bot.pay_single_invoice.call_count, 2)
+
+    def test_unavailable_invoice_list_falls_back_to_per_service_precheck(self):
+        bot = self.make_bot({
+            "/invoices?where=unpaid": main.PageResponse("Not Found", url=self.BASE + "/invoices", status_code=404),
+        })
+
+        self.assertFalse(bot.sweep_unpaid_invoices())
+        bot.precheck_invoices("1")
+
+        self.assertIsNone(bot.invoice_index)
+        bot.check_and_pay_invoices.assert_called_once_with("1", is_precheck=True)
+
+    def test_rows_without_service_links_fall_back_to_per_service_precheck(self):
+        bot = self.make_bot({
+            "/invoices?where=unpaid": self.invoice_list([("c1", None), ("c2", None)]),
+        })
+
+        self.assertFalse(bot.sweep_unpaid_invoices())
+        bot.precheck_invoices("1")
+
+        self.assertIsNone(bot.invoice_index)
+        bot.pay_single_invoice.assert_not_called()
+        bot.check_and_pay_invoices.assert_called_once_with("1", is_precheck=True)
+
+    def test_redirected_or_unrecognized_page_is_not_trusted_as_empty_list(self):
+        for page in (
+            main.PageResponse("<title>Dashboard</title><table><tr><th>Invoice</th></tr></table>",
+                              url=self.BASE + "/dashboard"),
+            main.PageResponse("<title>Something else</title><p>Nothing here</p>",
+                              url=self.BASE + "/invoices?where=unpaid"),
+        ):
+            with self.subTest(url=page.url):
+                bot = self.make_bot({"/invoices?where=unpaid": page})
+
+                self.assertFalse(bot.sweep_unpaid_invoices())
+                bot.precheck_invoices("1")
+
+                self.assertIsNone(bot.invoice_index)
+                bot.check_and_pay_invoices.assert_called_once_with("1", is_precheck=True)
+
+    def test_sweep_can_be_disabled(self):
+        bot = self.make_bot({})
+
+        with patch("main.INVOICE_SWEEP_PATH", ""):
+            self.assertFalse(bot.sweep_unpaid_invoices())
+
+        bot.request.assert_not_called()
+
+
+class PageResponseTests(unittest.TestCase):
+    def setUp(self):
+        main.BeautifulSoup = BeautifulSoup
+
+    def test_soup_text_and_csrf_are_computed_once(self):
+        page = main.PageResponse.of(FakeResponse(
+            '<html><head><meta name="csrf-token" content="meta-token"></head>'
+            '<body><p>Invoice   status:</p><p>Unpaid</p></body></html>'
+        ))
+
+        with patch("main.make_soup", wraps=main.make_soup) as make_soup:
+            self.assertIs(page.soup, page.soup)
+            self.assertEqual(page.page_text, "Invoice   status: Unpaid")
+            self.assertEqual(page.csrf_token, "meta-token")
+            self.assertEqual(page.csrf_token, "meta-token")
+
+        make_soup.assert_called_once()
+
+    def test_csrf_falls_back_to_form_token_and_keeps_old_value_when_missing(self):
+        bot = RenewInvoiceHandlingTests.make_bot(self)
+        bot.csrf_token = "old"
+
+        bot._refresh_csrf(main.PageResponse.of("<html><body>nothing</body></html>"))
+        self.assertEqual(bot.csrf_token, "old")
+
+        bot._refresh_csrf(main.PageResponse.of('<form><input name="_token" value="form-token"></form>'))
+        self.assertEqual(bot.csrf_token, "form-token")
+
+    def test_invoice_redirect_is_paid_without_reparsing(self):
+        bot = RenewInvoiceHandlingTests.make_bot(self)
+        bot.request = Mock(return_value=FakeResponse(status_code=200))
+        response = FakeResponse(
+            '<form action="/payment/invoice/abc/pay"><input name="_token" value="t">'
+            '<button>Pay now</button></form>',
+            url="https://dash.hidencloud.com/payment/invoice/abc",
+        )
+
+        with patch("main.make_soup", wraps=main.make_soup) as make_soup:
+            handled, outcome = bot.try_handle_invoice_from_response("147008", response)
+
+        self.assertEqual((handled, outcome), (True, "invoice_page"))
+        make_soup.assert_called_once()
+        self.assertIn("https://dash.hidencloud.com/payment/invoice/abc", bot.processed_invoices)
+
+
+class ContextualInvoiceLinkTests(unittest.TestCase):
+    fragments = [
+        "Unpaid", "Paid", "pay", "now", "pay now", "Pending", "completed", "未支付", "已支付", "支付",
+        "unpaidx", "待付款", "Cancelled", "total", "  ", "\n", "Invoice #1",
+    ]
+
+    def setUp(self):
+        main.BeautifulSoup = BeautifulSoup
+
+    def random_markup(self, rng, depth=0):
+        parts = []
+        for _ in range(rng.randint(1, 4)):
+            roll = rng.random()
+            if roll < 0.3:
+                parts.append(rng.choice(self.fragments))
+            elif roll < 0.45:
+                invoice = rng.randint(1, 6)
+                suffix = "/download" if rng.random() < 0.2 else ""
+                parts.append(f'<a href="/payment/invoice/{invoice}{suffix}">{rng.choice(self.fragments)}</a>')
+            elif roll < 0.5:
+                parts.append(f"<!-- {rng.choice(self.fragments)} --><script>var s = 'unpaid';</script>")
+            elif depth < 5:
+                tag = rng.choice(["div", "li", "section", "article", "span", "p", "tr"])
+                parts.append(f"<{tag}>{self.random_markup(rng, depth + 1)}</{tag}>")
+        return "".join(parts)
+
+    def test_single_pass_matches_per_container_scan(self):
+        from benchmarks.reference import extract_contextual_invoice_links
+
+        bot = RenewInvoiceHandlingTests.make_bot(self)
+        rng = random.Random(20240601)
+        parsers = [name for name in ("html.parser", "lxml") if parser_available(name)]
+        for _ in range(300):
+            html = f"<html><body>{self.random_markup(rng)}</body></html>"
+            for parser in parsers:
+                soup = BeautifulSoup(html, parser)
+                self.assertEqual(
+                    bot.extract_invoice_links(soup, require_payment_context=True),
+                    extract_contextual_invoice_links(bot, soup),
+                    msg=f"{parser}: {html}",
+                )
+
+    def test_keyword_split_across_elements_still_matches(self):
+        bot = RenewInvoiceHandlingTests.make_bot(self)
+        soup = BeautifulSoup(
+            '<div><span>Pay</span><span>now</span><a href="/payment/invoice/a">open</a></div>'
+            '<div><span>Pay</span><b>ment</b> <a href="/payment/invoice/b">open</a></div>',
+            "html.parser",
+        )
+
+        self.assertEqual(
+            bot.extract_invoice_links(soup, require_payment_context=True),
+            ["https://dash.hidencloud.com/payment/invoice/a"],
+        )
+
+
+class KeywordMatcherTests(unittest.TestCase):
+    def test_matches_per_keyword_regex_on_random_text(self):
+        from benchmarks import reference
+
+        matcher = main.payment_context_matcher()
+        rng = random.Random(7)
+        words = reference.LEGACY_POSITIVE_KEYWORDS + reference.LEGACY_NEGATIVE_KEYWORDS + [
+            "un", "x", "1", "pay", "now", "已", "款", "-", " ", "invoice", "Paid", "UNPAID",
+        ]
+        for _ in range(3000):
+            text = "".join(rng.choice(words) + rng.choice(["", " ", "", "\n"]) for _ in range(rng.randint(1, 6)))
+            normalized = main.normalize_context_text(text)
+            self.assertEqual(
+                matcher.is_payment_context(normalized),
+                reference.has_invoice_payment_context(text),
+                msg=repr(text),
+            )
+
+    def test_scan_reports_overlapping_occurrences_of_both_polarities(self):
+        matcher = main.KeywordMatcher(["支付", "pay now"], ["付款", "now due"])
+
+        positive, negative = matcher.scan("支付款 pay now due")
+
+        self.assertEqual(positive, [(0, 2), (4, 11)])
+        self.assertEqual(negative, [(1, 3), (8, 15)])
+
+    def test_extra_keywords_come_from_environment(self):
+        env = {"INVOICE_POSITIVE_KEYWORDS": "awaiting payment", "INVOICE_NEGATIVE_KEYWORDS": "voided"}
+        with patch.dict(os.environ, env), patch("main._payment_context_matcher", None):
+            bot = RenewInvoiceHandlingTests.make_bot(self)
+            self.assertTrue(bot.has_invoice_payment_context("Status: Awaiting Payment"))
+            self.assertFalse(bot.has_invoice_payment_context("Awaiting payment (voided)"))
+
+
+def parser_available(name):
+    return builder_registry.lookup(name) is not None
+
+
+@unittest.skipUnless(parser_available("lxml"), "lxml 未安装")
+class LxmlRenewInvoiceHandlingTests(RenewInvoiceHandlingTests):
+    html_parser = "lxml"
+
+
+@unittest.skipUnless(parser_available("html5lib"), "html5lib 未安装")
+class Html5libRenewInvoiceHandlingTests(RenewInvoiceHandlingTests):
+    html_parser = "html5lib"
+
+
+class HtmlParserResolutionTests(unittest.TestCase):
+    def test_unknown_backend_falls_back_to_builtin_parser(self):
+        with patch("main.log_print"):
+            self.assertEqual(main.resolve_html_parser("no-such-parser"), "html.parser")
+
+    def test_auto_prefers_lxml_when_installed(self):
+        expected = "lxml" if parser_available("lxml") else "html.parser"
+        self.assertEqual(main.resolve_html_parser("auto"), expected)
+
+
 if __name__ == "__main__":
     unittest.main()
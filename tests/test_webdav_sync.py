@@ -0,0 +1,361 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import Mock, patch
+
+sys.modules.setdefault("cloudscraper", Mock(create_scraper=Mock(return_value=Mock())))
+
+import main
+
+
+class WebDavStandIn:
+    """最小化的 WebDAV 替身：按路径保存文档，支持 ETag 条件 GET / PUT / HEAD 以及 DELETE / MKCOL。"""
+
+    SINGLE = "/dav/" + main.CACHE_FILE_NAME
+    SCHEDULE = "/dav/" + main.SCHEDULE_FILE_NAME
+    MANIFEST = "/dav/" + main.SHARD_DIR_NAME + "/manifest.json"
+
+    def __init__(self):
+        self.documents = {}
+        self.collections = {"/dav/"}
+        self.requests = []
+        self.lock = threading.Lock()
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def send_empty(self, status, etag=None):
+                self.send_response(status)
+                if etag:
+                    self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def record(self):
+                standin.requests.append((self.command, self.path, dict(self.headers)))
+
+            def do_HEAD(self):
+                with standin.lock:
+                    self.record()
+                    if self.path not in standin.documents:
+                        return self.send_empty(404)
+                    self.send_empty(200, standin.etag(self.path))
+
+            def do_GET(self):
+                with standin.lock:
+                    self.record()
+                    if self.path not in standin.documents:
+                        return self.send_empty(404)
+                    etag = standin.etag(self.path)
+                    if self.headers.get("If-None-Match") == etag:
+                        return self.send_empty(304, etag)
+                    payload = standin.documents[self.path]
+                    self.send_response(200)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+
+            def do_PUT(self):
+                payload = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with standin.lock:
+                    self.record()
+                    if self.path.rsplit("/", 1)[0] + "/" not in standin.collections:
+                        return self.send_empty(409)
+                    exists = self.path in standin.documents
+                    if_match = self.headers.get("If-Match")
+                    if if_match and (not exists or if_match != standin.etag(self.path)):
+                        return self.send_empty(412)
+                    if self.headers.get("If-None-Match") == "*" and exists:
+                        return self.send_empty(412)
+                    standin.documents[self.path] = payload
+                    self.send_empty(204 if exists else 201, standin.etag(self.path))
+
+            def do_DELETE(self):
+                with standin.lock:
+                    self.record()
+                    self.send_empty(204 if standin.documents.pop(self.path, None) is not None else 404)
+
+            def do_MKCOL(self):
+                with standin.lock:
+                    self.record()
+                    exists = self.path in standin.collections
+                    standin.collections.add(self.path)
+                    self.send_empty(405 if exists else 201)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def etag(self, path=SINGLE):
+        return '"%s"' % hashlib.sha256(self.documents[path]).hexdigest()[:16]
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:%d/dav/" % self.server.server_address[1]
+
+    def shard_path(self, key):
+        return "/dav/%s/account-%s.json" % (main.SHARD_DIR_NAME, key)
+
+    def set_document(self, data, path=SINGLE):
+        with self.lock:
+            self.documents[path] = json.dumps(data).encode("utf-8")
+
+    def document(self, path=SINGLE):
+        with self.lock:
+            return json.loads(self.documents[path])
+
+    def set_sharded(self, data):
+        """按客户端的分片格式写入云端数据和清单。"""
+        accounts = {}
+        with self.lock:
+            self.collections.add("/dav/%s/" % main.SHARD_DIR_NAME)
+            for key, cookie in data.items():
+                body = main.WebDavManager.shard_body(key, cookie)
+                self.documents[self.shard_path(key)] = body.encode("utf-8")
+                accounts[key] = main.WebDavManager.shard_digest(body)
+            self.documents[self.MANIFEST] = json.dumps({"version": 1, "accounts": accounts}).encode("utf-8")
+
+    def sharded(self):
+        manifest = self.document(self.MANIFEST)
+        return {key: self.document(self.shard_path(key))["cookie"] for key in manifest["accounts"]}
+
+    def methods(self):
+        return [method for method, _, _ in self.requests]
+
+    def paths(self, method):
+        return [path for verb, path, _ in self.requests if verb == method]
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class WebDavStandInTestCase(unittest.TestCase):
+    def setUp(self):
+        self.standin = WebDavStandIn()
+        self.standin.start()
+        self.addCleanup(self.standin.stop)
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.cache_path = os.path.join(self.tmpdir.name, main.CACHE_FILE_NAME)
+        for target in (
+            patch("main.LOCAL_CACHE_PATH", self.cache_path),
+            patch("main.LOCAL_SCHEDULE_PATH", os.path.join(self.tmpdir.name, main.SCHEDULE_FILE_NAME)),
+            patch("builtins.print"),
+            patch.dict(os.environ, {
+                "WEBDAV_URL": self.standin.url,
+                "WEBDAV_USER": "user",
+                "WEBDAV_PASS": "pass",
+            }),
+        ):
+            target.start()
+            self.addCleanup(target.stop)
+        main.CacheManager.reload()
+        self.addCleanup(main.CacheManager.reload)
+        main.RenewalSchedule.reload()
+        self.addCleanup(main.RenewalSchedule.reload)
+        main.WebDavManager._remote_base = None
+        self.addCleanup(setattr, main.WebDavManager, "_remote_base", None)
+
+    def read_cache(self):
+        with open(self.cache_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def upload_changes(self):
+        return main.WebDavManager().upload(main.CacheManager.load(), changed=main.CacheManager.changed_keys())
+
+
+class WebDavSyncTests(WebDavStandInTestCase):
+
+    def test_unchanged_remote_is_not_downloaded_again(self):
+        self.standin.set_document({"0": "a=1"})
+
+        main.WebDavManager().download()
+        main.WebDavManager().download()
+
+        self.assertEqual(self.read_cache(), {"0": "a=1"})
+        second_get = self.standin.requests[1][2]
+        self.assertEqual(second_get.get("If-None-Match"), self.standin.etag())
+        self.assertIn("云端缓存未变化，沿用本地缓存", main.ALL_LOGS[-1])
+
+    def test_changed_remote_is_downloaded_again(self):
+        self.standin.set_document({"0": "a=1"})
+        main.WebDavManager().download()
+        self.standin.set_document({"0": "a=2"})
+
+        main.WebDavManager().download()
+
+        self.assertEqual(self.read_cache(), {"0": "a=2"})
+        self.assertEqual(main.CacheManager.get(0), "a=2")
+
+    def test_upload_uses_if_match_from_last_download(self):
+        self.standin.set_document({"0": "a=1"})
+        main.WebDavManager().download()
+        etag = self.standin.etag()
+        main.CacheManager.update(0, "a=2", upload=False)
+
+        ok = self.upload_changes()
+
+        self.assertTrue(ok)
+        self.assertEqual(self.standin.requests[-1][2].get("If-Match"), etag)
+        self.assertEqual(self.standin.document(), {"0": "a=2"})
+
+    def test_concurrent_writer_is_merged_per_account(self):
+        self.standin.set_document({"0": "a=1", "1": "b=1"})
+        main.WebDavManager().download()
+        # 另一个实例在本轮运行期间更新了账号 2
+        self.standin.set_document({"0": "a=1", "1": "b=2"})
+        main.CacheManager.update(0, "a=2", upload=False)
+
+        ok = self.upload_changes()
+
+        self.assertTrue(ok)
+        self.assertEqual(self.standin.document(), {"0": "a=2", "1": "b=2"})
+        self.assertEqual(self.standin.methods()[-3:], ["PUT", "GET", "PUT"])
+
+    def test_followup_upload_keeps_other_writers_accounts(self):
+        self.standin.set_document({"0": "a=1", "1": "b=1"})
+        main.WebDavManager().download()
+        self.standin.set_document({"0": "a=1", "1": "b=2"})
+        main.CacheManager.update(0, "a=2", upload=False)
+        self.upload_changes()
+
+        main.CacheManager.update(0, "a=3", upload=False)
+        self.upload_changes()
+
+        self.assertEqual(self.standin.document(), {"0": "a=3", "1": "b=2"})
+
+    def test_first_upload_only_creates_missing_document(self):
+        main.WebDavManager().download()
+        main.CacheManager.update(0, "a=1", upload=False)
+
+        ok = self.upload_changes()
+
+        self.assertTrue(ok)
+        self.assertEqual(self.standin.requests[-1][2].get("If-None-Match"), "*")
+        self.assertEqual(self.standin.document(), {"0": "a=1"})
+
+
+class ScheduleWebDavSyncTests(WebDavStandInTestCase):
+    NOW = int(time.time())
+
+    def test_schedule_round_trips_through_webdav(self):
+        main.RenewalSchedule.record("7", days_until=5, threshold=1, now=self.NOW)
+
+        self.assertTrue(main.WebDavManager().upload_schedule())
+        main.RenewalSchedule.reload()
+        main.WebDavManager().download_schedule()
+
+        self.assertEqual(main.RenewalSchedule.snapshot()["7"]["days_until"], 5)
+        self.assertEqual(self.standin.document(self.standin.SCHEDULE)["services"]["7"]["checked_at"], self.NOW)
+
+    def test_concurrent_schedule_writer_is_merged_per_service(self):
+        self.standin.set_document({"services": {"1": {"checked_at": self.NOW - 300}}}, self.standin.SCHEDULE)
+        main.WebDavManager().download_schedule()
+        # 另一个实例在本轮运行期间写入了服务 2
+        self.standin.set_document({"services": {
+            "1": {"checked_at": self.NOW - 300},
+            "2": {"checked_at": self.NOW - 200, "days_until": 4, "threshold": 1},
+        }}, self.standin.SCHEDULE)
+        main.RenewalSchedule.record("1", days_until=9, threshold=1, now=self.NOW)
+
+        self.assertTrue(main.WebDavManager().upload_schedule())
+
+        services = self.standin.document(self.standin.SCHEDULE)["services"]
+        self.assertEqual(services["1"]["days_until"], 9)
+        self.assertEqual(services["2"]["days_until"], 4)
+        self.assertEqual(self.standin.methods()[-3:], ["PUT", "GET", "PUT"])
+
+class ShardedWebDavSyncTests(WebDavStandInTestCase):
+    def setUp(self):
+        super().setUp()
+        layout_patch = patch("main.WEBDAV_LAYOUT", "sharded")
+        layout_patch.start()
+        self.addCleanup(layout_patch.stop)
+
+    def test_first_upload_creates_collection_shards_and_manifest(self):
+        main.WebDavManager().download()
+        main.CacheManager.update(0, "a=1", upload=False)
+        main.CacheManager.update(1, "b=1", upload=False)
+
+        self.assertTrue(self.upload_changes())
+
+        self.assertIn("MKCOL", self.standin.methods())
+        self.assertEqual(self.standin.sharded(), {"0": "a=1", "1": "b=1"})
+
+    def test_only_changed_shards_are_transferred(self):
+        self.standin.set_sharded({"0": "a=1", "1": "b=1", "2": "c=1"})
+        main.WebDavManager().download()
+        self.assertEqual(self.read_cache(), {"0": "a=1", "1": "b=1", "2": "c=1"})
+
+        self.standin.requests.clear()
+        main.CacheManager.update(1, "b=2", upload=False)
+        self.assertTrue(self.upload_changes())
+        self.assertEqual(self.standin.paths("PUT"), [self.standin.shard_path("1"), self.standin.MANIFEST])
+
+        # 另一个实例只改了账号 3，重新下载时只取这一个分片
+        self.standin.set_sharded({"0": "a=1", "1": "b=2", "2": "c=2"})
+        main.CacheManager.flush()
+        self.standin.requests.clear()
+        main.WebDavManager().download()
+        self.assertEqual(self.standin.paths("GET"), [self.standin.MANIFEST, self.standin.shard_path("2")])
+        self.assertEqual(self.read_cache(), {"0": "a=1", "1": "b=2", "2": "c=2"})
+
+    def test_unchanged_manifest_is_not_downloaded_again(self):
+        self.standin.set_sharded({"0": "a=1"})
+        main.WebDavManager().download()
+        self.standin.requests.clear()
+
+        main.WebDavManager().download()
+
+        self.assertEqual(self.standin.paths("GET"), [self.standin.MANIFEST])
+        self.assertIn("云端缓存未变化，沿用本地缓存", main.ALL_LOGS[-1])
+
+    def test_concurrent_manifest_writer_is_merged_per_account(self):
+        self.standin.set_sharded({"0": "a=1", "1": "b=1"})
+        main.WebDavManager().download()
+        self.standin.set_sharded({"0": "a=1", "1": "b=2"})
+        main.CacheManager.update(0, "a=2", upload=False)
+
+        self.assertTrue(self.upload_changes())
+
+        self.assertEqual(self.standin.sharded(), {"0": "a=2", "1": "b=2"})
+
+    def test_single_file_is_migrated_to_shards(self):
+        self.standin.set_document({"0": "a=1", "1": "b=1"})
+        main.WebDavManager().download()
+        self.assertEqual(main.CacheManager.get(1), "b=1")
+        main.CacheManager.update(0, "a=2", upload=False)
+
+        self.assertTrue(self.upload_changes())
+
+        self.assertEqual(self.standin.sharded(), {"0": "a=2", "1": "b=1"})
+        self.assertNotIn(self.standin.SINGLE, self.standin.documents)
+
+    def test_shards_are_migrated_back_to_single_file(self):
+        self.standin.set_sharded({"0": "a=1", "1": "b=1"})
+        with patch("main.WEBDAV_LAYOUT", "single"):
+            main.WebDavManager().download()
+            self.assertEqual(main.CacheManager.get(1), "b=1")
+            main.CacheManager.update(0, "a=2", upload=False)
+            self.assertTrue(self.upload_changes())
+
+        self.assertEqual(self.standin.document(), {"0": "a=2", "1": "b=1"})
+        self.assertNotIn(self.standin.MANIFEST, self.standin.documents)
+
+
+if __name__ == "__main__":
+    unittest.main()